@@ -1,38 +1,146 @@
-from fastapi import APIRouter, Depends
+import asyncio
 import json
-import os
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
 
 from app.security.auth import verify_api_key
+from app.security.rate_limit import limiter
+from app.security.session_guard import session_stats
+from app.db.registry_cache import registry
+from app.services.inference_pool import inference_pool
+from app.services.embedding_cache import embedding_cache
+from app.services.face_mesh_pool import face_mesh_pool
+from app.admin.attempt_logger import load_stats, parse_cursor, scan_attempts
+from app.utils.tracing import TRACE_SAMPLE, TRACE_SLOW_MS, recent_traces
 
 router = APIRouter(prefix="/admin", tags=["Admin"])
 
-LOG_FILE = "attempt_log.json"
+
+def _stream_page(rows, limit):
+    """
+    Stream {"items": [...], "next_cursor": ...} one entry at a time.
+    next_cursor is null once the log is exhausted.
+    """
+    yield '{"items": ['
+
+    next_cursor = None
+    sent = 0
+
+    for entry, cursor in rows:
+        yield ("," if sent else "") + json.dumps(entry)
+        sent += 1
+
+        if sent == limit:
+            next_cursor = cursor
+            break
+
+    yield '], "next_cursor": ' + json.dumps(next_cursor) + "}"
 
 
 @router.get("/attempts")
-async def get_attempts(auth=Depends(verify_api_key)):
+async def get_attempts(
+    cursor: str = None,
+    limit: int = Query(100, ge=1, le=1000),
+    status: str = None,
+    attempt_type: str = Query(None, alias="type"),
+    since: str = None,
+    until: str = None,
+    auth=Depends(verify_api_key)
+):
 
-    if not os.path.exists(LOG_FILE):
-        return []
+    if cursor:
+        try:
+            parse_cursor(cursor)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
 
-    with open(LOG_FILE, "r") as f:
-        return json.load(f)
+    rows = scan_attempts(cursor, status, attempt_type, since, until)
+
+    return StreamingResponse(_stream_page(rows, limit), media_type="application/json")
 
 
 @router.get("/stats")
-async def get_stats(auth=Depends(verify_api_key)):
+async def get_stats(
+    since: str = None,
+    until: str = None,
+    auth=Depends(verify_api_key)
+):
+
+    # file lock + JSON read: keep it off the event loop
+    stats = await asyncio.to_thread(load_stats)
+    by_status = stats["by_status"]
+
+    result = {
+        "total_attempts": stats["total"],
+        "approved": sum(by_status.get("approved", {}).values()),
+        "rejected": sum(by_status.get("rejected", {}).values()),
+        "error": sum(by_status.get("error", {}).values()),
+        "by_reason": by_status
+    }
+
+    # buckets only on request; hours past STATS_HOURS are kept per day
+    if since or until:
+        result["daily_buckets"] = [
+            {"day": day, **counts}
+            for day, counts in sorted(stats.get("days", {}).items())
+            if (not since or day >= since[:10])
+            and (not until or day[:len(until)] <= until)
+        ]
+        result["buckets"] = [
+            {"hour": hour, **counts}
+            for hour, counts in sorted(stats["hours"].items())
+            if (not since or hour >= since[:13])
+            and (not until or hour[:len(until)] <= until)
+        ]
+
+    return result
+
+
+@router.get("/registry-cache")
+async def get_registry_cache(auth=Depends(verify_api_key)):
+
+    # per-process: hit repeatedly to sample every uvicorn worker
+    return registry.stats()
+
+
+@router.get("/inference")
+async def get_inference(auth=Depends(verify_api_key)):
+
+    return inference_pool.stats()
+
+
+@router.get("/embedding-cache")
+async def get_embedding_cache(auth=Depends(verify_api_key)):
+
+    # per-process, like /admin/registry-cache
+    return embedding_cache.stats()
+
+
+@router.get("/face-mesh")
+async def get_face_mesh(auth=Depends(verify_api_key)):
+
+    return face_mesh_pool.stats()
+
+
+@router.get("/rate-limit")
+async def get_rate_limit(auth=Depends(verify_api_key)):
+
+    return limiter.stats()
+
+
+@router.get("/sessions")
+async def get_sessions(auth=Depends(verify_api_key)):
 
-    if not os.path.exists(LOG_FILE):
-        return {"total": 0}
+    return session_stats()
 
-    with open(LOG_FILE, "r") as f:
-        logs = json.load(f)
 
-    approved = sum(1 for l in logs if l["status"] == "approved")
-    rejected = sum(1 for l in logs if l["status"] == "rejected")
+@router.get("/traces")
+async def get_traces(auth=Depends(verify_api_key)):
 
+    # slow-request traces kept by this process (newest last)
     return {
-        "total_attempts": len(logs),
-        "approved": approved,
-        "rejected": rejected
+        "slow_ms": TRACE_SLOW_MS,
+        "sample": TRACE_SAMPLE,
+        "traces": recent_traces(),
     }
@@ -1,27 +1,451 @@
+import atexit
+import glob
 import json
 import os
+import queue
+import re
+import threading
 import time
 
-LOG_FILE = "attempt_log.json"
+from app.utils.file_lock import file_lock
+from app.utils.logger import get_logger
+from app.utils.metrics import metrics
+
+# -------------------------
+# Storage layout
+# -------------------------
+#
+# attempt_logs/
+#   attempts-20260207T002535.jsonl  one JSON entry per line, named by
+#   attempts-20260208T000012.jsonl  creation time; the newest is active
+#   stats.json                      running counters, updated per batch
+#                                   (hourly for STATS_HOURS, then daily)
+#
+# Entries go through a bounded queue to a background writer which
+# appends them in batches and fsyncs once per batch. Files are never
+# renamed, so a (file, offset) cursor stays valid across rotations.
+
+LOG_DIR = "attempt_logs"
+STATS_FILE = os.path.join(LOG_DIR, "stats.json")
+LOCK_PATH = os.path.join(LOG_DIR, ".lock")
+
+LEGACY_LOG_FILE = "attempt_log.json"
+
+QUEUE_SIZE = 10000
+FLUSH_INTERVAL = 1.0            # seconds between batched writes
+MAX_BATCH = 1000
+ROTATE_BYTES = 64 * 1024 * 1024
+ROTATE_DAILY = True
+STATS_HOURS = 24 * 30           # hourly buckets kept before rolling up into days
+
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+_FILE_RE = re.compile(r"^attempts-(\d{8}T\d{6})(?:-\d+)?\.jsonl$")
+
+logger = get_logger(__name__)
+
+ATTEMPTS = metrics.counter("kyc_attempts_total", "Logged attempts", ("type", "status"))
+FLUSH_SECONDS = metrics.histogram(
+    "kyc_attempt_log_flush_seconds", "Attempt log batch write + fsync time"
+)
+
+
+# -------------------------
+# Files
+# -------------------------
+
+def log_files():
+    """
+    Log files oldest first; the last one is the active file.
+    """
+    import_legacy_log()
+
+    return sorted(glob.glob(os.path.join(LOG_DIR, "attempts-*.jsonl")))
+
+
+def _file_started(path):
+    """
+    Creation time of a log file as a TIME_FORMAT string.
+    """
+    stamp = _FILE_RE.match(os.path.basename(path)).group(1)
+    return time.strftime(TIME_FORMAT, time.strptime(stamp, "%Y%m%dT%H%M%S"))
+
+
+def _new_file_path():
+    stamp = time.strftime("%Y%m%dT%H%M%S")
+    path = os.path.join(LOG_DIR, f"attempts-{stamp}.jsonl")
+
+    n = 1
+    while os.path.exists(path):
+        path = os.path.join(LOG_DIR, f"attempts-{stamp}-{n}.jsonl")
+        n += 1
+
+    return path
+
+
+def _active_file():
+    """
+    Current file to append to, starting a new one when the newest
+    is too big or from an earlier day. Caller holds the lock.
+    """
+    files = sorted(glob.glob(os.path.join(LOG_DIR, "attempts-*.jsonl")))
+
+    if not files:
+        return _new_file_path()
+
+    path = files[-1]
+
+    too_big = os.path.getsize(path) >= ROTATE_BYTES
+    new_day = ROTATE_DAILY and _file_started(path)[:10] != time.strftime("%Y-%m-%d")
+
+    if too_big or new_day:
+        return _new_file_path()
+
+    return path
+
+
+# -------------------------
+# Running statistics
+# -------------------------
+#
+# {"total": n,
+#  "by_status": {status: {reason: n}},
+#  "hours": {"2026-02-07 00": {status: {reason: n}}},
+#  "days": {"2026-01-05": {status: {reason: n}}}}
+#
+# Hours older than STATS_HOURS are folded into days, so the file (read
+# and rewritten on every batch) stops growing by the hour.
+
+def _new_stats():
+    return {"total": 0, "by_status": {}, "hours": {}, "days": {}}
+
+
+def _count(stats, entries):
+    for e in entries:
+        status = e.get("status", "unknown")
+        reason = e.get("reason") or status
+        hour = e.get("timestamp", "")[:13]
+
+        stats["total"] += 1
+
+        for bucket in (stats["by_status"], stats["hours"].setdefault(hour, {})):
+            reasons = bucket.setdefault(status, {})
+            reasons[reason] = reasons.get(reason, 0) + 1
+
+
+def _roll_up(stats, now=None):
+    cutoff = time.strftime("%Y-%m-%d %H", time.localtime((now or time.time()) - STATS_HOURS * 3600))
+    days = stats.setdefault("days", {})
+
+    for hour in [h for h in stats["hours"] if h < cutoff]:
+        day = days.setdefault(hour[:10], {})
+
+        for status, reasons in stats["hours"].pop(hour).items():
+            merged = day.setdefault(status, {})
+
+            for reason, n in reasons.items():
+                merged[reason] = merged.get(reason, 0) + n
+
+
+def _read_lines(path):
+    with open(path, "r") as f:
+        for line in f:
+            line = line.strip()
+
+            if not line:
+                continue
+
+            try:
+                yield json.loads(line)
+            except ValueError:
+                # torn final line after a crash
+                continue
+
+
+def _load_stats_locked():
+    """
+    Counters from stats.json, rebuilt with one full scan if the
+    file is missing or unreadable. Caller holds the lock.
+    """
+    try:
+        with open(STATS_FILE, "r") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        pass
+
+    stats = _new_stats()
+
+    for path in sorted(glob.glob(os.path.join(LOG_DIR, "attempts-*.jsonl"))):
+        _count(stats, _read_lines(path))
+
+    _roll_up(stats)
+    _save_stats_locked(stats)
+
+    return stats
+
+
+def _save_stats_locked(stats):
+    tmp = STATS_FILE + ".tmp"
+
+    with open(tmp, "w") as f:
+        json.dump(stats, f)
+        f.flush()
+        os.fsync(f.fileno())
+
+    os.replace(tmp, STATS_FILE)
+
+
+def load_stats():
+    with file_lock(LOCK_PATH):
+        return _load_stats_locked()
+
+
+# -------------------------
+# Writes
+# -------------------------
+
+def _append_locked(path, entries):
+    """
+    Append entries as JSON lines, fsync, then fold them into the
+    running counters. Caller holds the lock.
+    """
+    stats = _load_stats_locked()
+
+    with open(path, "a") as f:
+        f.write("".join(json.dumps(e) + "\n" for e in entries))
+        f.flush()
+        os.fsync(f.fileno())
+
+    _count(stats, entries)
+    _roll_up(stats)
+    _save_stats_locked(stats)
+
+
+def _write_batch(entries):
+    with file_lock(LOCK_PATH):
+        _append_locked(_active_file(), entries)
+
+
+# -------------------------
+# Queries
+# -------------------------
+
+def parse_cursor(cursor):
+    """
+    "<file>:<offset>" -> (path, offset). Raises ValueError.
+    """
+    name, _, offset = cursor.rpartition(":")
+
+    if not _FILE_RE.match(name):
+        raise ValueError("invalid cursor")
+
+    path = os.path.join(LOG_DIR, name)
+
+    if not os.path.exists(path):
+        raise ValueError("cursor refers to a missing log file")
+
+    offset = int(offset)
+
+    # checked here: a bad seek inside the stream would cut the response short
+    if offset < 0 or offset > os.path.getsize(path):
+        raise ValueError("cursor offset outside the log file")
+
+    return path, offset
+
+
+def scan_attempts(cursor=None, status=None, attempt_type=None, since=None, until=None):
+    """
+    Yield (entry, cursor_after_entry) for entries matching the filters,
+    in write order, starting at cursor.
+
+    since / until are TIME_FORMAT strings (prefixes such as
+    "2026-02-07" also work). Files that cannot hold entries in the
+    range are skipped without being opened.
+    """
+    files = log_files()
+    start_path, start_offset = parse_cursor(cursor) if cursor else (None, 0)
+
+    if start_path is not None:
+        files = files[files.index(start_path):]
+
+    for i, path in enumerate(files):
+        # entries of a file predate the next file's creation
+        if since and i + 1 < len(files) and _file_started(files[i + 1]) < since:
+            continue
+
+        if until and _file_started(path)[:len(until)] > until:
+            return
+
+        offset = start_offset if path == start_path else 0
+
+        with open(path, "rb") as f:
+            f.seek(offset)
+
+            for line in iter(f.readline, b""):
+                if not line.endswith(b"\n"):
+                    break   # batch still being written
+
+                pos = f.tell()
+
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+
+                ts = entry.get("timestamp", "")
+
+                if status and entry.get("status") != status:
+                    continue
+                if attempt_type and entry.get("type") != attempt_type:
+                    continue
+                if since and ts < since:
+                    continue
+                if until and ts[:len(until)] > until:
+                    continue
+
+                yield entry, f"{os.path.basename(path)}:{pos}"
+
+
+def iter_attempts():
+    """
+    Every logged entry in write order.
+    """
+    for path in log_files():
+        yield from _read_lines(path)
+
+
+# -------------------------
+# Legacy import
+# -------------------------
+
+def import_legacy_log():
+    """
+    One-time conversion of the old attempt_log.json array into the
+    oldest JSONL file. The original is kept as *.imported.
+    """
+    if not os.path.exists(LEGACY_LOG_FILE):
+        return 0
+
+    with file_lock(LOCK_PATH):
+        if not os.path.exists(LEGACY_LOG_FILE):
+            return 0
+
+        try:
+            with open(LEGACY_LOG_FILE, "r") as f:
+                logs = json.load(f)
+        except Exception as e:
+            logger.error("Legacy attempt log unreadable — skipped: %s", e)
+            logs = []
+
+        # sorts before any real file stamp
+        target = os.path.join(LOG_DIR, "attempts-19700101T000000.jsonl")
+
+        if logs:
+            _append_locked(target, logs)
+
+        os.replace(LEGACY_LOG_FILE, LEGACY_LOG_FILE + ".imported")
+
+    return len(logs)
+
+
+# -------------------------
+# Background writer
+# -------------------------
+
+class _AttemptWriter(threading.Thread):
+
+    def __init__(self):
+        super().__init__(name="attempt-log-writer", daemon=True)
+        self.queue = queue.Queue(maxsize=QUEUE_SIZE)
+
+    def run(self):
+        import_legacy_log()
+
+        stop = False
+
+        while not stop:
+            batch = []
+            deadline = time.monotonic() + FLUSH_INTERVAL
+
+            while len(batch) < MAX_BATCH:
+                timeout = deadline - time.monotonic()
+
+                if timeout <= 0:
+                    break
+
+                try:
+                    entry = self.queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+
+                if entry is None:
+                    stop = True
+                    break
+
+                batch.append(entry)
+
+            if batch:
+                start = time.perf_counter()
+
+                try:
+                    _write_batch(batch)
+                    FLUSH_SECONDS.observe(time.perf_counter() - start)
+                except Exception as e:
+                    logger.exception("Attempt log write failed: %s", e)
+
+    def close(self):
+        self.queue.put(None)
+        self.join(timeout=5)
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def _get_writer():
+    global _writer
+
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = _AttemptWriter()
+                _writer.start()
+                atexit.register(_writer.close)
+
+    return _writer
+
+
+def close_writer():
+    """
+    Write out queued entries and stop the background writer (e.g.
+    before the cwd changes — LOG_DIR is relative). The next
+    log_attempt starts a new one.
+    """
+    global _writer
+
+    with _writer_lock:
+        writer, _writer = _writer, None
+
+    if writer is not None:
+        writer.close()
 
 
 def log_attempt(data):
 
     entry = {
-        "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "timestamp": time.strftime(TIME_FORMAT),
         **data
     }
 
-    logs = []
+    ATTEMPTS.inc(type=entry.get("type", ""), status=entry.get("status", ""))
 
-    if os.path.exists(LOG_FILE):
-        try:
-            with open(LOG_FILE, "r") as f:
-                logs = json.load(f)
-        except:
-            logs = []
+    try:
+        _get_writer().queue.put_nowait(entry)
+    except queue.Full:
+        # never drop audit entries — pay the write inline instead
+        _write_batch([entry])
 
-    logs.append(entry)
 
-    with open(LOG_FILE, "w") as f:
-        json.dump(logs, f, indent=2)
+metrics.gauge(
+    "kyc_attempt_log_queue_depth", "Attempt log entries waiting for the writer",
+    lambda: _writer.queue.qsize() if _writer is not None else 0
+)
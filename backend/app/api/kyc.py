@@ -1,22 +1,32 @@
-from fastapi import APIRouter, UploadFile, File, Form, Depends, Request
+from fastapi import APIRouter, UploadFile, File, Form, Depends, Request, HTTPException
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
 import numpy as np
 import cv2
 import asyncio
-import tempfile
+import json
 import os
+import threading
 
-from app.security.session_guard import create_session, validate_session
+from app.security.session_guard import (
+    SessionLimitReached,
+    consume_session_async,
+    create_session_async,
+    validate_session_async,
+)
 from app.security.auth import verify_api_key
-from app.security.rate_limit import rate_limit
+from app.security.rate_limit import rate_limit_async
 
-from app.services.embedding import get_embedding
+from app.services.bulk import bulk_enroll, bulk_search, open_source, resolve_directory
+from app.services.embedding import get_embedding, get_embeddings
+from app.services.embedding_cache import content_key, embedding_cache
+from app.services.inference_pool import InferenceBusy
 from app.services.similarity import (
     search_face,
     check_duplicate,
-    verify_identity_match
+    identity_scores
 )
-from app.services.video_processing import extract_frames
-from app.services.active_liveness import active_liveness_from_video
+from app.services.video_processing import run_video_analysis
 
 from app.decision.decision_engine import decide
 from app.db.vector_store import (
@@ -27,19 +37,75 @@ from app.db.vector_store import (
 )
 
 from app.admin.attempt_logger import log_attempt
-from app.utils.logger import log
+from app.utils.logger import get_logger
+from app.utils.stages import StageGraph, StageRejected, to_thread_cancellable
+from app.utils.tracing import span
+from app.utils.uploads import UploadRejected, read_image_bytes, spool_archive, spool_video
 
 router = APIRouter(prefix="/kyc", tags=["KYC"])
+logger = get_logger(__name__)
+
+IDENTITY_THRESHOLD = 0.70
+
+# result batches a bulk job may run ahead of the client reading them
+BULK_PREFETCH = 2
+CANCEL_POLL_S = 0.1
 
 
 # =====================================================
 # image reader
 # =====================================================
 
-async def read_image(upload: UploadFile):
-    contents = await upload.read()
-    arr = np.frombuffer(contents, np.uint8)
-    return cv2.imdecode(arr, cv2.IMREAD_COLOR)
+def decode_image(contents):
+    with span("image.decode"):
+        arr = np.frombuffer(contents, np.uint8)
+        frame = cv2.imdecode(arr, cv2.IMREAD_COLOR)
+
+    if frame is None:
+        raise UploadRejected("invalid image")
+
+    return frame
+
+
+async def embed_image(upload: UploadFile):
+    """
+    Embedding of an uploaded image, straight from the content-hash
+    cache when these exact bytes were seen recently (no decode, no
+    inference).
+
+    Returns:
+        (contents, frame, embedding) — frame is None on a cache hit,
+        embedding is None when no face was found
+    """
+    with span("upload.image"):
+        contents = await read_image_bytes(upload)
+
+    key = content_key(contents)
+
+    # the disk tier reads and writes files: keep it off the event loop
+    if embedding_cache.uses_disk:
+        hit, embedding = await asyncio.to_thread(embedding_cache.get, key)
+    else:
+        hit, embedding = embedding_cache.get(key)
+
+    if hit:
+        return contents, None, embedding
+
+    frame = decode_image(contents)
+    embedding = await asyncio.to_thread(get_embedding, frame)
+
+    if embedding_cache.uses_disk:
+        return contents, frame, await asyncio.to_thread(embedding_cache.put, key, embedding)
+
+    return contents, frame, embedding_cache.put(key, embedding)
+
+
+def _busy():
+    return HTTPException(
+        status_code=503,
+        detail="inference queue full",
+        headers={"Retry-After": "1"}
+    )
 
 
 # =====================================================
@@ -48,7 +114,14 @@ async def read_image(upload: UploadFile):
 
 @router.get("/session")
 async def get_session(auth=Depends(verify_api_key)):
-    return {"session_token": create_session()}
+    try:
+        return {"session_token": await create_session_async()}
+    except SessionLimitReached:
+        raise HTTPException(
+            status_code=429,
+            detail="too many active sessions",
+            headers={"Retry-After": "5"}
+        )
 
 
 # =====================================================
@@ -63,117 +136,117 @@ async def verify(
     video: UploadFile = File(...),
     auth=Depends(verify_api_key)
 ):
-    try:
-        log("[KYC] Unified verification started")
+    #   selfie ──> duplicate
+    #      \
+    #       ──> identity
+    #      /
+    #   video (spool + liveness + frames)
+    #
+    # selfie and video run concurrently; the first rejection cancels
+    # everything still in flight.
+    graph = StageGraph()
+
+    @graph.stage("selfie")
+    async def selfie_stage():
+        contents, frame, embedding = await embed_image(image)
 
-        # --------------------
-        # rate limit
-        # --------------------
-        client_ip = request.client.host
-        if not rate_limit(client_ip):
-            return {"status": "error", "reason": "Too many requests"}
+        if embedding is None:
+            raise StageRejected("encoding failed")
 
-        # --------------------
-        # session validation
-        # --------------------
-        if not validate_session(session_token):
-            return {"status": "error", "reason": "invalid session"}
+        return contents, frame, embedding
 
-        # =================================================
-        # SELFIE → embedding
-        # =================================================
-        selfie_frame = await read_image(image)
+    @graph.stage("duplicate", "selfie")
+    async def duplicate_stage(selfie):
+        duplicate = await asyncio.to_thread(check_duplicate, selfie[2])
 
-        if selfie_frame is None:
-            log_attempt({"type": "kyc", "status": "rejected", "reason": "invalid image"})
-            return {"status": "rejected", "reason": "invalid image"}
+        if duplicate:
+            raise StageRejected("duplicate identity", log={"duplicate": True})
 
-        selfie_embedding = await asyncio.to_thread(get_embedding, selfie_frame)
+        return duplicate
 
-        if selfie_embedding is None:
-            log_attempt({"type": "kyc", "status": "rejected", "reason": "encoding failed"})
-            return {"status": "rejected", "reason": "encoding failed"}
+    @graph.stage("video")
+    async def video_stage():
+        with span("upload.video"):
+            video_path = await spool_video(video)
 
-        # =================================================
-        # SAVE VIDEO ONCE
-        # =================================================
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".mp4") as tmp:
-            contents = await video.read()
-            tmp.write(contents)
-            video_path = tmp.name
+        # one decode for active liveness + identity frames
+        try:
+            liveness_result, frames = await to_thread_cancellable(run_video_analysis, video_path)
+        finally:
+            os.remove(video_path)
 
-        # =================================================
-        # ACTIVE LIVENESS
-        # =================================================
-        liveness_result = await asyncio.to_thread(active_liveness_from_video, video_path)
-        print("Active liveness result:", liveness_result)
+        logger.debug("active liveness result", extra={"liveness": liveness_result})
 
         if not liveness_result.get("is_live", False):
-            os.remove(video_path)
-            log_attempt({
-                "type": "kyc",
-                "status": "rejected",
-                "reason": "liveness failed",
-                "metrics": liveness_result
-            })
-            return {"status": "rejected", "reason": "liveness failed"}
-
-        # =================================================
-        # FRAME EXTRACTION
-        # =================================================
-        frames = await asyncio.to_thread(extract_frames, video_path)
-        os.remove(video_path)
+            raise StageRejected("liveness failed", log={"metrics": liveness_result})
 
         if not frames:
-            return {"status": "rejected", "reason": "video processing failed"}
+            raise StageRejected("video processing failed")
 
-        # =================================================
-        # IDENTITY MATCH — multi-frame averaging
-        # =================================================
-        scores = []
-        for frame in frames:
-            video_emb = await asyncio.to_thread(get_embedding, frame)
-            if video_emb is None:
-                continue
-
-            match, score = await asyncio.to_thread(
-                verify_identity_match,
-                selfie_embedding,
-                video_emb
-            )
-            print("Identity score:", score)
-            scores.append(score)
+        return liveness_result, frames
 
-        if not scores:
-            return {"status": "rejected", "reason": "identity check failed"}
+    @graph.stage("identity", "selfie", "video")
+    async def identity_stage(selfie, video_result):
+        video_embs = await asyncio.to_thread(get_embeddings, video_result[1])
 
-        avg_score = sum(scores) / len(scores)
-        print("Average identity score:", avg_score)
+        if len(video_embs) == 0:
+            raise StageRejected("identity check failed")
+
+        with span("similarity.identity"):
+            scores = identity_scores(selfie[2], video_embs)
+        avg_score = float(scores.mean())
+        logger.debug("identity scores %s (avg %.4f)", scores, avg_score)
 
-        IDENTITY_THRESHOLD = 0.70
         if avg_score < IDENTITY_THRESHOLD:
-            log_attempt({
-                "type": "kyc",
-                "status": "rejected",
-                "reason": "identity mismatch",
-                "similarity": float(avg_score)
-            })
-            return {
-                "status": "rejected",
-                "reason": "identity mismatch",
-                "similarity": float(avg_score)
-            }
+            raise StageRejected(
+                "identity mismatch",
+                log={"similarity": avg_score},
+                response={"similarity": avg_score}
+            )
+
+        return avg_score
+
+    try:
+        logger.debug("unified verification started")
+
+        # --------------------
+        # rate limit
+        # --------------------
+        client_ip = request.client.host
+        if not await rate_limit_async(client_ip, "/kyc/verify"):
+            return {"status": "error", "reason": "Too many requests"}
+
+        # --------------------
+        # session validation — a single-use token is consumed only
+        # once the request reaches a decision, so a rejected upload
+        # or a busy 503 leaves it valid for the retry
+        # --------------------
+        if not await validate_session_async(session_token):
+            return {"status": "error", "reason": "invalid session"}
+
+        results = await graph.run()
+
+        # a concurrent replay of the token decided first
+        if not await consume_session_async(session_token):
+            return {"status": "error", "reason": "invalid session"}
+
+        selfie_bytes, selfie_frame, selfie_embedding = results["selfie"]
+        liveness_result, _ = results["video"]
+        avg_score = results["identity"]
+        duplicate = results["duplicate"]
 
-        # =================================================
-        # DUPLICATE CHECK
-        # =================================================
-        duplicate = await asyncio.to_thread(check_duplicate, selfie_embedding)
         decision = decide(True, duplicate)
 
         if decision["status"] == "approved":
-            store_face(selfie_frame, selfie_embedding)
+            # cache hits skipped the decode; the stored image needs it
+            if selfie_frame is None:
+                selfie_frame = decode_image(selfie_bytes)
+
+            with span("registry.store_face"):
+                store_face(selfie_frame, selfie_embedding)
 
         decision["active_liveness"] = liveness_result
+        decision["timings"] = graph.timings
 
         # =================================================
         # AUDIT LOG
@@ -184,14 +257,35 @@ async def verify(
             "reason": decision.get("reason", "approved"),
             "duplicate": duplicate,
             "liveness": True,
-            "similarity": float(avg_score)
+            "similarity": float(avg_score),
+            "timings": graph.timings
         })
 
         return decision
 
+    except StageRejected as e:
+        if not await consume_session_async(session_token):
+            return {"status": "error", "reason": "invalid session"}
+
+        log_attempt({
+            "type": "kyc",
+            "status": "rejected",
+            "reason": e.reason,
+            **e.log,
+            "timings": graph.timings,
+            "cancelled": graph.cancelled
+        })
+        return {"status": "rejected", "reason": e.reason, **e.response, "timings": graph.timings}
+
+    except UploadRejected as e:
+        log_attempt({"type": "kyc", "status": "rejected", "reason": e.reason})
+        return {"status": "rejected", "reason": e.reason, "timings": graph.timings}
+
+    except InferenceBusy:
+        raise _busy()
+
     except Exception as e:
-        print("KYC PIPELINE ERROR:", e)
-        log(f"KYC verify error: {e}")
+        logger.exception("KYC verify error: %s", e)
         log_attempt({
             "type": "kyc",
             "status": "error",
@@ -206,12 +300,15 @@ async def verify(
 
 @router.post("/search")
 async def search(
+    request: Request,
     image: UploadFile = File(...),
     auth=Depends(verify_api_key)
 ):
     try:
-        frame = await read_image(image)
-        embedding = await asyncio.to_thread(get_embedding, frame)
+        if not await rate_limit_async(request.client.host, "/kyc/search"):
+            return {"status": "error", "reason": "Too many requests"}
+
+        _, _, embedding = await embed_image(image)
 
         if embedding is None:
             return {"status": "rejected", "reason": "encoding failed"}
@@ -223,11 +320,161 @@ async def search(
 
         return {"status": "no_match", "closest_score": float(score)}
 
+    except UploadRejected as e:
+        return {"status": "rejected", "reason": e.reason}
+
+    except InferenceBusy:
+        raise _busy()
+
     except Exception as e:
-        log(f"Search error: {e}")
+        logger.exception("Search error: %s", e)
         return {"status": "error", "reason": "search failed"}
 
 
+# =====================================================
+# BULK — archive / directory in, NDJSON out
+# =====================================================
+
+async def _open_bulk_source(archive, directory):
+    """
+    (source, spool path or None) from an uploaded zip / tar, or a
+    directory under KYC_BULK_ROOT.
+    """
+    if directory:
+        path = resolve_directory(directory)
+        return await asyncio.to_thread(open_source, path), None
+
+    if archive is None:
+        raise UploadRejected("archive or directory required")
+
+    path = await spool_archive(archive)
+
+    try:
+        return await asyncio.to_thread(open_source, path), path
+    except BaseException:
+        os.remove(path)
+        raise
+
+
+class _Spool:
+    """
+    A spooled archive, removed exactly once: by the bulk worker once it
+    has claimed the file, else by discard() when the stream is
+    abandoned before the worker started.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.claimed = path is None
+
+    def claim(self):
+        claimed, self.claimed = self.claimed, True
+        return not claimed
+
+    def remove(self):
+        os.remove(self.path)
+
+    def discard(self):
+        if self.claim():
+            self.remove()
+
+
+async def _stream_ndjson(job, source, spool):
+    """
+    Run job(source, emit, cancel=event) in a worker thread and stream
+    each emitted batch of rows as NDJSON while the job carries on.
+    The job blocks once BULK_PREFETCH batches are unread, and stops
+    if the client goes away.
+    """
+    loop = asyncio.get_running_loop()
+    batches = asyncio.Queue()
+    slots = threading.Semaphore(BULK_PREFETCH)
+    cancel = threading.Event()
+
+    def emit(rows):
+        while not slots.acquire(timeout=CANCEL_POLL_S):
+            if cancel.is_set():
+                return
+
+        loop.call_soon_threadsafe(batches.put_nowait, rows)
+
+    owns_spool = spool.claim()
+
+    def run():
+        try:
+            return job(source, emit, cancel=cancel)
+        finally:
+            if owns_spool:
+                spool.remove()
+
+    worker = asyncio.ensure_future(asyncio.to_thread(run))
+    worker.add_done_callback(lambda _: batches.put_nowait(None))
+
+    try:
+        while True:
+            rows = await batches.get()
+
+            if rows is None:
+                break
+
+            slots.release()
+            yield "".join(json.dumps(row) + "\n" for row in rows)
+
+        # surfaces a job crash in the server log
+        await worker
+
+    except Exception as e:
+        logger.exception("Bulk job error: %s", e)
+        yield json.dumps({"status": "error", "reason": "bulk job failed"}) + "\n"
+
+    finally:
+        cancel.set()
+
+
+async def _bulk(request, route, job, archive, directory):
+    if not await rate_limit_async(request.client.host, route):
+        return {"status": "error", "reason": "Too many requests"}
+
+    try:
+        source, spooled = await _open_bulk_source(archive, directory)
+    except UploadRejected as e:
+        return {"status": "rejected", "reason": e.reason}
+
+    spool = _Spool(spooled)
+
+    # a client gone before the stream starts never runs the generator:
+    # the background task removes the archive the worker did not claim
+    return StreamingResponse(
+        _stream_ndjson(job, source, spool),
+        media_type="application/x-ndjson",
+        background=BackgroundTask(spool.discard)
+    )
+
+
+@router.post("/bulk-enroll")
+async def bulk_enroll_route(
+    request: Request,
+    archive: UploadFile = File(None),
+    directory: str = Form(None),
+    allow_duplicates: bool = Form(False),
+    auth=Depends(verify_api_key)
+):
+    def job(source, emit, cancel):
+        return bulk_enroll(source, emit, cancel=cancel, skip_duplicates=not allow_duplicates)
+
+    return await _bulk(request, "/kyc/bulk-enroll", job, archive, directory)
+
+
+@router.post("/bulk-search")
+async def bulk_search_route(
+    request: Request,
+    archive: UploadFile = File(None),
+    directory: str = Form(None),
+    auth=Depends(verify_api_key)
+):
+    return await _bulk(request, "/kyc/bulk-search", bulk_search, archive, directory)
+
+
 # =====================================================
 # REGISTRY
 # =====================================================
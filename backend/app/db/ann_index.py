@@ -0,0 +1,423 @@
+"""
+IVF (inverted file) approximate nearest-neighbour index over the
+vector_store embeddings.
+
+Coarse centroids are trained with spherical k-means; each stored row
+lives in the inverted list of its closest centroid. A query scores only
+the rows in its n_probe closest lists.
+
+Disabled unless KYC_ANN_INDEX=1 and an index has been built:
+
+    python -m app.db.ann_index build [n_lists]
+    python -m app.db.ann_index report [synthetic_rows]
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+from app.db import vector_store
+from app.db.vector_store import (
+    DB_DIR,
+    EMBEDDING_DIM,
+    LOCK_PATH,
+    gather_rows,
+    normalize_embeddings,
+)
+from app.db.registry_cache import registry
+from app.utils.file_lock import file_lock
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+INDEX_PATH = os.path.join(DB_DIR, "ivf_index.npz")
+
+ANN_ENABLED = os.getenv("KYC_ANN_INDEX", "0") == "1"
+ANN_MIN_ROWS = int(os.getenv("KYC_ANN_MIN_ROWS", "50000"))   # exact scan below this
+N_PROBE = int(os.getenv("KYC_ANN_NPROBE", "16"))
+
+KMEANS_ITERS = 10
+KMEANS_SAMPLE = 256     # training rows per list
+ASSIGN_CHUNK_ROWS = 65536
+SAVE_EVERY = 1000       # persist after this many incremental adds
+
+
+# -------------------------
+# k-means
+# -------------------------
+
+def _assign(vectors, centroids):
+    """
+    Closest centroid per row, chunked to bound memory.
+    """
+    labels = np.empty(len(vectors), dtype=np.int64)
+
+    for start in range(0, len(vectors), ASSIGN_CHUNK_ROWS):
+        block = np.asarray(vectors[start:start + ASSIGN_CHUNK_ROWS])
+        labels[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+
+    return labels
+
+
+def train_centroids(sample, n_lists, iters=KMEANS_ITERS, seed=0):
+    """
+    Spherical k-means on unit vectors. Empty lists are re-seeded
+    from random sample rows.
+    """
+    rng = np.random.default_rng(seed)
+    sample = np.asarray(sample, dtype=np.float32)
+
+    centroids = sample[rng.choice(len(sample), n_lists, replace=False)].copy()
+
+    for _ in range(iters):
+        labels = _assign(sample, centroids)
+
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, sample)
+        counts = np.bincount(labels, minlength=n_lists)
+
+        empty = counts == 0
+        sums[empty] = sample[rng.choice(len(sample), int(empty.sum()))]
+
+        centroids = normalize_embeddings(sums)
+
+    return centroids
+
+
+# -------------------------
+# Index
+# -------------------------
+
+class IVFIndex:
+
+    def __init__(self, centroids, lists=None, count=0, generation=0):
+        self.centroids = np.asarray(centroids, dtype=np.float32)
+        self.lists = lists or [np.empty(0, dtype=np.int64) for _ in self.centroids]
+        self.count = count          # rows [0, count) are indexed
+        self.generation = generation
+        self.unsaved = 0
+        self.lock = threading.Lock()
+
+    @property
+    def n_lists(self):
+        return len(self.centroids)
+
+    def add(self, start, rows):
+        """
+        Add rows with ids start.. to their closest lists.
+        Rows already indexed are skipped. Returns False, adding
+        nothing, when rows before start are missing (another worker
+        appended them) — sync() picks both up.
+        """
+        with self.lock:
+            skip = self.count - start
+
+            if skip < 0:
+                return False
+
+            if skip >= len(rows):
+                return True
+
+            if skip > 0:
+                rows, start = rows[skip:], self.count
+
+            labels = _assign(rows, self.centroids)
+            ids = np.arange(start, start + len(rows), dtype=np.int64)
+
+            for lst in np.unique(labels):
+                self.lists[lst] = np.concatenate([self.lists[lst], ids[labels == lst]])
+
+            self.count = start + len(rows)
+            self.unsaved += len(rows)
+
+            return True
+
+    def sync(self, segments):
+        """
+        Index rows appended by other workers since the last sync.
+        """
+        total = sum(len(s) for s in segments)
+
+        if total <= self.count:
+            return
+
+        tail = gather_rows(segments, np.arange(self.count, total))
+        self.add(self.count, tail)
+
+    def _candidates(self, q, n_probe):
+        probe = min(n_probe, self.n_lists)
+        nearest = np.argpartition(-(self.centroids @ q), probe - 1)[:probe]
+
+        return np.concatenate([self.lists[i] for i in nearest])
+
+    def search(self, query, k=1, n_probe=N_PROBE, segments=None):
+        """
+        Approximate top-k: [(row_id, score), ...] best first.
+        """
+        if segments is None:
+            segments = registry.segments()
+
+        q = normalize_embeddings(query)[0]
+        ids = self._candidates(q, n_probe)
+
+        if len(ids) == 0:
+            return []
+
+        scores = gather_rows(segments, ids) @ q
+
+        top = np.argsort(-scores)[:k]
+
+        return [(int(ids[i]), float(scores[i])) for i in top]
+
+    def find_above(self, query, threshold, n_probe=N_PROBE, segments=None):
+        hits = self.search(query, k=1, n_probe=n_probe, segments=segments)
+
+        if hits and hits[0][1] > threshold:
+            return hits[0]
+
+        return None
+
+    # -------------------------
+    # persistence
+    # -------------------------
+
+    def save(self, path=INDEX_PATH):
+        with self.lock:
+            sizes = np.array([len(l) for l in self.lists], dtype=np.int64)
+            ids = np.concatenate(self.lists) if self.lists else np.empty(0, np.int64)
+            count = self.count
+
+        tmp = path + ".tmp.npz"
+
+        with file_lock(LOCK_PATH):
+            np.savez(tmp, centroids=self.centroids, sizes=sizes, ids=ids,
+                     count=count, generation=self.generation)
+            os.replace(tmp, path)
+
+        self.unsaved = 0
+
+    @classmethod
+    def load(cls, path=INDEX_PATH):
+        data = np.load(path)
+
+        bounds = np.cumsum(data["sizes"])[:-1]
+        lists = np.split(data["ids"], bounds)
+
+        return cls(data["centroids"], lists, int(data["count"]), int(data["generation"]))
+
+
+def build_index(n_lists=None, segments=None, seed=0, generation=None):
+    """
+    Train centroids on a sample and assign every stored row.
+    """
+    if segments is None:
+        snap = registry.snapshot()
+        segments, generation = snap.segments, snap.generation
+
+    total = sum(len(s) for s in segments)
+
+    if total == 0:
+        raise ValueError("registry is empty")
+
+    if n_lists is None:
+        n_lists = max(1, int(np.sqrt(total)))
+
+    n_lists = min(n_lists, total)
+
+    rng = np.random.default_rng(seed)
+    sample_ids = np.sort(rng.choice(total, min(total, n_lists * KMEANS_SAMPLE), replace=False))
+
+    index = IVFIndex(
+        train_centroids(gather_rows(segments, sample_ids), n_lists, seed=seed),
+        generation=generation or 0
+    )
+
+    offset = 0
+    for seg in segments:
+        for start in range(0, len(seg), ASSIGN_CHUNK_ROWS):
+            index.add(offset + start, np.asarray(seg[start:start + ASSIGN_CHUNK_ROWS]))
+        offset += len(seg)
+
+    return index
+
+
+# -------------------------
+# Process-wide instance
+# -------------------------
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index(snapshot=None):
+    """
+    The loaded index, caught up with the registry — or None when
+    ANN search is disabled, unbuilt, or the registry is too small.
+    """
+    global _index
+
+    if not ANN_ENABLED:
+        return None
+
+    if snapshot is None:
+        snapshot = registry.snapshot()
+
+    if snapshot.count < ANN_MIN_ROWS:
+        return None
+
+    with _index_lock:
+        if _index is None and os.path.exists(INDEX_PATH):
+            _index = IVFIndex.load()
+
+        # registry was reset underneath us — index must be rebuilt
+        if _index is not None and (
+            _index.generation != snapshot.generation or _index.count > snapshot.count
+        ):
+            _index = None
+
+        index = _index
+
+    if index is None:
+        return None
+
+    index.sync(snapshot.segments)
+
+    if index.unsaved >= SAVE_EVERY:
+        index.save()
+
+    return index
+
+
+@vector_store.on_append
+def _index_appended(start, rows):
+    index = _index
+
+    if index is None:
+        return
+
+    try:
+        # the header is committed, so the registry already holds
+        # whatever other workers appended before these rows
+        if not index.add(start, rows):
+            index.sync(registry.segments())
+
+        if index.unsaved >= SAVE_EVERY:
+            index.save()
+
+    except Exception as e:
+        logger.warning("ANN index update failed: %s", e)
+
+
+# -------------------------
+# Recall report
+# -------------------------
+
+def _near_duplicates(base, rng, noise):
+    """
+    Perturbed copies of stored rows — re-enrolment lookalikes.
+    """
+    sigma = noise / np.sqrt(EMBEDDING_DIM)
+    return normalize_embeddings(base + rng.normal(0, sigma, base.shape).astype(np.float32))
+
+
+def recall_report(segments=None, n_queries=200, k=10, probes=(1, 2, 4, 8, 16, 32, 64),
+                  threshold=None, n_lists=None, seed=0):
+    """
+    Recall and latency of the IVF index vs exact search.
+
+    Half of the queries are noisy copies of stored rows (should be
+    flagged as duplicates), half are random (should not).
+    duplicate_recall is the share of exact duplicate decisions at
+    threshold that the index reproduces.
+    """
+    from app.services.similarity import SIM_THRESHOLD, search_topk
+
+    if threshold is None:
+        threshold = SIM_THRESHOLD
+
+    if segments is None:
+        segments = registry.segments()
+
+    rng = np.random.default_rng(seed)
+    total = sum(len(s) for s in segments)
+
+    t0 = time.perf_counter()
+    index = build_index(n_lists, segments, seed)
+    build_s = time.perf_counter() - t0
+
+    half = n_queries // 2
+    base = gather_rows(segments, rng.choice(total, half))
+    queries = np.concatenate([
+        _near_duplicates(base, rng, noise=0.45),
+        normalize_embeddings(rng.normal(size=(n_queries - half, EMBEDDING_DIM)))
+    ])
+
+    exact, exact_ms = [], []
+    for q in queries:
+        t0 = time.perf_counter()
+        exact.append(search_topk(q, k=k, segments=segments))
+        exact_ms.append((time.perf_counter() - t0) * 1000)
+
+    exact_dup = np.array([bool(h) and h[0][1] > threshold for h in exact])
+
+    rows = []
+    for n_probe in probes:
+        hits, ms = [], []
+
+        for q in queries:
+            t0 = time.perf_counter()
+            hits.append(index.search(q, k=k, n_probe=n_probe, segments=segments))
+            ms.append((time.perf_counter() - t0) * 1000)
+
+        recall_k = np.mean([
+            len({i for i, _ in a} & {i for i, _ in e}) / max(1, len(e))
+            for a, e in zip(hits, exact)
+        ])
+
+        ann_dup = np.array([bool(h) and h[0][1] > threshold for h in hits])
+        dup_recall = (ann_dup & exact_dup).sum() / max(1, exact_dup.sum())
+
+        rows.append({
+            "n_probe": n_probe,
+            f"recall_at_{k}": round(float(recall_k), 4),
+            "duplicate_recall": round(float(dup_recall), 4),
+            "p50_ms": round(float(np.percentile(ms, 50)), 3),
+            "p95_ms": round(float(np.percentile(ms, 95)), 3),
+        })
+
+    return {
+        "rows": total,
+        "n_lists": index.n_lists,
+        "threshold": threshold,
+        "queries": n_queries,
+        "exact_duplicates": int(exact_dup.sum()),
+        "build_s": round(build_s, 2),
+        "exact_p50_ms": round(float(np.percentile(exact_ms, 50)), 3),
+        "probes": rows,
+    }
+
+
+def _synthetic_segments(n_rows, seed=0):
+    rng = np.random.default_rng(seed)
+    return [normalize_embeddings(rng.normal(size=(n_rows, EMBEDDING_DIM)))]
+
+
+if __name__ == "__main__":
+    cmd = sys.argv[1] if len(sys.argv) > 1 else "report"
+
+    if cmd == "build":
+        lists = int(sys.argv[2]) if len(sys.argv) > 2 else None
+        idx = build_index(lists)
+        idx.save()
+        print(f"IVF index built: {idx.count} rows, {idx.n_lists} lists -> {INDEX_PATH}")
+
+    elif cmd == "report":
+        segs = _synthetic_segments(int(sys.argv[2])) if len(sys.argv) > 2 else None
+        print(json.dumps(recall_report(segs), indent=2))
+
+    else:
+        print("usage: python -m app.db.ann_index [build [n_lists] | report [synthetic_rows]]")
@@ -0,0 +1,182 @@
+"""
+Process-resident view of the embedding registry.
+
+Keeps the segment memmaps open for the life of the process and only
+re-reads the header when header.json changes on disk (another worker
+ran store_face or reset_registry). Appends remap just the segments
+that grew; a generation change (reset) drops everything. In float16 /
+int8 storage the code files are mapped alongside the segments.
+"""
+
+import os
+import threading
+from collections import namedtuple
+
+import numpy as np
+
+from app.db.vector_store import (
+    HEADER_PATH,
+    code_scale,
+    migrate_legacy_db,
+    open_codes,
+    open_segment,
+    read_header,
+)
+from app.utils.logger import get_logger
+from app.utils.metrics import metrics
+
+logger = get_logger(__name__)
+
+# codes / scale: compact per-segment codes and the int8 scale, or
+# None when the registry is stored as float32 only; clipped: row ids
+# whose int8 codes saturated
+RegistrySnapshot = namedtuple(
+    "RegistrySnapshot", ["generation", "count", "segments", "codes", "scale", "clipped"],
+    defaults=(None, None, None)
+)
+
+_EMPTY = RegistrySnapshot(None, 0, [])
+
+
+def _header_stat():
+    try:
+        st = os.stat(HEADER_PATH)
+    except FileNotFoundError:
+        return None
+
+    return st.st_mtime_ns, st.st_size, st.st_ino
+
+
+class RegistryCache:
+
+    def __init__(self):
+        self._snapshot = _EMPTY
+        self._seg_meta = []       # header segment entries backing _snapshot
+        self._codes_key = None    # (generation, storage, codes_rev) behind _snapshot.codes
+        self._stat = None
+        self._migrated = False
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.refreshes = 0        # incremental (append) refreshes
+        self.reloads = 0          # full reloads after a reset
+        self.rows_mapped = 0      # new rows picked up by refreshes
+
+    def snapshot(self):
+        """
+        Current (generation, count, segments). Cheap when unchanged:
+        one stat() call.
+        """
+        if not self._migrated:
+            migrate_legacy_db()
+            self._migrated = True
+
+        stat = _header_stat()
+
+        if stat == self._stat:
+            self.hits += 1
+            return self._snapshot
+
+        with self._lock:
+            self.misses += 1
+
+            if stat != self._stat:
+                self._refresh(stat)
+
+            return self._snapshot
+
+    def segments(self):
+        return self.snapshot().segments
+
+    def _refresh(self, stat):
+        try:
+            header = read_header()
+        except Exception as e:
+            logger.warning("Registry header read failed — keeping cached view: %s", e)
+            return
+
+        if header is None:
+            self._snapshot, self._seg_meta, self._codes_key, self._stat = _EMPTY, [], None, stat
+            return
+
+        dim = header["dim"]
+        metas = [s for s in header["segments"] if s["rows"] > 0]
+        old = self._snapshot
+
+        if header["generation"] != old.generation or header["count"] < old.count:
+            segments = [open_segment(s, dim) for s in metas]
+            self.reloads += 1
+            self.rows_mapped += header["count"]
+
+        else:
+            # reuse memmaps whose segment did not grow
+            segments = []
+            for i, meta in enumerate(metas):
+                if i < len(self._seg_meta) and self._seg_meta[i] == meta:
+                    segments.append(old.segments[i])
+                else:
+                    segments.append(open_segment(meta, dim))
+
+            self.refreshes += 1
+            self.rows_mapped += header["count"] - old.count
+
+        codes, scale = self._map_codes(header, metas)
+        clipped = np.asarray(header["clipped"], dtype=np.int64) if codes is not None else None
+
+        self._seg_meta = [dict(m) for m in metas]
+        self._snapshot = RegistrySnapshot(
+            header["generation"], header["count"], segments, codes, scale, clipped
+        )
+        self._stat = stat
+
+    def _map_codes(self, header, metas):
+        if header["storage"] == "float32":
+            self._codes_key = None
+            return None, None
+
+        key = (header["generation"], header["storage"], header["codes_rev"])
+        old = self._snapshot
+
+        if key == self._codes_key and old.codes is not None:
+            # same encoding: remap only segments that grew
+            codes = [
+                old.codes[i] if i < len(self._seg_meta) and self._seg_meta[i] == meta
+                else open_codes(meta, header)
+                for i, meta in enumerate(metas)
+            ]
+            scale = old.scale
+        else:
+            codes = [open_codes(meta, header) for meta in metas]
+            scale = code_scale(header)
+
+        self._codes_key = key
+
+        return codes, scale
+
+    def stats(self):
+        return {
+            "pid": os.getpid(),
+            "generation": self._snapshot.generation,
+            "rows": self._snapshot.count,
+            "segments": len(self._snapshot.segments),
+            "storage": self._codes_key[1] if self._codes_key else "float32",
+            "hits": self.hits,
+            "misses": self.misses,
+            "refreshes": self.refreshes,
+            "reloads": self.reloads,
+            "rows_mapped": self.rows_mapped,
+        }
+
+
+registry = RegistryCache()
+
+metrics.gauge(
+    "kyc_registry_identities", "Embeddings in the registry",
+    lambda: registry.snapshot().count
+)
+metrics.counter_fn(
+    "kyc_registry_cache_total", "Registry snapshot lookups by outcome",
+    lambda: {(k,): registry.stats()[k] for k in ("hits", "misses", "refreshes", "reloads")},
+    ("outcome",)
+)
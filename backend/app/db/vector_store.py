@@ -3,43 +3,346 @@ import os
 import cv2
 import uuid
 import glob
+import json
+import sys
 
-DB_PATH = "stored_embeddings.npy"
+from app.utils.file_lock import file_lock
+from app.utils.logger import get_logger
+from app.utils.tracing import span
+
+logger = get_logger(__name__)
+
+# -------------------------
+# Storage layout
+# -------------------------
+#
+# embeddings/
+#   header.json       version, dim, count, generation, segment list,
+#                     storage mode (+ int8 scale and clipped rows)
+#   seg_00000.f32     raw (rows, dim) float32, L2-normalised
+#   seg_00000.c0.i8   compact codes of the same rows (float16 / int8
+#                     modes only)
+#   seg_00001.f32     ...
+#
+# Segments are append-only and opened with np.memmap, so load time
+# does not grow with the registry and workers share the page cache.
+# generation is bumped by reset_registry so readers can tell a reset
+# apart from an append.
+#
+# Storage modes (KYC_EMBEDDING_STORAGE, applies to new registries;
+# convert an existing one with `python -m app.db.vector_store storage
+# <mode>`):
+#   float32   searches scan the .f32 segments
+#   float16   searches scan 2-byte codes, then re-rank in float32
+#   int8      searches scan 1-byte codes scaled per dimension
+#             (x[d] ~ code[d] * scale[d]), then re-rank in float32;
+#             a new registry starts from a fixed range, converting to
+#             int8 again re-calibrates the scale on the stored rows;
+#             rows appended later with a component beyond the range
+#             saturate, are listed in "clipped" and always re-ranked
+# The float32 rows are always kept: re-ranking reads only the few
+# candidate rows, so the scan's working set shrinks 2x / 4x.
+
+DB_DIR = "embeddings"
+HEADER_PATH = os.path.join(DB_DIR, "header.json")
+LOCK_PATH = os.path.join(DB_DIR, ".lock")
+
+LEGACY_DB_PATH = "stored_embeddings.npy"
 IMAGE_DIR = "stored_images"
 
+FORMAT_VERSION = 1
+EMBEDDING_DIM = 512
+EMBEDDING_DTYPE = np.dtype("<f4")
+SEGMENT_ROWS = 262144   # 512 MB of float32 per segment
+
+STORAGE_MODE = os.getenv("KYC_EMBEDDING_STORAGE", "float32")
+CODE_DTYPES = {"float16": np.dtype("<f2"), "int8": np.dtype("i1")}
+CODE_SUFFIX = {"float16": ".f16", "int8": ".i8"}
+
+# int8 range before calibration; unit-vector components stay well inside
+INT8_DEFAULT_RANGE = 0.5
+CALIBRATE_CHUNK_ROWS = 65536
+
+# callables hook(start_row, rows) run after each committed append
+_append_hooks = []
+
 
 # -------------------------
-# Core DB functions
+# Header helpers
 # -------------------------
 
-def load_db():
+def _new_header(generation=0, storage=STORAGE_MODE):
+    if storage != "float32" and storage not in CODE_DTYPES:
+        raise ValueError(f"unknown storage mode {storage!r}")
+
+    return {
+        "version": FORMAT_VERSION,
+        "dim": EMBEDDING_DIM,
+        "count": 0,
+        "generation": generation,
+        "storage": storage,
+        "codes_rev": 0,
+        "scale": [INT8_DEFAULT_RANGE / 127] * EMBEDDING_DIM if storage == "int8" else None,
+        "clipped": [],
+        "segments": []
+    }
+
+
+def read_header():
+    if not os.path.exists(HEADER_PATH):
+        return None
+
+    with open(HEADER_PATH, "r") as f:
+        header = json.load(f)
+
+    if header.get("version") != FORMAT_VERSION:
+        raise ValueError(f"unsupported registry version {header.get('version')}")
+
+    header.setdefault("generation", 0)
+    header.setdefault("storage", "float32")
+    header.setdefault("codes_rev", 0)
+    header.setdefault("scale", None)
+    header.setdefault("clipped", [])
+
+    return header
+
+
+def _write_header(header):
     """
-    Load embedding DB safely.
-    Recovers from corruption or shape mismatch.
+    Atomic replace so readers never see a half-written header.
     """
-    if not os.path.exists(DB_PATH):
-        return []
+    tmp = HEADER_PATH + ".tmp"
 
-    try:
-        data = np.load(DB_PATH, allow_pickle=True)
+    with open(tmp, "w") as f:
+        json.dump(header, f)
+        f.flush()
+        os.fsync(f.fileno())
+
+    os.replace(tmp, HEADER_PATH)
+
+
+def _segment_path(name):
+    return os.path.join(DB_DIR, name)
+
+
+def _code_file(seg_file, header):
+    """
+    Codes of a segment. The name carries codes_rev so a re-encode
+    never overwrites files that readers may still have mapped.
+    """
+    stem = os.path.splitext(seg_file)[0]
+    return f"{stem}.c{header['codes_rev']}{CODE_SUFFIX[header['storage']]}"
+
+
+def code_scale(header):
+    if header["scale"] is None:
+        return None
+
+    return np.asarray(header["scale"], dtype=np.float32)
+
+
+def encode_rows(rows, header):
+    """
+    Compact codes for normalised float32 rows in the header's
+    storage mode.
+    """
+    if header["storage"] == "float16":
+        return rows.astype(CODE_DTYPES["float16"])
+
+    # values beyond the calibrated range saturate (see clipped_rows)
+    codes = np.rint(rows / code_scale(header))
+    np.clip(codes, -127, 127, out=codes)
+
+    return codes.astype(CODE_DTYPES["int8"])
+
+
+def clipped_rows(rows, header):
+    """
+    Indices of rows whose int8 codes saturate, so their encoding
+    error is not bounded by half a step.
+    """
+    if header["storage"] != "int8":
+        return np.empty(0, dtype=np.int64)
+
+    return np.flatnonzero((np.abs(rows / code_scale(header)) > 127.5).any(axis=1))
 
-        # ensure list of embeddings
-        db = [np.array(e) for e in data]
 
-        return db
+def normalize_embeddings(embeddings):
+    """
+    (N, dim) float32 copy with unit-length rows.
+    Zero vectors stay zero.
+    """
+    arr = np.asarray(embeddings, dtype=np.float32).reshape(-1, EMBEDDING_DIM)
+
+    norms = np.linalg.norm(arr, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+
+    return np.ascontiguousarray(arr / norms, dtype=EMBEDDING_DTYPE)
+
+
+# -------------------------
+# Core DB functions
+# -------------------------
+
+def load_segments():
+    """
+    Read-only memmaps of every segment, in row order.
+    Only header-committed rows are exposed.
+    """
+    migrate_legacy_db()
 
+    try:
+        header = read_header()
     except Exception as e:
-        print("DB load failed — recovering:", e)
+        logger.error("DB header load failed: %s", e)
+        return []
+
+    if header is None:
         return []
 
+    return [
+        open_segment(seg, header["dim"])
+        for seg in header["segments"]
+        if seg["rows"] > 0
+    ]
+
+
+def open_segment(seg, dim=EMBEDDING_DIM):
+    """
+    Read-only memmap over the committed rows of one segment.
+    """
+    return np.memmap(
+        _segment_path(seg["file"]),
+        dtype=EMBEDDING_DTYPE,
+        mode="r",
+        shape=(seg["rows"], dim)
+    )
+
 
-def save_db(db):
+def open_codes(seg, header):
     """
-    Save embeddings safely as object array
-    to avoid NumPy shape issues.
+    Read-only memmap over the codes of one segment's committed rows.
     """
-    arr = np.array(db, dtype=object)
-    np.save(DB_PATH, arr)
+    return np.memmap(
+        _segment_path(_code_file(seg["file"], header)),
+        dtype=CODE_DTYPES[header["storage"]],
+        mode="r",
+        shape=(seg["rows"], header["dim"])
+    )
+
+
+def load_db():
+    """
+    Whole registry as one (N, dim) float32 matrix.
+    Zero-copy when the registry fits in a single segment.
+    """
+    segments = load_segments()
+
+    if not segments:
+        return np.empty((0, EMBEDDING_DIM), dtype=EMBEDDING_DTYPE)
+
+    if len(segments) == 1:
+        return segments[0]
+
+    return np.concatenate(segments)
+
+
+def gather_rows(segments, ids):
+    """
+    Fetch rows by global row id from a list of segments.
+    """
+    ids = np.asarray(ids, dtype=np.int64)
+    out = np.empty((len(ids), EMBEDDING_DIM), dtype=EMBEDDING_DTYPE)
+
+    offset = 0
+
+    for seg in segments:
+        mask = (ids >= offset) & (ids < offset + len(seg))
+
+        if mask.any():
+            out[mask] = seg[ids[mask] - offset]
+
+        offset += len(seg)
+
+    return out
+
+
+def _write_rows(path, first_row, data):
+    mode = "r+b" if os.path.exists(path) else "wb"
+
+    with open(path, mode) as f:
+        # overwrite anything past the committed rows (torn writes)
+        f.seek(first_row * data.shape[1] * data.itemsize)
+        f.write(data.tobytes())
+        f.truncate()
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def _append_locked(header, rows):
+    """
+    Write normalised rows (and their codes) after the last committed
+    row, then commit them by bumping the header. Caller holds the lock.
+    """
+    written = 0
+
+    while written < len(rows):
+        if not header["segments"] or header["segments"][-1]["rows"] >= SEGMENT_ROWS:
+            name = f"seg_{len(header['segments']):05d}.f32"
+            header["segments"].append({"file": name, "rows": 0})
+
+        seg = header["segments"][-1]
+        take = min(SEGMENT_ROWS - seg["rows"], len(rows) - written)
+        chunk = rows[written:written + take]
+
+        _write_rows(_segment_path(seg["file"]), seg["rows"], chunk)
+
+        if header["storage"] != "float32":
+            _write_rows(
+                _segment_path(_code_file(seg["file"], header)),
+                seg["rows"],
+                encode_rows(chunk, header)
+            )
+
+            first = header["count"] + written
+            header["clipped"].extend((first + clipped_rows(chunk, header)).tolist())
+
+        seg["rows"] += take
+        written += take
+
+    header["count"] += len(rows)
+    _write_header(header)
+
+
+def append_embeddings(embeddings):
+    """
+    Append a batch of embeddings in one write.
+    Returns the row id of the first appended row.
+    """
+    rows = normalize_embeddings(embeddings)
+
+    migrate_legacy_db()
+
+    with span("registry.append"), file_lock(LOCK_PATH):
+        header = read_header() or _new_header()
+        start = header["count"]
+
+        if len(rows):
+            _append_locked(header, rows)
+
+    for hook in _append_hooks:
+        hook(start, rows)
+
+    return start
+
+
+def on_append(hook):
+    """
+    Register hook(start_row, rows), called after every append
+    made by this process (e.g. to keep an index in sync).
+    """
+    _append_hooks.append(hook)
+    return hook
 
 
 def store_face(frame, embedding):
@@ -51,16 +354,161 @@ def store_face(frame, embedding):
     filename = f"{uuid.uuid4().hex}.jpg"
     path = os.path.join(IMAGE_DIR, filename)
 
-    cv2.imwrite(path, frame)
+    with span("registry.store_image"):
+        cv2.imwrite(path, frame)
 
-    db = load_db()
+    append_embeddings(embedding)
 
-    # ensure embedding is numpy array
-    db.append(np.array(embedding))
+    return filename
 
-    save_db(db)
 
-    return filename
+def store_faces(images, embeddings):
+    """
+    Batch store_face for already JPEG-encoded images: every image
+    file first, then all embeddings in one append.
+    Returns the stored filenames, in order.
+    """
+    os.makedirs(IMAGE_DIR, exist_ok=True)
+
+    filenames = [f"{uuid.uuid4().hex}.jpg" for _ in images]
+
+    with span("registry.store_image"):
+        for filename, data in zip(filenames, images):
+            with open(os.path.join(IMAGE_DIR, filename), "wb") as f:
+                f.write(data)
+
+    append_embeddings(embeddings)
+
+    return filenames
+
+
+# -------------------------
+# Storage mode conversion
+# -------------------------
+
+def _calibrate(segments):
+    """
+    Per-dimension int8 scale: the largest magnitude seen in each
+    dimension maps to 127.
+    """
+    peak = np.zeros(EMBEDDING_DIM, dtype=np.float32)
+
+    for seg in segments:
+        for start in range(0, len(seg), CALIBRATE_CHUNK_ROWS):
+            np.maximum(peak, np.abs(seg[start:start + CALIBRATE_CHUNK_ROWS]).max(axis=0), out=peak)
+
+    peak[peak == 0] = INT8_DEFAULT_RANGE
+
+    return peak / 127
+
+
+def set_storage_mode(storage):
+    """
+    Re-encode the registry in another storage mode (int8 is also
+    re-calibrated). New code files are written under a new codes_rev
+    and committed by the header, so searches running meanwhile keep
+    using the old ones. Appends wait until the conversion is done.
+    """
+    migrate_legacy_db()
+
+    with file_lock(LOCK_PATH):
+        header = read_header() or _new_header()
+        fresh = _new_header(storage=storage)
+
+        metas = [s for s in header["segments"] if s["rows"] > 0]
+        segments = [open_segment(s, header["dim"]) for s in metas]
+
+        old_files = [_code_file(s["file"], header) for s in header["segments"]] \
+            if header["storage"] != "float32" else []
+
+        header["storage"] = storage
+        header["codes_rev"] += 1
+        header["scale"] = fresh["scale"]
+        header["clipped"] = []
+
+        if storage == "int8" and segments:
+            header["scale"] = _calibrate(segments).tolist()
+
+        if storage != "float32":
+            first = 0
+
+            for meta, seg in zip(metas, segments):
+                path = _segment_path(_code_file(meta["file"], header))
+
+                for start in range(0, len(seg), CALIBRATE_CHUNK_ROWS):
+                    block = np.asarray(seg[start:start + CALIBRATE_CHUNK_ROWS])
+                    _write_rows(path, start, encode_rows(block, header))
+
+                    header["clipped"].extend((first + start + clipped_rows(block, header)).tolist())
+
+                first += len(seg)
+
+        _write_header(header)
+
+        for name in old_files:
+            path = _segment_path(name)
+
+            if os.path.exists(path):
+                os.remove(path)
+
+    return header
+
+
+def storage_info():
+    header = read_header() or _new_header()
+
+    code_bytes = 0
+    if header["storage"] != "float32":
+        code_bytes = header["count"] * header["dim"] * CODE_DTYPES[header["storage"]].itemsize
+
+    return {
+        "storage": header["storage"],
+        "rows": header["count"],
+        "float32_bytes": header["count"] * header["dim"] * EMBEDDING_DTYPE.itemsize,
+        "code_bytes": code_bytes,
+        "clipped_rows": len(header["clipped"]),
+    }
+
+
+# -------------------------
+# Legacy migration
+# -------------------------
+
+def migrate_legacy_db():
+    """
+    One-shot import of the old pickled object-array registry.
+    The legacy file is kept as *.migrated once imported.
+    """
+    if not os.path.exists(LEGACY_DB_PATH) or os.path.exists(HEADER_PATH):
+        return 0
+
+    with file_lock(LOCK_PATH):
+        # another worker may have finished the migration meanwhile
+        if not os.path.exists(LEGACY_DB_PATH) or os.path.exists(HEADER_PATH):
+            return 0
+
+        try:
+            data = np.load(LEGACY_DB_PATH, allow_pickle=True)
+            vectors = [np.asarray(e, dtype=np.float32).ravel() for e in data]
+        except Exception as e:
+            logger.error("Legacy DB load failed — starting empty: %s", e)
+            vectors = []
+
+        valid = [v for v in vectors if v.shape == (EMBEDDING_DIM,)]
+
+        if len(valid) != len(vectors):
+            logger.warning("Legacy DB: skipped %d malformed rows", len(vectors) - len(valid))
+
+        header = _new_header()
+
+        if valid:
+            _append_locked(header, normalize_embeddings(np.stack(valid)))
+        else:
+            _write_header(header)
+
+        os.replace(LEGACY_DB_PATH, LEGACY_DB_PATH + ".migrated")
+
+    return len(valid)
 
 
 # -------------------------
@@ -92,9 +540,40 @@ def reset_registry():
     """
     Clear embeddings + images safely
     """
-    if os.path.exists(DB_PATH):
-        os.remove(DB_PATH)
+    with file_lock(LOCK_PATH):
+        try:
+            old = read_header()
+        except Exception:
+            old = None
+
+        if os.path.exists(LEGACY_DB_PATH):
+            os.remove(LEGACY_DB_PATH)
+
+        for f in os.listdir(DB_DIR):
+            if f != os.path.basename(LOCK_PATH):
+                os.remove(os.path.join(DB_DIR, f))
+
+        # fresh header with a new generation invalidates reader caches;
+        # the storage mode survives the reset
+        _write_header(_new_header(
+            (old or {}).get("generation", 0) + 1,
+            (old or {}).get("storage", STORAGE_MODE)
+        ))
 
     if os.path.exists(IMAGE_DIR):
         for f in os.listdir(IMAGE_DIR):
             os.remove(os.path.join(IMAGE_DIR, f))
+
+
+if __name__ == "__main__":
+    cmd = sys.argv[1] if len(sys.argv) > 1 else "info"
+
+    if cmd == "storage" and len(sys.argv) > 2:
+        set_storage_mode(sys.argv[2])
+        print(json.dumps(storage_info(), indent=2))
+
+    elif cmd == "info":
+        print(json.dumps(storage_info(), indent=2))
+
+    else:
+        print("usage: python -m app.db.vector_store [info | storage float32|float16|int8]")
@@ -1,6 +1,15 @@
+import threading
+import time
+
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse, PlainTextResponse
 from app.api.kyc import router
 from app.admin.admin_routes import router as admin_router
+from app.services.inference_pool import inference_pool
+from app.services.face_mesh_pool import shutdown_process_executor
+from app.utils.metrics import metrics
+from app.utils.tracing import finish_trace, start_trace
+from app.utils.uploads import MAX_REQUEST_BYTES
 from fastapi.middleware.cors import CORSMiddleware
 
 
@@ -18,6 +27,80 @@ app.add_middleware(
 app.include_router(router)
 app.include_router(admin_router)
 
+REQUEST_SECONDS = metrics.histogram(
+    "kyc_http_request_seconds", "HTTP request latency", ("method", "route", "status")
+)
+
+
+@app.middleware("http")
+async def limit_upload_size(request, call_next):
+    # reject oversize uploads before the multipart body is read
+    limit = MAX_REQUEST_BYTES.get(request.url.path)
+    length = request.headers.get("content-length")
+
+    if limit and length and length.isdigit() and int(length) > limit:
+        return JSONResponse(
+            status_code=413,
+            content={"status": "error", "reason": "payload too large"}
+        )
+
+    return await call_next(request)
+
+
+@app.middleware("http")
+async def trace_requests(request, call_next):
+    # a caller-supplied X-Request-ID is kept so logs can be joined up
+    request_id = request.headers.get("x-request-id", "")[:64] or None
+
+    trace, token = start_trace(f"{request.method} {request.url.path}", request_id)
+    status = 500
+
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        response.headers["X-Request-ID"] = trace.id
+        return response
+
+    finally:
+        # matched route template, so ids in paths cannot explode the label set
+        route = request.scope.get("route")
+
+        REQUEST_SECONDS.observe(
+            time.perf_counter() - trace.start,
+            method=request.method,
+            route=route.path if route is not None else "unmatched",
+            status=status
+        )
+
+        finish_trace(trace, token)
+
+
+@app.on_event("startup")
+def start_inference_pool():
+    # load models in the workers without holding up startup
+    threading.Thread(target=inference_pool.warm_up, daemon=True).start()
+
+
+@app.on_event("shutdown")
+def stop_inference_pool():
+    inference_pool.shutdown()
+    shutdown_process_executor()
+
+
 @app.get("/")
 def root():
     return {"status": "KYC backend running"}
+
+
+@app.get("/ready")
+def ready():
+    # false (503) until every inference worker has loaded its models
+    if not inference_pool.ready:
+        return JSONResponse(status_code=503, content={"ready": False})
+
+    return {"ready": True}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
@@ -1,24 +1,235 @@
+"""
+Per-client, per-route token-bucket rate limiting.
+
+Each (route, client) pair owns a bucket of `requests` tokens that
+refills continuously at requests / window tokens per second; a call
+spends one token or is refused. A bucket is two numbers, so checks are
+O(1) in time and memory.
+
+Backends:
+    memory  (default) per-process OrderedDict with LRU + idle-TTL eviction
+    sqlite  one table in KYC_RATE_LIMIT_DB shared by every worker process
+"""
+
+import asyncio
+import os
+import threading
 import time
+from collections import OrderedDict
 
-_requests = {}
+from app.utils.metrics import metrics
+from app.utils.sqlite_db import SQLiteDB
 
 WINDOW = 10       # seconds
 MAX_REQUESTS = 5  # per window
 
+# route -> (requests, window seconds); "default" covers the rest
+ROUTE_LIMITS = {
+    "default": (MAX_REQUESTS, WINDOW),
+    "/kyc/verify": (MAX_REQUESTS, WINDOW),
+    "/kyc/search": (20, WINDOW),
+    "/kyc/bulk-enroll": (2, 60),
+    "/kyc/bulk-search": (2, 60),
+}
+
+RATE_LIMIT_BACKEND = os.getenv("KYC_RATE_LIMIT_BACKEND", "memory")
+RATE_LIMIT_DB = os.getenv("KYC_RATE_LIMIT_DB", "rate_limit.sqlite3")
+
+MAX_CLIENTS = int(os.getenv("KYC_RATE_LIMIT_CLIENTS", "100000"))
+IDLE_TTL = 300          # seconds; an idle bucket is full again long before this
+SWEEP_EVERY = 1000      # sqlite: delete idle rows every N checks
+
+
+def _parse_limits(spec):
+    """
+    "/kyc/search=20/10,default=5/10" -> {route: (requests, window)}
+    """
+    limits = {}
+
+    for item in filter(None, (s.strip() for s in spec.split(","))):
+        route, _, rule = item.partition("=")
+        requests, _, window = rule.partition("/")
+        limits[route] = (int(requests), float(window or WINDOW))
+
+    return limits
+
+
+ROUTE_LIMITS.update(_parse_limits(os.getenv("KYC_RATE_LIMITS", "")))
+
+
+def _take(bucket, capacity, rate, now):
+    """
+    Refill bucket = [tokens, updated] up to now and spend one token
+    if there is one. Mutates bucket; returns whether it was spent.
+    """
+    tokens = min(capacity, bucket[0] + (now - bucket[1]) * rate)
+    allowed = tokens >= 1
+
+    bucket[0] = tokens - 1 if allowed else tokens
+    bucket[1] = now
+
+    return allowed
+
+
+# -------------------------
+# Backends
+# -------------------------
+
+class MemoryBackend:
+
+    blocking = False            # take() may wait on I/O or locks held by other processes
+
+    def __init__(self, max_clients=MAX_CLIENTS, idle_ttl=IDLE_TTL):
+        self.max_clients = max_clients
+        self.idle_ttl = idle_ttl
+
+        # key -> [tokens, updated], least recently used first
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.evicted = 0
+
+    def take(self, key, capacity, rate):
+        now = time.monotonic()
+
+        with self._lock:
+            bucket = self._buckets.get(key)
+
+            if bucket is None:
+                bucket = self._buckets[key] = [capacity, now]
+            else:
+                self._buckets.move_to_end(key)
+
+            allowed = _take(bucket, capacity, rate, now)
+
+            # front of the dict is the stalest bucket
+            while self._buckets:
+                _, (_, updated) = next(iter(self._buckets.items()))
+
+                if len(self._buckets) <= self.max_clients and now - updated <= self.idle_ttl:
+                    break
+
+                self._buckets.popitem(last=False)
+                self.evicted += 1
+
+            return allowed
+
+    def stats(self):
+        with self._lock:
+            return {"clients": len(self._buckets), "evicted": self.evicted}
+
+
+class SQLiteBackend:
+    """
+    Buckets in a SQLite table so every uvicorn worker enforces the
+    same limits. One short IMMEDIATE transaction per check.
+    """
+
+    blocking = True
+
+    def __init__(self, path=RATE_LIMIT_DB, idle_ttl=IDLE_TTL):
+        self.path = path
+        self.idle_ttl = idle_ttl
+
+        self._db = SQLiteDB(path, (
+            "CREATE TABLE IF NOT EXISTS buckets "
+            "(key TEXT PRIMARY KEY, tokens REAL, updated REAL)",
+            "CREATE INDEX IF NOT EXISTS buckets_updated ON buckets (updated)",
+        ))
+        self._checks = 0
+
+    def take(self, key, capacity, rate):
+        # wall clock: shared between processes
+        now = time.time()
+
+        self._checks += 1
+        sweep = self._checks % SWEEP_EVERY == 0
+
+        with self._db.transaction() as conn:
+            row = conn.execute(
+                "SELECT tokens, updated FROM buckets WHERE key = ?", (key,)
+            ).fetchone()
+
+            bucket = list(row) if row else [capacity, now]
+            allowed = _take(bucket, capacity, rate, now)
+
+            conn.execute(
+                "INSERT OR REPLACE INTO buckets (key, tokens, updated) VALUES (?, ?, ?)",
+                (key, *bucket)
+            )
+
+            if sweep:
+                conn.execute("DELETE FROM buckets WHERE updated < ?", (now - self.idle_ttl,))
+
+        return allowed
+
+    def stats(self):
+        (clients,) = self._db.conn().execute("SELECT COUNT(*) FROM buckets").fetchone()
+        return {"clients": clients, "path": self.path}
+
+
+BACKENDS = {
+    "memory": MemoryBackend,
+    "sqlite": SQLiteBackend,
+}
+
+
+# -------------------------
+# Limiter
+# -------------------------
+
+class RateLimiter:
+
+    def __init__(self, backend=None, limits=None):
+        self.backend = backend or BACKENDS[RATE_LIMIT_BACKEND]()
+        self.limits = limits or ROUTE_LIMITS
+
+        self.allowed = 0
+        self.rejected = 0
+
+    def check(self, client_id, route="default"):
+        requests, window = self.limits.get(route) or self.limits["default"]
+
+        allowed = self.backend.take(f"{route}|{client_id}", requests, requests / window)
+
+        # approximate under threads; only used for stats
+        if allowed:
+            self.allowed += 1
+        else:
+            self.rejected += 1
+
+        return allowed
+
+    def stats(self):
+        return {
+            "backend": type(self.backend).__name__,
+            "limits": {route: {"requests": r, "window_s": w} for route, (r, w) in self.limits.items()},
+            "allowed": self.allowed,
+            "rejected": self.rejected,
+            **self.backend.stats(),
+        }
+
+
+limiter = RateLimiter()
 
-def rate_limit(client_id: str):
+metrics.counter_fn(
+    "kyc_rate_limit_checks_total", "Rate limit checks by outcome",
+    lambda: {("allowed",): limiter.allowed, ("rejected",): limiter.rejected},
+    ("outcome",)
+)
 
-    now = time.time()
 
-    history = _requests.get(client_id, [])
+def rate_limit(client_id: str, route: str = "default"):
 
-    # keep recent requests
-    history = [t for t in history if now - t < WINDOW]
+    return limiter.check(client_id, route)
 
-    if len(history) >= MAX_REQUESTS:
-        return False
 
-    history.append(now)
-    _requests[client_id] = history
+async def rate_limit_async(client_id: str, route: str = "default"):
+    """
+    rate_limit for async handlers. A blocking backend (SQLite can wait
+    up to its busy timeout for the write lock) runs in a worker thread.
+    """
+    if limiter.backend.blocking:
+        return await asyncio.to_thread(limiter.check, client_id, route)
 
-    return True
+    return limiter.check(client_id, route)
@@ -1,44 +1,217 @@
-import time
+"""
+KYC session tokens.
+
+A token is valid for SESSION_TTL seconds. With single-use sessions
+(the default) /kyc/verify consumes the token, so each verification
+needs a fresh one from /kyc/session.
+
+Backends:
+    memory  (default) per-process dict + min-heap of expiry times
+    sqlite  table in KYC_SESSION_DB shared by every worker process
+"""
+
+import asyncio
+import heapq
+import os
 import secrets
+import threading
+import time
 
-_sessions = {}
+from app.utils.metrics import metrics
+from app.utils.sqlite_db import SQLiteDB
 
 SESSION_TTL = 300
-MAX_SESSIONS = 200
+MAX_SESSIONS = int(os.getenv("KYC_MAX_SESSIONS", "10000"))
+SINGLE_USE = os.getenv("KYC_SESSION_SINGLE_USE", "1") == "1"
 
+SESSION_BACKEND = os.getenv("KYC_SESSION_BACKEND", "memory")
+SESSION_DB = os.getenv("KYC_SESSION_DB", "sessions.sqlite3")
 
-def cleanup_sessions():
-    now = time.time()
 
-    expired = [
-        token for token, t in _sessions.items()
-        if now - t > SESSION_TTL
-    ]
+class SessionLimitReached(Exception):
+    """
+    Raised by create_session when MAX_SESSIONS are live.
+    """
 
-    for token in expired:
-        del _sessions[token]
 
+# -------------------------
+# Backends
+# -------------------------
 
-def create_session():
+class MemorySessionStore:
+
+    blocking = False            # calls may wait on I/O or locks held by other processes
+
+    def __init__(self, max_sessions=MAX_SESSIONS):
+        self.max_sessions = max_sessions
+
+        self._expires = {}          # token -> expiry time
+        self._heap = []             # (expiry, token), soonest first
+        self._lock = threading.Lock()
+
+    def _expire(self, now):
+        """
+        Pop expired heap entries. Each token is pushed once and
+        popped once, so this is O(log n) amortized per session.
+        """
+        while self._heap and self._heap[0][0] <= now:
+            expires, token = heapq.heappop(self._heap)
+
+            # consumed tokens are already gone from the dict
+            if self._expires.get(token) == expires:
+                del self._expires[token]
+
+    def create(self, token, ttl):
+        now = time.monotonic()
+
+        with self._lock:
+            self._expire(now)
+
+            if len(self._expires) >= self.max_sessions:
+                raise SessionLimitReached("Too many active sessions")
+
+            self._expires[token] = now + ttl
+            heapq.heappush(self._heap, (now + ttl, token))
+
+    def validate(self, token):
+        # O(1): no sweep needed to answer
+        expires = self._expires.get(token)
+        return expires is not None and expires > time.monotonic()
+
+    def consume(self, token):
+        with self._lock:
+            expires = self._expires.pop(token, None)
+
+        # the heap entry is dropped lazily by _expire
+        return expires is not None and expires > time.monotonic()
+
+    def stats(self):
+        with self._lock:
+            self._expire(time.monotonic())
+            return {"active": len(self._expires), "heap": len(self._heap)}
+
+
+class SQLiteSessionStore:
+    """
+    Sessions in a SQLite table so a token issued by one uvicorn
+    worker is accepted by the others. Lookups use the primary key,
+    expiry sweeps use the index on expires.
+    """
+
+    blocking = True
+
+    def __init__(self, path=SESSION_DB, max_sessions=MAX_SESSIONS):
+        self.path = path
+        self.max_sessions = max_sessions
+
+        self._db = SQLiteDB(path, (
+            "CREATE TABLE IF NOT EXISTS sessions (token TEXT PRIMARY KEY, expires REAL)",
+            "CREATE INDEX IF NOT EXISTS sessions_expires ON sessions (expires)",
+        ))
+
+    def create(self, token, ttl):
+        # wall clock: shared between processes
+        now = time.time()
+
+        with self._db.transaction() as conn:
+            conn.execute("DELETE FROM sessions WHERE expires <= ?", (now,))
 
-    cleanup_sessions()
+            (active,) = conn.execute("SELECT COUNT(*) FROM sessions").fetchone()
 
-    # anti-spam guard
-    if len(_sessions) >= MAX_SESSIONS:
-        raise Exception("Too many active sessions")
+            if active >= self.max_sessions:
+                raise SessionLimitReached("Too many active sessions")
+
+            conn.execute("INSERT INTO sessions (token, expires) VALUES (?, ?)", (token, now + ttl))
+
+    def validate(self, token):
+        row = self._db.conn().execute(
+            "SELECT 1 FROM sessions WHERE token = ? AND expires > ?", (token, time.time())
+        ).fetchone()
+
+        return row is not None
+
+    def consume(self, token):
+        with self._db.transaction() as conn:
+            cur = conn.execute(
+                "DELETE FROM sessions WHERE token = ? AND expires > ?", (token, time.time())
+            )
+
+        return cur.rowcount == 1
+
+    def stats(self):
+        (active,) = self._db.conn().execute(
+            "SELECT COUNT(*) FROM sessions WHERE expires > ?", (time.time(),)
+        ).fetchone()
+
+        return {"active": active, "path": self.path}
+
+
+BACKENDS = {
+    "memory": MemorySessionStore,
+    "sqlite": SQLiteSessionStore,
+}
+
+_store = BACKENDS[SESSION_BACKEND]()
+
+metrics.gauge(
+    "kyc_sessions_active", "Unexpired session tokens",
+    lambda: _store.stats()["active"]
+)
+
+
+# -------------------------
+# API
+# -------------------------
+
+def create_session():
 
     token = secrets.token_hex(16)
-    _sessions[token] = time.time()
+    _store.create(token, SESSION_TTL)
 
     return token
 
 
 def validate_session(token):
 
-    cleanup_sessions()
+    return _store.validate(token)
+
+
+def consume_session(token):
+    """
+    Validate a token and, for single-use sessions, invalidate it in
+    the same step so it cannot be replayed.
+    """
+    if not SINGLE_USE:
+        return _store.validate(token)
+
+    return _store.consume(token)
+
+
+async def _off_loop(fn, *args):
+    # SQLite write transactions can wait out the busy timeout
+    if _store.blocking:
+        return await asyncio.to_thread(fn, *args)
+
+    return fn(*args)
+
+
+async def create_session_async():
+    return await _off_loop(create_session)
+
+
+async def validate_session_async(token):
+    return await _off_loop(validate_session, token)
+
 
-    if token not in _sessions:
-        return False
+async def consume_session_async(token):
+    return await _off_loop(consume_session, token)
 
-    return True
 
+def session_stats():
+    return {
+        "backend": type(_store).__name__,
+        "ttl_s": SESSION_TTL,
+        "max_sessions": MAX_SESSIONS,
+        "single_use": SINGLE_USE,
+        **_store.stats(),
+    }
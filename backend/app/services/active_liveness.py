@@ -1,17 +1,8 @@
 import cv2
 import numpy as np
 import os
-from collections import deque
-from mediapipe.python.solutions import face_mesh
-
-# ------------------ MediaPipe Setup ------------------
-face_mesh_model = face_mesh.FaceMesh(
-    static_image_mode=False,
-    max_num_faces=1,
-    refine_landmarks=True,
-    min_detection_confidence=0.6,
-    min_tracking_confidence=0.6,
-)
+
+from app.services.face_mesh_pool import face_mesh_pool
 
 # ------------------ Parameters ------------------
 EAR_THRESHOLD = 0.20
@@ -19,113 +10,274 @@ BLINK_MIN_FRAMES = 2
 MIN_CONFIDENCE_SCORE = 0.4
 MAX_FRAMES = 180
 
+# ------------------ Speed Controls ------------------
+FRAME_STRIDE = 1            # run FaceMesh on every Nth decoded frame
+MESH_MAX_SIZE = 640         # downscale FaceMesh input whose long side exceeds this
+EARLY_EXIT = os.getenv("KYC_LIVENESS_EARLY_EXIT", "0") == "1"   # heuristic, see LivenessAccumulator
+EXIT_MIN_FRAMES = 45        # processed frames before an early accept
+EXIT_REJECT_MIN_FRAMES = 90 # ... and before an early reject
+EXIT_EVAL_EVERY = 15        # re-score every N processed frames
+EXIT_MARGIN = 0.10          # decide early at MIN_CONFIDENCE_SCORE +- margin
+EXIT_PATIENCE = 2           # ... held for this many consecutive evaluations
+NO_FACE_EXIT_FRAMES = 60    # reject early if no face by then
+
 LEFT_EYE = [33, 160, 158, 133, 153, 144]
 RIGHT_EYE = [263, 387, 385, 362, 380, 373]
 NOSE_IDX = 1
 MOUTH_TOP = 13
 MOUTH_BOTTOM = 14
 
+# landmarks tracked per frame, in this order
+LANDMARK_IDS = LEFT_EYE + RIGHT_EYE + [NOSE_IDX, MOUTH_TOP, MOUTH_BOTTOM]
+_LEFT = slice(0, 6)
+_RIGHT = slice(6, 12)
+_NOSE, _MOUTH_TOP, _MOUTH_BOTTOM = 12, 13, 14
+
 # ------------------ Utility Functions ------------------
 def eye_aspect_ratio(eye):
-    A = np.linalg.norm(eye[1] - eye[5])
-    B = np.linalg.norm(eye[2] - eye[4])
-    C = np.linalg.norm(eye[0] - eye[3])
+    """
+    EAR of one eye (6, 2) or of a stack of eyes (..., 6, 2).
+    """
+    A = np.linalg.norm(eye[..., 1, :] - eye[..., 5, :], axis=-1)
+    B = np.linalg.norm(eye[..., 2, :] - eye[..., 4, :], axis=-1)
+    C = np.linalg.norm(eye[..., 0, :] - eye[..., 3, :], axis=-1)
     return (A + B) / (2.0 * C)
 
+def step_lengths(points):
+    """
+    Distance between consecutive (N, 2) positions.
+    """
+    return np.linalg.norm(np.diff(points, axis=0), axis=1)
+
 def compute_head_movement(points):
     if len(points) < 2:
         return 0.0
-    diffs = [
-        np.linalg.norm(points[i] - points[i - 1])
-        for i in range(1, len(points))
-    ]
-    return float(np.mean(diffs))
+    return float(np.mean(step_lengths(np.asarray(points))))
 
-# ------------------ Main Liveness Function ------------------
-def active_liveness_from_video(video_path):
-    if not os.path.exists(video_path):
-        return {"error": "video_not_found"}
+def count_blinks(ear, min_frames):
+    """
+    Runs of EAR below threshold lasting at least min_frames and
+    closed by an open-eye frame.
+    """
+    closed = np.concatenate([[0], (ear < EAR_THRESHOLD).astype(np.int8), [0]])
+    edges = np.diff(closed)
 
-    cap = cv2.VideoCapture(video_path)
-    if not cap.isOpened():
-        return {"error": "cannot_open_video"}
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
 
-    blink_counter = 0
-    total_blinks = 0
+    # a run still open on the last frame has not finished blinking
+    if len(ends) and ends[-1] == len(ear):
+        starts, ends = starts[:-1], ends[:-1]
 
-    nose_positions = deque(maxlen=20)
-    mouth_movements = []
+    return int(np.count_nonzero(ends - starts >= min_frames))
 
-    frames = 0
+# ------------------ Frame Accumulator ------------------
+class LivenessAccumulator:
+    """
+    Incremental liveness state. Feed decoded BGR frames with
+    update() (or skip() for frames not worth decoding), then read
+    the metrics with result().
 
-    while cap.isOpened() and frames < MAX_FRAMES:
-        ret, frame = cap.read()
-        if not ret:
-            break
+    mesh is a FaceMesh instance owned by this video for its whole
+    duration (see face_mesh_pool.checkout).
 
-        frames += 1
-        rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        result = face_mesh_model.process(rgb)
+    With early_exit the score is re-evaluated as frames arrive and
+    done turns true once it has stayed EXIT_MARGIN above the threshold
+    ("confident") or below it ("not_live") for EXIT_PATIENCE
+    evaluations, or when no face has shown up ("no_face"). This is a
+    heuristic, not the full-run decision: head movement and jitter are
+    measured over the last 20 frames and mouth variance over all of
+    them, so frames after the exit can move the score either way, and
+    no bound short of the last frame rules that out. It is off by
+    default (KYC_LIVENESS_EARLY_EXIT=1 enables it).
+
+    Setting the optional cancel event (threading.Event) stops the
+    accumulator the same way.
+    """
+
+    def __init__(self, mesh, stride=FRAME_STRIDE, max_size=MESH_MAX_SIZE, early_exit=EARLY_EXIT, cancel=None):
+        self.mesh = mesh
+        self.cancel = cancel
+        self.stride = max(1, stride)
+        self.max_size = max_size
+        self.early_exit = early_exit
+
+        # blink length and motion thresholds are per source frame
+        self.blink_min = max(1, -(-BLINK_MIN_FRAMES // self.stride))
 
-        if not result.multi_face_landmarks:
-            continue
+        # (frames, K, 2) pixel coordinates of LANDMARK_IDS, face frames only
+        self.landmarks = np.empty((MAX_FRAMES, len(LANDMARK_IDS), 2))
+
+        self.frames_decoded = 0
+        self.frames_processed = 0
+        self.faces_seen = 0
+
+        self.exit_reason = None
+        self._passes = 0
+        self._fails = 0
+
+    @property
+    def done(self):
+        if self.exit_reason is None and self.cancel is not None and self.cancel.is_set():
+            self.exit_reason = "cancelled"
+
+        return self.frames_decoded >= MAX_FRAMES or self.exit_reason is not None
+
+    def wants_frame(self):
+        """
+        Whether the next decoded frame will be analysed — when False
+        the caller may grab() instead of read() and call skip().
+        """
+        return not self.done and self.frames_decoded % self.stride == 0
+
+    def skip(self):
+        self.frames_decoded += 1
+
+    def update(self, frame):
+        """
+        Analyse one decoded frame. Returns its (K, 2) landmark pixels,
+        or None when the frame was skipped or no face was found.
+        """
+        if self.done:
+            return None
+
+        if not self.wants_frame():
+            self.skip()
+            return None
+
+        self.frames_decoded += 1
+        self.frames_processed += 1
 
-        lm = result.multi_face_landmarks[0].landmark
         h, w, _ = frame.shape
 
-        def pt(i):
-            return np.array([lm[i].x * w, lm[i].y * h])
+        # landmarks are normalised, so scaling back uses the source size
+        scale = self.max_size / max(h, w) if self.max_size else 1.0
 
-        # ------------------ Blink Detection ------------------
-        left_eye = np.array([pt(i) for i in LEFT_EYE])
-        right_eye = np.array([pt(i) for i in RIGHT_EYE])
+        if scale < 1.0:
+            frame = cv2.resize(
+                frame,
+                (int(w * scale), int(h * scale)),
+                interpolation=cv2.INTER_AREA
+            )
+
+        rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        result = self.mesh.process(rgb)
 
-        ear = (eye_aspect_ratio(left_eye) + eye_aspect_ratio(right_eye)) / 2
+        if result.multi_face_landmarks:
+            lm = result.multi_face_landmarks[0].landmark
 
-        if ear < EAR_THRESHOLD:
-            blink_counter += 1
+            row = self.landmarks[self.faces_seen]
+            row[:] = [(lm[i].x, lm[i].y) for i in LANDMARK_IDS]
+            row *= (w, h)
+
+            self.faces_seen += 1
         else:
-            if blink_counter >= BLINK_MIN_FRAMES:
-                total_blinks += 1
-            blink_counter = 0
+            row = None
+
+        if self.early_exit:
+            self._check_exit()
+
+        return row
+
+    def _check_exit(self):
+        n = self.frames_processed
+
+        if self.faces_seen == 0 and n >= NO_FACE_EXIT_FRAMES:
+            self.exit_reason = "no_face"
+            return
+
+        if n < EXIT_MIN_FRAMES or n % EXIT_EVAL_EVERY:
+            return
+
+        confidence = self._metrics()["confidence"]
+
+        self._passes = self._passes + 1 if confidence >= MIN_CONFIDENCE_SCORE + EXIT_MARGIN else 0
+        self._fails = self._fails + 1 if confidence <= MIN_CONFIDENCE_SCORE - EXIT_MARGIN else 0
+
+        if self._passes >= EXIT_PATIENCE:
+            self.exit_reason = "confident"
+
+        elif self._fails >= EXIT_PATIENCE and n >= EXIT_REJECT_MIN_FRAMES:
+            self.exit_reason = "not_live"
+
+    def _metrics(self):
+        pts = self.landmarks[:self.faces_seen]
+
+        # ------------------ Blink Detection ------------------
+        ear = (eye_aspect_ratio(pts[:, _LEFT]) + eye_aspect_ratio(pts[:, _RIGHT])) / 2
+        blinks = count_blinks(ear, self.blink_min)
 
         # ------------------ Head Movement ------------------
-        nose_positions.append(pt(NOSE_IDX))
+        # last 20 nose positions, step lengths computed once
+        steps = step_lengths(pts[-20:, _NOSE]) / self.stride
+
+        head_movement = float(np.mean(steps)) if len(steps) else 0.0
+        jitter = float(np.std(steps)) if len(steps) > 4 else 0.0
 
         # ------------------ Mouth Movement ------------------
-        mouth_open = np.linalg.norm(pt(MOUTH_TOP) - pt(MOUTH_BOTTOM))
-        mouth_movements.append(mouth_open)
+        mouth = np.linalg.norm(pts[:, _MOUTH_TOP] - pts[:, _MOUTH_BOTTOM], axis=1)
+        mouth_variance = float(np.std(mouth)) if len(mouth) > 5 else 0.0
+
+        # ------------------ Confidence Scoring ------------------
+        score = 0.0
+        score += min(1.0, blinks / 2) * 0.30
+        score += min(1.0, head_movement / 3) * 0.30
+        score += min(1.0, jitter / 1.0) * 0.20
+        score += min(1.0, mouth_variance / 3.0) * 0.10
+
+        return {
+            "confidence": float(score),
+            "blink_count": blinks,
+            "head_movement": head_movement,
+            "motion_jitter": jitter,
+            "mouth_variance": mouth_variance,
+        }
+
+    def result(self):
+        m = self._metrics()
+
+        is_live = m["confidence"] >= MIN_CONFIDENCE_SCORE
+
+        return {
+            "is_live": bool(is_live),
+            "confidence": round(m["confidence"], 2),
+            "blink_count": m["blink_count"],
+            "head_movement": round(m["head_movement"], 2),
+            "motion_jitter": round(m["motion_jitter"], 3),
+            "mouth_variance": round(m["mouth_variance"], 2),
+            "frames_decoded": self.frames_decoded,
+            "frames_processed": self.frames_processed,
+            "early_exit": self.exit_reason,
+        }
+
+# ------------------ Main Liveness Function ------------------
+def active_liveness_from_video(video_path):
+    if not os.path.exists(video_path):
+        return {"error": "video_not_found"}
+
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        return {"error": "cannot_open_video"}
+
+    with face_mesh_pool.checkout() as mesh:
+        acc = LivenessAccumulator(mesh)
+
+        while cap.isOpened() and not acc.done:
+            if not acc.wants_frame():
+                if not cap.grab():
+                    break
+                acc.skip()
+                continue
+
+            ret, frame = cap.read()
+            if not ret:
+                break
+
+            acc.update(frame)
 
     cap.release()
 
-    # ------------------ Motion Metrics ------------------
-    head_movement = compute_head_movement(list(nose_positions))
-
-    jitter = np.std([
-        np.linalg.norm(nose_positions[i] - nose_positions[i - 1])
-        for i in range(1, len(nose_positions))
-    ]) if len(nose_positions) > 5 else 0.0
-
-    mouth_variance = np.std(mouth_movements) if len(mouth_movements) > 5 else 0.0
-
-    # ------------------ Confidence Scoring ------------------
-    score = 0.0
-    score += min(1.0, total_blinks / 2) * 0.30
-    score += min(1.0, head_movement / 3) * 0.30
-    score += min(1.0, jitter / 1.0) * 0.20
-    score += min(1.0, mouth_variance / 3.0) * 0.10
-
-    is_live = score >= MIN_CONFIDENCE_SCORE
-
-    return {
-        "is_live": bool(is_live),
-        "confidence": round(score, 2),
-        "blink_count": total_blinks,
-        "head_movement": round(head_movement, 2),
-        "motion_jitter": round(float(jitter), 3),
-        "mouth_variance": round(float(mouth_variance), 2),
-        "frames_processed": frames,
-    }
+    return acc.result()
 
 # ------------------ TEST ------------------
 if __name__ == "__main__":
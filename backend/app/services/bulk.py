@@ -0,0 +1,444 @@
+"""
+Bulk enrollment and watchlist search.
+
+Images come from a directory, a zip or a tar (any compression) and are
+processed BULK_BATCH at a time:
+
+- content-hash cache lookup, then one decode + detect + embed task per
+  inference worker for the misses
+- enroll: one registry search for the whole batch, duplicates within
+  the batch, then every accepted face in a single append
+- search: one matrix-matrix similarity product per registry chunk
+
+Each finished batch is handed to emit(rows) as one result dict per
+image, followed by a final {"summary": {...}} row. The API streams
+these as NDJSON; from the command line (in backend/):
+
+    python -m app.services.bulk enroll faces.tar.gz [--allow-duplicates]
+    python -m app.services.bulk search watchlist/ [--out results.ndjson]
+"""
+
+import argparse
+import json
+import os
+import sys
+import tarfile
+import time
+import zipfile
+import zlib
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from app.admin.attempt_logger import log_attempt
+from app.db.vector_store import normalize_embeddings, store_faces
+from app.services.embedding import get_image_embeddings
+from app.services.embedding_cache import content_key, embedding_cache
+from app.services.inference_pool import InferenceBusy, inference_pool
+from app.services.similarity import SIM_THRESHOLD, search_faces
+from app.utils.logger import get_logger
+from app.utils.metrics import metrics
+from app.utils.tracing import span
+from app.utils.uploads import MAX_IMAGE_BYTES, UploadRejected, is_image
+
+logger = get_logger(__name__)
+
+BULK_BATCH = int(os.getenv("KYC_BULK_BATCH", "32"))
+BULK_ROOT = os.getenv("KYC_BULK_ROOT", "")      # server directories the API may read; empty: none
+
+IMAGE_EXTS = (".jpg", ".jpeg", ".png", ".webp", ".bmp")
+BUSY_RETRY_S = 0.2
+
+BULK_IMAGES = metrics.counter(
+    "kyc_bulk_images_total", "Images processed by bulk jobs", ("operation", "status")
+)
+
+
+# -------------------------
+# Sources
+# -------------------------
+
+def _wanted(name):
+    base = os.path.basename(name)
+
+    return (
+        base.lower().endswith(IMAGE_EXTS)
+        and not base.startswith(".")
+        and "__MACOSX/" not in name
+    )
+
+
+def _read_capped(f):
+    # the size in an archive header can lie; trust what we read
+    data = f.read(MAX_IMAGE_BYTES + 1)
+    return data if len(data) <= MAX_IMAGE_BYTES else None
+
+
+def _iter_directory(path):
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+
+        for name in sorted(files):
+            full = os.path.join(root, name)
+            rel = os.path.relpath(full, path)
+
+            if _wanted(rel):
+                with open(full, "rb") as f:
+                    yield rel, _read_capped(f)
+
+
+def _iter_zip(archive):
+    try:
+        for info in archive.infolist():
+            if info.is_dir() or not _wanted(info.filename):
+                continue
+
+            with archive.open(info) as f:
+                yield info.filename, _read_capped(f)
+    finally:
+        archive.close()
+
+
+def _iter_tar(archive):
+    try:
+        # streaming mode: members are read in order, no seeking
+        for member in archive:
+            if not member.isfile() or not _wanted(member.name):
+                continue
+
+            yield member.name, _read_capped(archive.extractfile(member))
+    finally:
+        archive.close()
+
+
+def open_source(path):
+    """
+    Iterator of (name, bytes) over the images in a directory, zip or
+    tar. bytes is None for images over MAX_IMAGE_BYTES. Close the
+    iterator when done to release the archive.
+    """
+    if os.path.isdir(path):
+        return _iter_directory(path)
+
+    try:
+        if zipfile.is_zipfile(path):
+            return _iter_zip(zipfile.ZipFile(path))
+
+        if tarfile.is_tarfile(path):
+            return _iter_tar(tarfile.open(path, "r|*"))
+
+    except (OSError, zipfile.BadZipFile, tarfile.TarError):
+        pass
+
+    raise UploadRejected("invalid archive")
+
+
+def resolve_directory(directory):
+    """
+    Map a directory named by an API caller to a path under BULK_ROOT.
+    """
+    if not BULK_ROOT:
+        raise UploadRejected("directory input disabled")
+
+    root = os.path.realpath(BULK_ROOT)
+    path = os.path.realpath(os.path.join(root, directory))
+
+    if os.path.commonpath([root, path]) != root or not os.path.isdir(path):
+        raise UploadRejected("invalid directory")
+
+    return path
+
+
+def _batches(source, size):
+    batch = []
+
+    for item in source:
+        batch.append(item)
+
+        if len(batch) == size:
+            yield batch
+            batch = []
+
+    if batch:
+        yield batch
+
+
+# -------------------------
+# Embedding
+# -------------------------
+
+def _run_embeddings(blobs, cancel):
+    # a bulk job waits for queue space instead of failing
+    while True:
+        try:
+            return get_image_embeddings(blobs)
+        except InferenceBusy:
+            if cancel is not None and cancel.is_set():
+                raise
+
+            time.sleep(BUSY_RETRY_S)
+
+
+def _embed_blobs(blobs, cancel):
+    """
+    Per blob: embedding, None (no face) or False (did not decode).
+    The batch is split so every inference worker gets a share.
+    """
+    parts = max(1, min(inference_pool.workers, len(blobs)))
+    bounds = np.linspace(0, len(blobs), parts + 1).astype(int)
+    chunks = [blobs[a:b] for a, b in zip(bounds, bounds[1:])]
+
+    if parts == 1:
+        outputs = [_run_embeddings(blobs, cancel)]
+    else:
+        with ThreadPoolExecutor(parts) as ex:
+            outputs = list(ex.map(lambda c: _run_embeddings(c, cancel), chunks))
+
+    results = []
+
+    for chunk, (embeddings, found, invalid) in zip(chunks, outputs):
+        part = [None] * len(chunk)
+
+        for i in invalid:
+            part[i] = False
+
+        for i, embedding in zip(found, embeddings):
+            part[i] = embedding
+
+        results.extend(part)
+
+    return results
+
+
+def _embed_batch(batch, cancel):
+    """
+    [(name, bytes)] -> [(name, bytes, embedding or None, reject reason)]
+    """
+    items = []
+    misses = []
+
+    for name, data in batch:
+        if data is None:
+            items.append([name, data, None, "image too large"])
+            continue
+
+        if not is_image(data[:16]):
+            items.append([name, data, None, "invalid image"])
+            continue
+
+        key = content_key(data)
+        hit, embedding = embedding_cache.get(key)
+
+        items.append([name, data, embedding, None if embedding is not None else "encoding failed"])
+
+        if not hit:
+            misses.append((len(items) - 1, key))
+
+    if misses:
+        with span("bulk.embed"):
+            embedded = _embed_blobs([items[i][1] for i, _ in misses], cancel)
+
+        for (i, key), embedding in zip(misses, embedded):
+            if embedding is False:
+                items[i][3] = "invalid image"
+                continue
+
+            items[i][2] = embedding_cache.put(key, embedding)
+            items[i][3] = None if embedding is not None else "encoding failed"
+
+    return [tuple(item) for item in items]
+
+
+def _as_jpeg(data):
+    if data[:3] == b"\xff\xd8\xff":
+        return bytes(data)
+
+    frame = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+    return cv2.imencode(".jpg", frame)[1].tobytes()
+
+
+# -------------------------
+# Jobs
+# -------------------------
+
+def _enroll_batch(items, skip_duplicates):
+    rows = [None] * len(items)
+    good = []
+
+    for i, (name, _, _, reason) in enumerate(items):
+        if reason is not None:
+            rows[i] = {"name": name, "status": "rejected", "reason": reason}
+        else:
+            good.append(i)
+
+    if not good:
+        return rows
+
+    embeddings = normalize_embeddings([items[i][2] for i in good])
+    accepted = []
+
+    if skip_duplicates:
+        registry_hits = search_faces(embeddings)
+
+        # earlier faces of this batch are not in the registry yet
+        within = embeddings @ embeddings.T
+
+        for j, i in enumerate(good):
+            match, score = registry_hits[j]
+
+            if not match and accepted:
+                best = max(accepted, key=lambda a: within[j, a])
+
+                if within[j, best] > SIM_THRESHOLD:
+                    match, score = True, float(within[j, best])
+
+            if match:
+                rows[i] = {"name": items[i][0], "status": "duplicate", "similarity": float(score)}
+            else:
+                accepted.append(j)
+    else:
+        accepted = list(range(len(good)))
+
+    if accepted:
+        with span("bulk.store"):
+            filenames = store_faces(
+                [_as_jpeg(items[good[j]][1]) for j in accepted],
+                embeddings[accepted]
+            )
+
+        for j, filename in zip(accepted, filenames):
+            rows[good[j]] = {"name": items[good[j]][0], "status": "enrolled", "file": filename}
+
+    return rows
+
+
+def _search_batch(items):
+    rows = [None] * len(items)
+    good = []
+
+    for i, (name, _, _, reason) in enumerate(items):
+        if reason is not None:
+            rows[i] = {"name": name, "status": "rejected", "reason": reason}
+        else:
+            good.append(i)
+
+    if good:
+        hits = search_faces(np.stack([items[i][2] for i in good]))
+
+        for i, (match, score) in zip(good, hits):
+            if match:
+                rows[i] = {"name": items[i][0], "status": "match_found", "similarity_score": float(score)}
+            else:
+                rows[i] = {"name": items[i][0], "status": "no_match", "closest_score": float(score)}
+
+    return rows
+
+
+def _run_job(operation, source, process, emit, cancel):
+    start = time.perf_counter()
+    counts = Counter()
+    status = "completed"
+
+    try:
+        for batch in _batches(source, BULK_BATCH):
+            if cancel is not None and cancel.is_set():
+                status = "cancelled"
+                break
+
+            rows = process(_embed_batch(batch, cancel))
+
+            for row in rows:
+                counts[row["status"]] += 1
+                BULK_IMAGES.inc(operation=operation, status=row["status"])
+
+            emit(rows)
+
+    except (OSError, EOFError, zlib.error, zipfile.BadZipFile, tarfile.TarError) as e:
+        # corrupt archive member: keep what was processed so far
+        logger.warning("%s stopped on an unreadable archive: %s", operation, e)
+        status = "failed"
+
+    finally:
+        source.close()
+
+    elapsed = time.perf_counter() - start
+    images = sum(counts.values())
+
+    summary = {
+        "operation": operation,
+        "status": status,
+        "images": images,
+        **counts,
+        "seconds": round(elapsed, 2),
+        "images_per_s": round(images / elapsed, 1) if elapsed else 0.0,
+    }
+
+    log_attempt({"type": operation, **summary})
+    logger.info("%s %s: %d images in %.1fs", operation, status, images, elapsed)
+
+    emit([{"summary": summary}])
+
+    return summary
+
+
+def bulk_enroll(source, emit, cancel=None, skip_duplicates=True):
+    """
+    Enroll every face in source (see open_source). Images whose face
+    already matches the registry, or an earlier image of the same
+    job, are reported as duplicates unless skip_duplicates is False.
+    """
+    return _run_job(
+        "bulk_enroll", source,
+        lambda items: _enroll_batch(items, skip_duplicates),
+        emit, cancel
+    )
+
+
+def bulk_search(source, emit, cancel=None):
+    """
+    Search the registry for every face in source.
+    """
+    return _run_job("bulk_search", source, _search_batch, emit, cancel)
+
+
+# -------------------------
+# CLI
+# -------------------------
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m app.services.bulk")
+    parser.add_argument("operation", choices=("enroll", "search"))
+    parser.add_argument("path", help="directory, zip or tar of images")
+    parser.add_argument("--allow-duplicates", action="store_true",
+                        help="enroll faces already in the registry")
+    parser.add_argument("--out", help="write NDJSON results here instead of stdout")
+    args = parser.parse_args(argv)
+
+    try:
+        source = open_source(args.path)
+    except UploadRejected as e:
+        parser.error(f"{args.path}: {e.reason}")
+
+    out = open(args.out, "w") if args.out else sys.stdout
+
+    def emit(rows):
+        for row in rows:
+            out.write(json.dumps(row) + "\n")
+        out.flush()
+
+    try:
+        if args.operation == "enroll":
+            bulk_enroll(source, emit, skip_duplicates=not args.allow_duplicates)
+        else:
+            bulk_search(source, emit)
+    finally:
+        inference_pool.shutdown()
+
+        if out is not sys.stdout:
+            out.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,105 @@
-from app.services.face_model import face_app
+import cv2
+import numpy as np
+
+from app.services.inference_pool import inference_pool
+
+EMBEDDING_DIM = 512
+
 
 def get_embedding(frame):
-    faces = face_app.get(frame)
+    return inference_pool.run("embedding", frame)
+
+
+def get_embeddings(frames):
+    """
+    Batch version of get_embedding for video frames.
+
+    Returns:
+        (F, 512) float32 matrix — one row per frame where a face
+        was found, in frame order.
+    """
+    return inference_pool.run("embeddings", list(frames))
+
+
+def get_image_embeddings(blobs):
+    """
+    Embeddings of encoded images (JPEG/PNG bytes). Decoding happens in
+    the worker, so only the compressed bytes cross the process boundary.
 
-    if not faces:
+    Returns:
+        (embeddings, found, invalid) — embeddings is (F, 512) for the
+        blobs listed in found; invalid lists blobs that did not decode
+    """
+    return inference_pool.run("image_embeddings", [bytes(b) for b in blobs])
+
+
+# -------------------------
+# Model calls (run inside the inference pool)
+# -------------------------
+
+def compute_embedding(frame):
+    embeddings = compute_embeddings([frame])
+
+    if len(embeddings) == 0:
         return None
 
-    return faces[0].embedding
+    return embeddings[0]
+
+
+def _embed_frames(frames):
+    """
+    Detection runs per frame; the aligned crops of every frame with a
+    face go through the recognition model as a single batch.
+
+    Returns (embeddings, indices of the frames they came from).
+    """
+    from insightface.utils import face_align
+    from app.services.face_model import face_models
+
+    det_model = face_models.get("detection")
+    rec_model = face_models.get("recognition")
+
+    crops = []
+    found = []
+
+    for i, frame in enumerate(frames):
+        # same call FaceAnalysis.get makes; best-scoring face first
+        bboxes, kpss = det_model.detect(frame, max_num=0, metric="default")
+
+        if bboxes.shape[0] == 0:
+            continue
+
+        crops.append(face_align.norm_crop(
+            frame,
+            landmark=kpss[0],
+            image_size=rec_model.input_size[0]
+        ))
+        found.append(i)
+
+    if not crops:
+        return np.empty((0, EMBEDDING_DIM), dtype=np.float32), found
+
+    return np.asarray(rec_model.get_feat(crops), dtype=np.float32), found
+
+
+def compute_embeddings(frames):
+    return _embed_frames(frames)[0]
+
+
+def compute_image_embeddings(blobs):
+    frames = []
+    decoded = []
+    invalid = []
+
+    for i, blob in enumerate(blobs):
+        frame = cv2.imdecode(np.frombuffer(blob, np.uint8), cv2.IMREAD_COLOR)
+
+        if frame is None:
+            invalid.append(i)
+        else:
+            frames.append(frame)
+            decoded.append(i)
+
+    embeddings, found = _embed_frames(frames)
+
+    return embeddings, [decoded[i] for i in found], invalid
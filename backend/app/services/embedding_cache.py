@@ -0,0 +1,324 @@
+"""
+Embedding cache keyed by the raw bytes of an uploaded image.
+
+Client retries and back-office re-searches send the same file again;
+a hit returns the stored embedding before the image is even decoded.
+
+- Key: blake2b of the upload bytes, personalised with the model pack
+  so a model change never serves stale vectors.
+- Memory tier: LRU bounded by EMBED_CACHE_BYTES, entries expire after
+  EMBED_CACHE_TTL seconds. "No face found" results are cached too.
+- Disk tier (KYC_EMBED_CACHE_DIR): one .npy per key, shared by all
+  worker processes, same TTL (file mtime). Expired files are deleted
+  when read and by a background sweep that put() starts every
+  DISK_SWEEP_INTERVAL seconds; past EMBED_CACHE_DISK_BYTES the sweep
+  deletes the oldest files. get() and put() then touch the disk, so
+  async callers go through asyncio.to_thread (see uses_disk).
+"""
+
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from app.services.face_model import MODEL_PACK
+from app.utils.logger import get_logger
+from app.utils.metrics import metrics
+
+logger = get_logger(__name__)
+
+EMBED_CACHE_BYTES = int(os.getenv("KYC_EMBED_CACHE_BYTES", str(64 * 1024 * 1024)))
+EMBED_CACHE_TTL = float(os.getenv("KYC_EMBED_CACHE_TTL", "600"))
+EMBED_CACHE_DIR = os.getenv("KYC_EMBED_CACHE_DIR", "")       # empty: no disk tier
+EMBED_CACHE_DISK_BYTES = int(os.getenv("KYC_EMBED_CACHE_DISK_BYTES", str(256 * 1024 * 1024)))
+
+ENTRY_OVERHEAD = 200        # bytes charged per entry besides the vector
+DISK_SWEEP_INTERVAL = 60.0  # seconds between expiry sweeps of the disk tier
+DISK_SWEEP_TARGET = 0.9     # an over-cap sweep deletes down to this share of the cap
+
+
+def content_key(data):
+    return hashlib.blake2b(
+        data, digest_size=16, person=MODEL_PACK.encode()[:16]
+    ).hexdigest()
+
+
+def _remove(path):
+    # another worker may have deleted it first
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+class EmbeddingCache:
+
+    def __init__(self, max_bytes=EMBED_CACHE_BYTES, ttl=EMBED_CACHE_TTL, disk_dir=EMBED_CACHE_DIR,
+                 disk_max_bytes=EMBED_CACHE_DISK_BYTES):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.disk_dir = disk_dir or None
+        self.disk_max_bytes = disk_max_bytes
+
+        # key -> (expires, embedding or None, charged bytes); LRU first
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.bytes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        # other workers write to the same directory: disk_bytes is this
+        # process's estimate, made exact again by every sweep
+        self.disk_bytes = None
+        self.disk_evictions = 0
+        self._next_sweep = 0.0
+        self._sweep_lock = threading.Lock()
+        self._sweeper = None        # background sweep thread, if one is running
+
+    # -------------------------
+    # Memory tier
+    # -------------------------
+
+    def _remember(self, key, embedding, expires):
+        size = ENTRY_OVERHEAD + (embedding.nbytes if embedding is not None else 0)
+
+        with self._lock:
+            old = self._entries.pop(key, None)
+
+            if old is not None:
+                self.bytes -= old[2]
+
+            self._entries[key] = (expires, embedding, size)
+            self.bytes += size
+
+            while self.bytes > self.max_bytes and self._entries:
+                _, (_, _, freed) = self._entries.popitem(last=False)
+                self.bytes -= freed
+                self.evictions += 1
+
+    def _lookup(self, key, now):
+        with self._lock:
+            entry = self._entries.get(key)
+
+            if entry is None:
+                return False, None
+
+            if entry[0] <= now:
+                del self._entries[key]
+                self.bytes -= entry[2]
+                return False, None
+
+            self._entries.move_to_end(key)
+            return True, entry[1]
+
+    # -------------------------
+    # Disk tier
+    # -------------------------
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, key[:2], key + ".npy")
+
+    def _disk_get(self, key, now):
+        path = self._disk_path(key)
+
+        try:
+            if os.path.getmtime(path) + self.ttl <= now:
+                _remove(path)
+                return None
+
+            return np.load(path)
+        except (OSError, ValueError):
+            return None
+
+    def _disk_put(self, key, embedding):
+        path = self._disk_path(key)
+        tmp = f"{path}.{os.getpid()}.tmp"
+
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+            with open(tmp, "wb") as f:
+                np.save(f, embedding)
+                size = f.tell()
+
+            os.replace(tmp, path)
+        except OSError as e:
+            logger.warning("Embedding cache disk write failed: %s", e)
+            return
+
+        with self._lock:
+            if self.disk_bytes is not None:
+                self.disk_bytes += size
+
+            due = self._sweeper is None and (
+                self.disk_bytes is None
+                or self.disk_bytes > self.disk_max_bytes
+                or time.time() >= self._next_sweep
+            )
+
+            if due:
+                # a sweep scans the whole tier; never on the caller's time
+                self._sweeper = threading.Thread(
+                    target=self._background_sweep, args=(time.time(),),
+                    name="embedding-cache-sweep", daemon=True
+                )
+
+        if due:
+            self._sweeper.start()
+
+    def _disk_sweep(self, now, everything=False):
+        """
+        Delete expired files (and leftover .tmp files of crashed
+        writers), then the oldest ones while the tier is over
+        disk_max_bytes. everything=True empties the tier.
+        """
+        # one sweep per process at a time; put() skips if one is running
+        if not self._sweep_lock.acquire(blocking=everything):
+            return
+
+        try:
+            files = []
+            total = 0
+
+            for sub in os.scandir(self.disk_dir):
+                if not sub.is_dir():
+                    continue
+
+                for entry in os.scandir(sub.path):
+                    try:
+                        st = entry.stat()
+                    except OSError:
+                        continue
+
+                    if everything or st.st_mtime + self.ttl <= now:
+                        _remove(entry.path)
+                    else:
+                        files.append((st.st_mtime, st.st_size, entry.path))
+                        total += st.st_size
+
+            if total > self.disk_max_bytes:
+                files.sort()
+                target = self.disk_max_bytes * DISK_SWEEP_TARGET
+
+                for _, size, path in files:
+                    if total <= target:
+                        break
+
+                    _remove(path)
+                    total -= size
+                    self.disk_evictions += 1
+
+            with self._lock:
+                self.disk_bytes = total
+                self._next_sweep = now + DISK_SWEEP_INTERVAL
+
+        except OSError as e:
+            logger.warning("Embedding cache disk sweep failed: %s", e)
+
+        finally:
+            self._sweep_lock.release()
+
+    def _background_sweep(self, now):
+        try:
+            self._disk_sweep(now)
+        finally:
+            with self._lock:
+                self._sweeper = None
+
+    # -------------------------
+    # API
+    # -------------------------
+
+    @property
+    def uses_disk(self):
+        return self.disk_dir is not None
+
+    def get(self, key):
+        """
+        (hit, embedding). embedding is None on a hit for an image in
+        which no face was found.
+        """
+        now = time.time()
+        hit, embedding = self._lookup(key, now)
+
+        if hit:
+            self.hits += 1
+            return True, embedding
+
+        if self.disk_dir is not None:
+            embedding = self._disk_get(key, now)
+
+            if embedding is not None:
+                embedding.setflags(write=False)
+                self._remember(key, embedding, now + self.ttl)
+                self.disk_hits += 1
+                return True, embedding
+
+        self.misses += 1
+        return False, None
+
+    def put(self, key, embedding):
+        """
+        Cache a result and return the (read-only) cached value.
+        """
+        if embedding is not None:
+            embedding = np.array(embedding, dtype=np.float32)
+            embedding.setflags(write=False)
+
+            if self.disk_dir is not None:
+                self._disk_put(key, embedding)
+
+        self._remember(key, embedding, time.time() + self.ttl)
+
+        return embedding
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+        if self.disk_dir is not None and os.path.isdir(self.disk_dir):
+            self._disk_sweep(time.time(), everything=True)
+
+    def stats(self):
+        lookups = self.hits + self.disk_hits + self.misses
+
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "ttl_s": self.ttl,
+                "disk_dir": self.disk_dir,
+                "disk_bytes": self.disk_bytes,
+                "disk_max_bytes": self.disk_max_bytes,
+                "disk_evictions": self.disk_evictions,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round((self.hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+            }
+
+
+embedding_cache = EmbeddingCache()
+
+metrics.counter_fn(
+    "kyc_embedding_cache_lookups_total", "Embedding cache lookups by outcome",
+    lambda: {
+        ("hit",): embedding_cache.hits,
+        ("disk_hit",): embedding_cache.disk_hits,
+        ("miss",): embedding_cache.misses,
+    },
+    ("outcome",)
+)
+metrics.gauge(
+    "kyc_embedding_cache_bytes", "Bytes held by the in-memory embedding cache",
+    lambda: embedding_cache.bytes
+)
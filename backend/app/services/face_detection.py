@@ -1,6 +1,24 @@
-from app.services.face_model import face_app
+from app.services.inference_pool import inference_pool
+
 
 def detect_face(frame):
-    faces = face_app.get(frame)
-    return len(faces) == 1
+    return inference_pool.run("count_faces", frame) == 1
+
+
+def count_faces(frame):
+    """
+    Runs inside the inference pool.
+    """
+    from app.services.face_model import face_models
+
+    # detector only — no recognition pass needed to count faces
+    bboxes, _ = face_models.get("detection").detect(frame, max_num=0, metric="default")
+
+    return bboxes.shape[0]
+
 
+def count_faces_many(frames):
+    """
+    count_faces for a batch of frames in one pool round trip.
+    """
+    return [count_faces(frame) for frame in frames]
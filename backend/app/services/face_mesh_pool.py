@@ -0,0 +1,165 @@
+"""
+Pool of MediaPipe FaceMesh instances.
+
+FaceMesh keeps tracking state between frames, so one instance must
+serve one video at a time. checkout() lends an instance for the length
+of a video and resets it on return. Instances are created on demand up
+to KYC_FACE_MESH_POOL; further callers wait, and the wait is recorded.
+
+With KYC_FACE_MESH_PROCESSES > 0, whole videos can instead be analysed
+in that many worker processes (see video_processing.run_video_analysis).
+"""
+
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+
+from mediapipe.python.solutions import face_mesh
+
+from app.utils.metrics import metrics
+
+FACE_MESH_POOL_SIZE = int(os.getenv("KYC_FACE_MESH_POOL", "4"))
+FACE_MESH_PROCESSES = int(os.getenv("KYC_FACE_MESH_PROCESSES", "0"))
+
+
+def create_face_mesh():
+    return face_mesh.FaceMesh(
+        static_image_mode=False,
+        max_num_faces=1,
+        refine_landmarks=True,
+        min_detection_confidence=0.6,
+        min_tracking_confidence=0.6,
+    )
+
+
+class FaceMeshPool:
+
+    def __init__(self, size=FACE_MESH_POOL_SIZE):
+        self.size = max(1, size)
+
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+
+        self.created = 0
+        self.in_use = 0
+        self.waiting = 0
+        self.checkouts = 0
+        self.waits = 0              # checkouts that had to wait
+        self.wait_total_s = 0.0
+        self.wait_max_s = 0.0
+
+    def _acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            if self.created < self.size:
+                self.created += 1
+                return create_face_mesh()
+
+        # pool exhausted — wait for an instance to come back
+        start = time.perf_counter()
+
+        with self._lock:
+            self.waiting += 1
+
+        try:
+            mesh = self._idle.get()
+        finally:
+            waited = time.perf_counter() - start
+
+            with self._lock:
+                self.waiting -= 1
+                self.waits += 1
+                self.wait_total_s += waited
+                self.wait_max_s = max(self.wait_max_s, waited)
+
+        return mesh
+
+    @contextmanager
+    def checkout(self):
+        mesh = self._acquire()
+
+        with self._lock:
+            self.in_use += 1
+            self.checkouts += 1
+
+        try:
+            yield mesh
+        finally:
+            # drop tracking state before the next video uses it
+            mesh.reset()
+
+            with self._lock:
+                self.in_use -= 1
+
+            self._idle.put(mesh)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": self.size,
+                "created": self.created,
+                "in_use": self.in_use,
+                "waiting": self.waiting,
+                "checkouts": self.checkouts,
+                "waits": self.waits,
+                "wait_total_s": round(self.wait_total_s, 3),
+                "wait_max_s": round(self.wait_max_s, 3),
+                "processes": FACE_MESH_PROCESSES,
+            }
+
+
+face_mesh_pool = FaceMeshPool()
+
+metrics.gauge(
+    "kyc_face_mesh_instances", "FaceMesh pool instances by state",
+    lambda: {
+        ("in_use",): face_mesh_pool.in_use,
+        ("idle",): face_mesh_pool.created - face_mesh_pool.in_use,
+        ("waiting",): face_mesh_pool.waiting,
+    },
+    ("state",)
+)
+
+
+# -------------------------
+# Process-pool mode
+# -------------------------
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_process_executor():
+    """
+    Executor for whole-video analysis, or None when disabled.
+    """
+    global _executor
+
+    if FACE_MESH_PROCESSES <= 0:
+        return None
+
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ProcessPoolExecutor(
+                    max_workers=FACE_MESH_PROCESSES,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+
+    return _executor
+
+
+def shutdown_process_executor():
+    global _executor
+
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
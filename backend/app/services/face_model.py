@@ -1,11 +1,118 @@
-from insightface.app import FaceAnalysis
+"""
+Lazily loaded InsightFace modules.
 
-face_app = FaceAnalysis(name="buffalo_l")
+Only the ONNX models a call path needs are loaded (detection for
+face counting, detection + recognition for embeddings) — the landmark
+and gender/age heads of the pack are never touched. Each module loads
+on first use, or up front through warm_up().
+"""
 
-try:
-    face_app.prepare(ctx_id=0)  # GPU
-    print("InsightFace running on GPU")
-except:
-    face_app.prepare(ctx_id=-1)  # CPU fallback
-    print("InsightFace running on CPU")
+import os
+import threading
+import time
 
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+MODEL_PACK = "buffalo_l"
+MODEL_ROOT = "~/.insightface"
+
+# buffalo_l file for each module we use
+MODULE_FILES = {
+    "detection": "det_10g.onnx",
+    "recognition": "w600k_r50.onnx",
+}
+
+# empty: load nothing up front
+WARM_MODULES = [m for m in os.getenv("KYC_WARM_MODULES", "detection,recognition").split(",") if m]
+
+DET_SIZE = (640, 640)
+DET_THRESH = 0.5
+
+
+def _rss_bytes():
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        pass
+
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return 0
+
+
+class FaceModelRegistry:
+
+    def __init__(self):
+        self._models = {}
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+
+        self.load_info = {}       # module -> {"load_s", "rss_mb"}
+
+    @property
+    def ready(self):
+        return self._ready.is_set()
+
+    def _load(self, module):
+        from insightface.model_zoo import model_zoo
+        from insightface.utils.storage import ensure_available
+
+        model_dir = ensure_available("models", MODEL_PACK, root=MODEL_ROOT)
+        path = os.path.join(model_dir, MODULE_FILES[module])
+
+        model = model_zoo.get_model(path)
+
+        kwargs = {"input_size": DET_SIZE, "det_thresh": DET_THRESH} if module == "detection" else {}
+
+        try:
+            model.prepare(ctx_id=0, **kwargs)   # GPU
+            logger.info("InsightFace %s running on GPU", module)
+        except Exception:
+            model.prepare(ctx_id=-1, **kwargs)  # CPU fallback
+            logger.info("InsightFace %s running on CPU", module)
+
+        return model
+
+    def get(self, module):
+        model = self._models.get(module)
+
+        if model is not None:
+            return model
+
+        with self._lock:
+            if module not in self._models:
+                rss = _rss_bytes()
+                start = time.perf_counter()
+
+                self._models[module] = self._load(module)
+
+                self.load_info[module] = {
+                    "load_s": round(time.perf_counter() - start, 3),
+                    "rss_mb": round((_rss_bytes() - rss) / 2**20, 1),
+                }
+
+            return self._models[module]
+
+    def warm_up(self, modules=None):
+        for module in modules or WARM_MODULES:
+            self.get(module)
+
+        self._ready.set()
+
+        return self.stats()
+
+    def stats(self):
+        return {
+            "pid": os.getpid(),
+            "ready": self.ready,
+            "modules": dict(self.load_info),
+            "rss_mb": round(_rss_bytes() / 2**20, 1),
+        }
+
+
+face_models = FaceModelRegistry()
@@ -1,3 +1,13 @@
+"""
+Blur / brightness gating for selfies and video frames.
+
+Scores are taken on the face when its box is known (e.g. from the
+FaceMesh landmarks of a video frame), otherwise on the whole frame
+reduced with pyrDown until its long side is at most QUALITY_MAX_SIZE.
+"""
+
+from collections import namedtuple
+
 import cv2
 import numpy as np
 
@@ -6,39 +16,104 @@ BLUR_THRESHOLD = 20     # lowered for webcams
 BRIGHT_MIN = 40
 BRIGHT_MAX = 220
 
+QUALITY_MAX_SIZE = 640  # pyramid level long side for whole-frame scoring
+FACE_MARGIN = 0.25      # grow landmark boxes by this fraction per side
+MIN_KEEP_FRAMES = 3     # select_frames never returns fewer (if available)
+
+QualityMetrics = namedtuple(
+    "QualityMetrics",
+    ["blur", "brightness", "is_valid", "reason", "region"]   # region: "face" | "frame"
+)
 
-def check_image_quality(frame):
+
+def landmark_box(points, margin=FACE_MARGIN):
     """
-    Returns:
-        (is_valid, reason)
+    (x0, y0, x1, y1) around (K, 2) pixel landmarks, grown by margin.
     """
+    (x0, y0), (x1, y1) = points.min(axis=0), points.max(axis=0)
+    dx, dy = (x1 - x0) * margin, (y1 - y0) * margin
+
+    return int(x0 - dx), int(y0 - dy), int(x1 + dx), int(y1 + dy)
+
+
+def _gray_region(frame, box, max_size):
+    h, w = frame.shape[:2]
+
+    if box is not None:
+        x0, y0, x1, y1 = box
+        x0, y0 = max(0, x0), max(0, y0)
+        x1, y1 = min(w, x1), min(h, y1)
+
+        if x1 - x0 >= 16 and y1 - y0 >= 16:
+            return cv2.cvtColor(frame[y0:y1, x0:x1], cv2.COLOR_BGR2GRAY), "face"
 
     gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
 
-    # -----------------
-    # Blur detection
-    # -----------------
-    blur_score = cv2.Laplacian(gray, cv2.CV_64F).var()
+    while max(gray.shape) > max_size:
+        gray = cv2.pyrDown(gray)
 
-    # -----------------
-    # Brightness detection
-    # -----------------
-    brightness = np.mean(gray)
+    return gray, "frame"
+
+
+def measure_quality(frame, face_box=None, max_size=QUALITY_MAX_SIZE):
+    """
+    QualityMetrics for one BGR frame.
+    """
+    gray, region = _gray_region(frame, face_box, max_size)
 
-    print("Quality Debug → blur:", blur_score, "brightness:", brightness)
+    # 16-bit Laplacian: exact for uint8 input, far cheaper than CV_64F
+    lap = cv2.Laplacian(gray, cv2.CV_16S)
+    _, std = cv2.meanStdDev(lap)
+
+    blur_score = float(std[0, 0]) ** 2
+    brightness = cv2.mean(gray)[0]
 
-    # blur rejection
     if blur_score < BLUR_THRESHOLD:
-        return False, "image blurry"
+        reason = "image blurry"
+    elif brightness < BRIGHT_MIN:
+        reason = "too dark"
+    elif brightness > BRIGHT_MAX:
+        reason = "too bright"
+    else:
+        reason = None
+
+    return QualityMetrics(
+        round(blur_score, 2), round(brightness, 2), reason is None, reason, region
+    )
+
+
+def score_frames(frames, face_boxes=None, max_size=QUALITY_MAX_SIZE):
+    """
+    QualityMetrics for each frame; face_boxes may hold None entries.
+    """
+    face_boxes = face_boxes or [None] * len(frames)
 
-    # brightness rejection
-    if brightness < BRIGHT_MIN:
-        return False, "too dark"
+    return [measure_quality(f, b, max_size) for f, b in zip(frames, face_boxes)]
 
-    if brightness > BRIGHT_MAX:
-        return False, "too bright"
 
-    return True, None
+def select_frames(frames, face_boxes=None, min_keep=MIN_KEEP_FRAMES):
+    """
+    Drop blurry / badly exposed frames before embedding.
 
+    If fewer than min_keep pass, the sharpest min_keep frames are
+    kept instead so a dim but genuine video still gets an identity
+    check. Returns (kept_frames, metrics_for_all_frames).
+    """
+    metrics = score_frames(frames, face_boxes)
+    keep = [i for i, m in enumerate(metrics) if m.is_valid]
 
+    if len(keep) < min(min_keep, len(frames)):
+        order = np.argsort([-m.blur for m in metrics], kind="stable")
+        keep = sorted(order[:min_keep].tolist())
+
+    return [frames[i] for i in keep], metrics
+
+
+def check_image_quality(frame, face_box=None):
+    """
+    Returns:
+        (is_valid, reason)
+    """
+    m = measure_quality(frame, face_box)
 
+    return m.is_valid, m.reason
@@ -0,0 +1,334 @@
+"""
+InsightFace inference service.
+
+A fixed pool of worker processes, each holding its own copy of the
+face models (loaded as the worker starts, before it takes a task) and
+pinned to KYC_INFERENCE_THREADS CPUs. A pool broken by a dying
+worker is replaced with a fresh one. Callers
+run named tasks through it; when KYC_INFERENCE_QUEUE tasks are already
+pending, run() raises InferenceBusy instead of queueing (the API turns
+that into a 503).
+
+KYC_INFERENCE_WORKERS=0 runs tasks in the calling thread (same
+queue limit), which is handy for development on small machines.
+"""
+
+import importlib
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from app.utils.logger import get_logger
+from app.utils.metrics import metrics
+from app.utils.tracing import span
+
+logger = get_logger(__name__)
+
+INFERENCE_WORKERS = int(os.getenv("KYC_INFERENCE_WORKERS", "2"))
+INFERENCE_THREADS = int(os.getenv("KYC_INFERENCE_THREADS", "2"))
+INFERENCE_QUEUE = int(os.getenv("KYC_INFERENCE_QUEUE", "32"))
+WARM_UP_TIMEOUT = float(os.getenv("KYC_WARM_UP_TIMEOUT", "600"))
+
+# task name -> "module:function" executed inside the worker
+TASKS = {
+    "embedding": "app.services.embedding:compute_embedding",
+    "embeddings": "app.services.embedding:compute_embeddings",
+    "image_embeddings": "app.services.embedding:compute_image_embeddings",
+    "count_faces": "app.services.face_detection:count_faces",
+    "count_faces_many": "app.services.face_detection:count_faces_many",
+}
+
+
+INFERENCE_SECONDS = metrics.histogram(
+    "kyc_inference_seconds", "Inference task time seen by the caller, queueing included", ("task",)
+)
+INFERENCE_COMPUTE_SECONDS = metrics.histogram(
+    "kyc_inference_compute_seconds", "Inference task time inside the worker", ("task",)
+)
+
+
+class InferenceBusy(Exception):
+    """
+    Raised when the inference queue is full.
+    """
+
+
+# -------------------------
+# Worker side
+# -------------------------
+
+_task_fns = {}
+_worker = {}        # "barrier" shared with the pool, "models" stats once warm
+
+
+def _init_worker(counter, threads, barrier):
+    with counter.get_lock():
+        index = counter.value
+        counter.value += 1
+
+    # must be set before onnxruntime / OpenCV spin up their pools
+    for var in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS"):
+        os.environ[var] = str(threads)
+
+    if hasattr(os, "sched_setaffinity"):
+        cpus = sorted(os.sched_getaffinity(0))
+        start = (index * threads) % len(cpus)
+        os.sched_setaffinity(0, {cpus[(start + i) % len(cpus)] for i in range(threads)})
+
+    import cv2
+    cv2.setNumThreads(threads)
+
+    # no task reaches a cold worker; a failure here breaks the pool
+    _worker["barrier"] = barrier
+    _worker["models"] = _warm_up()
+
+
+def _resolve(task):
+    if task not in _task_fns:
+        module, name = TASKS[task].split(":")
+        _task_fns[task] = getattr(importlib.import_module(module), name)
+
+    return _task_fns[task]
+
+
+def _run_task(task, args):
+    start = time.perf_counter()
+    result = _resolve(task)(*args)
+
+    return os.getpid(), time.perf_counter() - start, result
+
+
+def _warm_up():
+    from app.services.face_model import face_models
+
+    return face_models.warm_up()
+
+
+def _worker_started():
+    # returns only once every worker runs one of these at the same time,
+    # so each call lands in a different, already warmed up process
+    _worker["barrier"].wait(WARM_UP_TIMEOUT)
+
+    return _worker["models"]
+
+
+# -------------------------
+# API side
+# -------------------------
+
+class InferencePool:
+
+    def __init__(self, workers=INFERENCE_WORKERS, threads=INFERENCE_THREADS, max_pending=INFERENCE_QUEUE):
+        self.workers = workers
+        self.threads = threads
+        self.max_pending = max_pending
+
+        self.pending = 0
+        self.rejected = 0
+        self.started = time.monotonic()
+        self.worker_stats = {}      # pid -> {"tasks": n, "busy_s": s}
+        self.model_stats = {}       # pid -> face_models.stats()
+        self.ready = False
+
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def _get_executor(self):
+        if self._executor is None and self.workers > 0:
+            with self._lock:
+                if self._executor is None:
+                    ctx = multiprocessing.get_context("spawn")
+
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.workers,
+                        mp_context=ctx,
+                        initializer=_init_worker,
+                        initargs=(ctx.Value("i", 0), self.threads, ctx.Barrier(self.workers))
+                    )
+
+        return self._executor
+
+    def _replace_executor(self, broken):
+        """
+        Drop a pool whose worker died; the next task starts a new one.
+        """
+        with self._lock:
+            if self._executor is not broken:
+                return False
+
+            self._executor = None
+            self.ready = False
+            self.model_stats.clear()
+
+        broken.shutdown(wait=False, cancel_futures=True)
+        logger.error("Inference pool broken (a worker died) — starting a new one")
+
+        return True
+
+    def warm_up(self):
+        """
+        Start every worker and wait until its models are loaded.
+        Returns whether that worked; failures are logged.
+        """
+        executor = self._get_executor()
+
+        try:
+            if executor is None:
+                results = [_warm_up()]
+            else:
+                futures = [executor.submit(_worker_started) for _ in range(self.workers)]
+                results = [f.result() for f in futures]
+
+        except BrokenProcessPool as e:
+            logger.error("Inference warm-up failed, a worker died while loading models: %s", e)
+            self._replace_executor(executor)
+            return False
+
+        except Exception as e:
+            logger.exception("Inference warm-up failed: %s", e)
+            return False
+
+        with self._lock:
+            if executor is not self._executor:
+                return False
+
+            for stats in results:
+                self.model_stats[stats["pid"]] = stats
+
+            self.ready = True
+
+        return True
+
+    def _record(self, pid, busy):
+        with self._lock:
+            stats = self.worker_stats.setdefault(pid, {"tasks": 0, "busy_s": 0.0})
+            stats["tasks"] += 1
+            stats["busy_s"] += busy
+
+    def _release(self, _=None):
+        with self._lock:
+            self.pending -= 1
+
+    def run(self, task, *args):
+        """
+        Execute a task and return its result. Blocks the caller —
+        call through asyncio.to_thread from async code.
+        """
+        start = time.perf_counter()
+
+        with span(f"inference.{task}"):
+            result = self._run(task, args)
+
+        INFERENCE_SECONDS.observe(time.perf_counter() - start, task=task)
+
+        return result
+
+    def _run(self, task, args):
+        with self._lock:
+            if self.pending >= self.max_pending:
+                self.rejected += 1
+                raise InferenceBusy(f"inference queue full ({self.pending} pending)")
+
+            self.pending += 1
+
+        executor = self._get_executor()
+
+        if executor is None:
+            try:
+                pid, busy, result = _run_task(task, args)
+            finally:
+                self._release()
+
+        else:
+            executor, future = self._submit(executor, task, args)
+            future.add_done_callback(self._release)
+
+            try:
+                pid, busy, result = future.result()
+            except BrokenProcessPool:
+                self._rewarm(executor)
+                raise
+
+        self._record(pid, busy)
+        INFERENCE_COMPUTE_SECONDS.observe(busy, task=task)
+
+        return result
+
+    def _submit(self, executor, task, args):
+        """
+        (executor, future) for a task, retried once on a fresh pool
+        when this one broke or was shut down by _replace_executor in
+        another thread — either way the task never started. Releases
+        the caller's queue slot if the task cannot be submitted.
+        """
+        for retry in (False, True):
+            if retry:
+                executor = self._get_executor()
+
+            try:
+                return executor, executor.submit(_run_task, task, args)
+
+            except BrokenProcessPool:
+                self._rewarm(executor)
+
+            except RuntimeError:
+                # "cannot schedule new futures after shutdown"
+                pass
+
+            except BaseException:
+                self._release()
+                raise
+
+        self._release()
+        raise InferenceBusy("inference pool restarting")
+
+    def _rewarm(self, broken):
+        # the failed task is not retried: it may be what killed the worker
+        if self._replace_executor(broken):
+            threading.Thread(target=self.warm_up, daemon=True).start()
+
+    def stats(self):
+        uptime = time.monotonic() - self.started
+
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "threads_per_worker": self.threads,
+                "queue_depth": self.pending,
+                "queue_limit": self.max_pending,
+                "rejected": self.rejected,
+                "ready": self.ready,
+                "models": {str(pid): s for pid, s in self.model_stats.items()},
+                "per_worker": {
+                    str(pid): {
+                        "tasks": s["tasks"],
+                        "busy_s": round(s["busy_s"], 3),
+                        "utilization": round(s["busy_s"] / uptime, 3) if uptime else 0.0,
+                    }
+                    for pid, s in self.worker_stats.items()
+                },
+            }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+inference_pool = InferencePool()
+
+metrics.gauge(
+    "kyc_inference_queue_depth", "Inference tasks submitted and not finished",
+    lambda: inference_pool.pending
+)
+metrics.counter_fn(
+    "kyc_inference_rejected_total", "Inference tasks refused because the queue was full",
+    lambda: inference_pool.rejected
+)
+metrics.gauge(
+    "kyc_inference_ready", "1 once every inference worker has loaded its models",
+    lambda: int(inference_pool.ready)
+)
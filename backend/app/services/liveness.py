@@ -1,69 +1,143 @@
+"""
+Passive liveness: face presence + frame-to-frame motion.
+
+A cheap alternative to active liveness (FaceMesh blink / head
+movement), selected with KYC_LIVENESS_MODE=passive.
+
+- Motion is the mean cv2.absdiff of consecutive frames, downsampled
+  to MOTION_SIZE and converted to uint8 gray in reused buffers.
+- Presence runs the face detector only (no recognition) on every
+  PRESENCE_STRIDE-th frame, in one inference-pool call, and is skipped
+  entirely when motion already fails.
+"""
+
+import cv2
 import numpy as np
-from app.services.embedding import get_embedding
 
+from app.services.inference_pool import inference_pool
+
+PRESENCE_STRIDE = 2     # run the detector on every Nth frame
+MOTION_SIZE = 160       # long side of the motion buffers
 
-def simple_liveness_check(frames):
+# thresholds (demo tuned)
+FACE_THRESHOLD = 0.6
+MOTION_THRESHOLD = 3.0  # on MOTION_SIZE gray; ~4.0 on full-res colour
+
+
+class MotionEstimator:
     """
-    Demo-safe liveness check using:
-    - face presence ratio
-    - motion energy
+    Mean absolute difference between consecutive frames. Buffers are
+    sized from the first frame and reused for every later one.
     """
 
-    face_count = 0
-    motion_total = 0
+    def __init__(self, size=MOTION_SIZE):
+        self.size = size
 
-    valid_pairs = 0
+        self._dsize = None
+        self._small = None
+        self._prev = None
+        self._cur = None
+        self._diff = None
 
-    # -----------------------
-    # face presence check
-    # -----------------------
+        self.pairs = 0
+        self.total = 0.0
 
-    for frame in frames:
+    def _allocate(self, frame):
+        h, w = frame.shape[:2]
+        scale = min(1.0, self.size / max(h, w))
+        sw, sh = max(1, int(w * scale)), max(1, int(h * scale))
+
+        self._dsize = (sw, sh)
+        self._small = np.empty((sh, sw, 3), np.uint8)
+        self._prev = np.empty((sh, sw), np.uint8)
+        self._cur = np.empty((sh, sw), np.uint8)
+        self._diff = np.empty((sh, sw), np.uint8)
 
-        emb = get_embedding(frame)
+    def update(self, frame):
+        """
+        Feed the next frame; returns its difference to the previous
+        one, or None for the first frame.
+        """
+        first = self._dsize is None
 
-        if emb is not None:
-            face_count += 1
+        if first:
+            self._allocate(frame)
 
-    face_ratio = face_count / max(1, len(frames))
+        cv2.resize(frame, self._dsize, dst=self._small, interpolation=cv2.INTER_AREA)
+        cv2.cvtColor(self._small, cv2.COLOR_BGR2GRAY, dst=self._cur)
 
-    # -----------------------
-    # motion check
-    # -----------------------
+        diff = None
 
-    for i in range(len(frames) - 1):
+        if not first:
+            cv2.absdiff(self._cur, self._prev, dst=self._diff)
+            diff = cv2.mean(self._diff)[0]
 
-        f1 = frames[i].astype(float)
-        f2 = frames[i + 1].astype(float)
+            self.pairs += 1
+            self.total += diff
 
-        diff = np.mean(np.abs(f1 - f2))
+        self._prev, self._cur = self._cur, self._prev
 
-        motion_total += diff
-        valid_pairs += 1
+        return diff
 
-    motion_score = motion_total / max(1, valid_pairs)
+    @property
+    def score(self):
+        return self.total / max(1, self.pairs)
+
+
+def presence_ratio(frames):
+    """
+    Share of frames in which the detector finds a face.
+    """
+    if not frames:
+        return 0.0
 
-    print("Liveness Debug → face_ratio:", face_ratio)
-    print("Liveness Debug → motion_score:", motion_score)
+    counts = inference_pool.run("count_faces_many", frames)
 
-    # -----------------------
-    # thresholds (demo tuned)
-    # -----------------------
+    return sum(c > 0 for c in counts) / len(frames)
 
-    FACE_THRESHOLD = 0.6
-    MOTION_THRESHOLD = 4.0
 
+def passive_result(face_ratio, motion_score, frames_checked):
     live = (
-        face_ratio >= FACE_THRESHOLD
+        face_ratio is not None
+        and face_ratio >= FACE_THRESHOLD
         and motion_score >= MOTION_THRESHOLD
     )
 
     return {
-        "is_live": live,
+        "is_live": bool(live),
         "face_ratio": face_ratio,
-        "motion_score": motion_score
+        "motion_score": round(motion_score, 3),
+        "frames_checked": frames_checked,
+        "mode": "passive",
     }
 
 
+def simple_liveness_check(frames, stride=PRESENCE_STRIDE):
+    """
+    Demo-safe liveness check using:
+    - face presence ratio
+    - motion energy
+    """
+    motion = MotionEstimator()
+
+    for frame in frames:
+        motion.update(frame)
+
+    # a static replay fails here without touching the detector
+    if motion.score < MOTION_THRESHOLD:
+        return passive_result(None, motion.score, 0)
+
+    sampled = frames[::max(1, stride)]
+
+    return passive_result(presence_ratio(sampled), motion.score, len(sampled))
 
 
+def liveness_check(frame1, frame2):
+    """
+    Two-frame movement check for callers that have already verified
+    a face in each frame (see vision_pipeline).
+    """
+    motion = MotionEstimator()
+    motion.update(frame1)
+
+    return motion.update(frame2) >= MOTION_THRESHOLD
@@ -1,8 +1,29 @@
+import os
+
 import numpy as np
-from app.db.vector_store import load_db
+from app.db.vector_store import EMBEDDING_DIM, gather_rows, normalize_embeddings
+from app.db.registry_cache import registry
+from app.db.ann_index import get_index
+from app.utils.logger import get_logger
+from app.utils.tracing import span
+
+logger = get_logger(__name__)
 
 SIM_THRESHOLD = 0.85
 
+# rows scored per matmul — bounds the temporary score buffer
+SEARCH_CHUNK_ROWS = 65536
+
+# codes widened to float32 per step; the 1 MB buffer stays in L2
+CODE_CHUNK_ROWS = 512
+
+# rows per query re-ranked in float32 after a code scan
+RERANK_CANDIDATES = int(os.getenv("KYC_RERANK_CANDIDATES", "64"))
+
+# float16 keeps 11 significant bits: |q.x - q.fp16(x)| <= 2**-11
+# for unit q and x; doubled for subnormals and rounding in the sum
+FLOAT16_ERROR = 2.0 ** -10
+
 
 def cosine_similarity(a, b):
 
@@ -14,46 +35,306 @@ def cosine_similarity(a, b):
     return np.dot(a, b) / den
 
 
+# -------------------------
+# Blocked search engine
+# -------------------------
+
+def _iter_chunks(segments, chunk_rows):
+    """
+    Yield (first_row_id, block) over all segments without copying.
+    """
+    offset = 0
+
+    for seg in segments:
+        for start in range(0, len(seg), chunk_rows):
+            yield offset + start, seg[start:start + chunk_rows]
+
+        offset += len(seg)
+
+
+def _topk(scored, n_queries, k):
+    """
+    Running top-k over (first_row_id, (Q, rows) scores) pairs.
+    Returns (scores, ids), each (Q, k), best first; ids are -1 where
+    fewer than k rows were seen.
+    """
+    best_scores = np.full((n_queries, k), -np.inf, dtype=np.float32)
+    best_ids = np.full((n_queries, k), -1, dtype=np.int64)
+
+    for offset, scores in scored:
+        ids = np.arange(offset, offset + scores.shape[1], dtype=np.int64)
+
+        if scores.shape[1] > k:
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            scores = np.take_along_axis(scores, top, axis=1)
+            ids = ids[top]
+        else:
+            ids = np.broadcast_to(ids, scores.shape)
+
+        # merge chunk winners with the running best
+        all_scores = np.concatenate([best_scores, scores], axis=1)
+        all_ids = np.concatenate([best_ids, ids], axis=1)
+
+        keep = np.argpartition(-all_scores, k - 1, axis=1)[:, :k]
+        best_scores = np.take_along_axis(all_scores, keep, axis=1)
+        best_ids = np.take_along_axis(all_ids, keep, axis=1)
+
+    order = np.argsort(-best_scores, axis=1)
+
+    return (
+        np.take_along_axis(best_scores, order, axis=1),
+        np.take_along_axis(best_ids, order, axis=1)
+    )
+
+
+def search_topk(queries, k=1, segments=None, chunk_rows=SEARCH_CHUNK_ROWS):
+    """
+    Exact top-k cosine search.
+
+    queries: one embedding (dim,) or a batch (Q, dim).
+    Returns a list of (row_id, score) pairs, best first — or one
+    such list per query when a batch is given.
+    """
+    single = np.ndim(queries) == 1
+    q = normalize_embeddings(queries)
+
+    if segments is None:
+        segments = registry.segments()
+
+    scored = ((offset, q @ block.T) for offset, block in _iter_chunks(segments, chunk_rows))
+    best_scores, best_ids = _topk(scored, len(q), k)
+
+    results = [
+        [
+            (int(i), float(s))
+            for i, s in zip(ids_row, scores_row)
+            if i >= 0
+        ]
+        for ids_row, scores_row in zip(best_ids, best_scores)
+    ]
+
+    return results[0] if single else results
+
+
+def find_above(query, threshold=SIM_THRESHOLD, segments=None, chunk_rows=SEARCH_CHUNK_ROWS):
+    """
+    Threshold-only mode: stop at the first chunk containing a
+    score above threshold.
+    Returns (row_id, score) of that chunk's best hit, or None.
+    """
+    q = normalize_embeddings(query)[0]
+
+    if segments is None:
+        segments = registry.segments()
+
+    for offset, block in _iter_chunks(segments, chunk_rows):
+        scores = block @ q
+        best = int(np.argmax(scores))
+
+        if scores[best] > threshold:
+            return offset + best, float(scores[best])
+
+    return None
+
+
+# -------------------------
+# Compact-code search (float16 / int8 storage)
+# -------------------------
+
+def _code_scores(q, codes, span_rows=SEARCH_CHUNK_ROWS, chunk_rows=CODE_CHUNK_ROWS):
+    """
+    Yield (first_row_id, (Q, rows) approximate scores) over code
+    segments, span_rows at a time. Codes are widened to float32
+    chunk_rows at a time into one small reused buffer.
+    """
+    buf = np.empty((chunk_rows, EMBEDDING_DIM), dtype=np.float32)
+    offset = 0
+
+    for seg in codes:
+        for span_start in range(0, len(seg), span_rows):
+            span_end = min(span_start + span_rows, len(seg))
+            scores = np.empty((len(q), span_end - span_start), dtype=np.float32)
+
+            for start in range(span_start, span_end, chunk_rows):
+                block = seg[start:min(start + chunk_rows, span_end)]
+                out = buf[:len(block)]
+                np.copyto(out, block, casting="unsafe")
+
+                scores[:, start - span_start:start - span_start + len(block)] = q @ out.T
+
+            yield offset + span_start, scores
+
+        offset += len(seg)
+
+
+def _code_queries(q, scale):
+    # q . (code * scale) == (q * scale) . code: fold int8 scale into q
+    return q if scale is None else q * scale
+
+
+def _code_error(q, scale):
+    """
+    Per query, the most an approximate score can be off from the
+    float32 one because of encoding (rounding is at most half a step;
+    clipped int8 rows are not covered).
+    """
+    if scale is None:
+        return np.full(len(q), FLOAT16_ERROR, dtype=np.float32)
+
+    return 0.5 * (np.abs(q) @ scale)
+
+
+def search_codes(queries, k=1, snapshot=None, candidates=RERANK_CANDIDATES):
+    """
+    search_topk for float16 / int8 storage: scan the codes for the
+    best `candidates` rows per query, then re-rank just those rows
+    (and every clipped int8 row) against the float32 segments.
+    Scores are exact.
+    """
+    single = np.ndim(queries) == 1
+    q = normalize_embeddings(queries)
+
+    if snapshot is None:
+        snapshot = registry.snapshot()
+
+    scored = _code_scores(_code_queries(q, snapshot.scale), snapshot.codes)
+    _, cand = _topk(scored, len(q), max(k, candidates))
+
+    results = []
+
+    for query, ids in zip(q, cand):
+        ids = np.union1d(ids[ids >= 0], snapshot.clipped)
+        scores = gather_rows(snapshot.segments, ids) @ query
+        top = np.argsort(-scores)[:k]
+
+        results.append([(int(ids[i]), float(scores[i])) for i in top])
+
+    return results[0] if single else results
+
+
+def find_above_codes(query, threshold=SIM_THRESHOLD, snapshot=None):
+    """
+    find_above for float16 / int8 storage. Rows whose approximate
+    score is within the encoding error of the threshold are checked
+    in float32, so the decision is the same as a float32 scan.
+    Clipped int8 rows have no such bound and are always checked.
+    """
+    q = normalize_embeddings(query)
+    query = q[0]
+
+    if snapshot is None:
+        snapshot = registry.snapshot()
+
+    if len(snapshot.clipped):
+        exact = gather_rows(snapshot.segments, snapshot.clipped) @ query
+        best = int(np.argmax(exact))
+
+        if exact[best] > threshold:
+            return int(snapshot.clipped[best]), float(exact[best])
+
+    floor = threshold - _code_error(q, snapshot.scale)[0]
+
+    for offset, scores in _code_scores(_code_queries(q, snapshot.scale), snapshot.codes):
+        near = np.flatnonzero(scores[0] > floor)
+
+        if len(near) == 0:
+            continue
+
+        ids = near + offset
+        exact = gather_rows(snapshot.segments, ids) @ query
+        best = int(np.argmax(exact))
+
+        if exact[best] > threshold:
+            return int(ids[best]), float(exact[best])
+
+    return None
+
+
+# -------------------------
+# Registry queries
+# -------------------------
+
 def check_duplicate(new_emb):
 
-    db = load_db()
+    snap = registry.snapshot()
+    index = get_index(snap)
 
-    for emb in db:
-        score = cosine_similarity(new_emb, emb)
+    with span("similarity.duplicate"):
+        if index is not None:
+            return index.find_above(new_emb, SIM_THRESHOLD, segments=snap.segments) is not None
 
-        if score > SIM_THRESHOLD:
-            return True
+        if snap.codes is not None:
+            return find_above_codes(new_emb, SIM_THRESHOLD, snapshot=snap) is not None
 
-    return False
+        return find_above(new_emb, SIM_THRESHOLD, segments=snap.segments) is not None
 
 
 def search_face(new_emb):
 
-    db = load_db()
+    snap = registry.snapshot()
+    index = get_index(snap)
 
-    if not db:
-        return False, 0.0
+    with span("similarity.search"):
+        if index is not None:
+            hits = index.search(new_emb, k=1, segments=snap.segments)
+        elif snap.codes is not None:
+            hits = search_codes(new_emb, k=1, snapshot=snap)
+        else:
+            hits = search_topk(new_emb, k=1, segments=snap.segments)
 
-    best_score = -1
+    if not hits:
+        return False, 0.0
 
-    for emb in db:
-        score = cosine_similarity(new_emb, emb)
-        best_score = max(best_score, score)
+    _, best_score = hits[0]
 
     if best_score > SIM_THRESHOLD:
         return True, best_score
 
     return False, best_score
 
+
+def search_faces(embeddings):
+    """
+    Batch search_face: [(match, score), ...] per row of an (N, dim)
+    matrix. The exact path scores the whole batch with one
+    matrix-matrix product per registry chunk.
+    """
+    snap = registry.snapshot()
+    index = get_index(snap)
+
+    with span("similarity.search_batch"):
+        if index is not None:
+            hits = [index.search(e, k=1, segments=snap.segments) for e in embeddings]
+        elif snap.codes is not None:
+            hits = search_codes(embeddings, k=1, snapshot=snap)
+        else:
+            hits = search_topk(embeddings, k=1, segments=snap.segments)
+
+    results = []
+
+    for row in hits:
+        score = row[0][1] if row else 0.0
+        results.append((score > SIM_THRESHOLD, score))
+
+    return results
+
+
+def identity_scores(reference, embeddings):
+    """
+    Cosine similarity of one reference embedding against each
+    row of an (F, dim) matrix, as one dot product.
+    """
+    ref = normalize_embeddings(reference)[0]
+
+    return normalize_embeddings(embeddings) @ ref
+
+
 def verify_identity_match(emb1, emb2, threshold=0.75):
     """
     Compare selfie vs video identity
     """
     score = cosine_similarity(emb1, emb2)
 
-    print("Identity match score:", score)
+    logger.debug("identity match score %.4f", score)
 
     return score >= threshold, score
-
-
-
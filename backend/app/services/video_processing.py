@@ -1,4 +1,27 @@
 import cv2
+import os
+import time
+from concurrent.futures import TimeoutError
+
+from app.services.active_liveness import LivenessAccumulator
+from app.services.face_mesh_pool import face_mesh_pool, get_process_executor
+from app.services.image_quality import landmark_box, select_frames
+from app.services.liveness import (
+    PRESENCE_STRIDE,
+    MOTION_THRESHOLD,
+    MotionEstimator,
+    passive_result,
+    presence_ratio
+)
+from app.utils.tracing import record, span
+
+# "active": FaceMesh blink / head movement, "passive": presence + motion
+LIVENESS_MODE = os.getenv("KYC_LIVENESS_MODE", "active")
+
+PASSIVE_FRAMES = 90         # decoded frames examined in passive mode
+PASSIVE_SAMPLE_EVERY = 3    # every Nth decoded frame feeds motion / presence
+
+CANCEL_POLL_S = 0.1
 
 
 def extract_frames(video_path, max_frames=10):
@@ -22,3 +45,182 @@ def extract_frames(video_path, max_frames=10):
     cap.release()
 
     return frames
+
+
+def analyze_video(video_path, max_frames=10, cancel=None):
+    """
+    Single decode pass shared by active liveness and identity
+    frame sampling. Stops as soon as the cancel event is set.
+
+    Sampled frames are quality-gated (on the face box when FaceMesh
+    found one) so blurry or badly exposed frames never reach the
+    embedding model.
+
+    Returns:
+        (liveness_result, frames)
+    """
+    if not os.path.exists(video_path):
+        return {"error": "video_not_found"}, []
+
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        return {"error": "cannot_open_video"}, []
+
+    # decode and FaceMesh interleave per frame; their totals are
+    # recorded as two spans at the end
+    decode_s = mesh_s = 0.0
+    checkout_start = time.perf_counter()
+
+    with face_mesh_pool.checkout() as mesh:
+        record("facemesh.checkout", time.perf_counter() - checkout_start, checkout_start)
+
+        acc = LivenessAccumulator(mesh, cancel=cancel)
+        frames = []
+        boxes = []
+
+        while cap.isOpened() and (not acc.done or len(frames) < max_frames):
+
+            if acc.exit_reason == "cancelled":
+                break
+
+            t0 = time.perf_counter()
+
+            # frames nobody needs are grabbed but never converted
+            if len(frames) >= max_frames and not acc.wants_frame():
+                grabbed = cap.grab()
+                decode_s += time.perf_counter() - t0
+
+                if not grabbed:
+                    break
+
+                acc.skip()
+                continue
+
+            ret, frame = cap.read()
+            t1 = time.perf_counter()
+            decode_s += t1 - t0
+
+            if not ret:
+                break
+
+            points = acc.update(frame)
+            mesh_s += time.perf_counter() - t1
+
+            if len(frames) < max_frames:
+                frames.append(frame)
+                boxes.append(None if points is None else landmark_box(points))
+
+    cap.release()
+
+    record("video.decode", decode_s)
+    record("liveness.facemesh", mesh_s)
+
+    with span("quality.select_frames"):
+        frames, _ = select_frames(frames, boxes)
+
+    return acc.result(), frames
+
+
+def analyze_video_passive(video_path, max_frames=10, cancel=None):
+    """
+    analyze_video for KYC_LIVENESS_MODE=passive: motion on a frame
+    sample, then detector-only presence on every PRESENCE_STRIDE-th
+    sampled frame (skipped when motion already fails).
+    """
+    if not os.path.exists(video_path):
+        return {"error": "video_not_found"}, []
+
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        return {"error": "cannot_open_video"}, []
+
+    motion = MotionEstimator()
+    presence = []
+    frames = []
+    decoded = 0
+    decode_s = motion_s = 0.0
+
+    while cap.isOpened() and decoded < PASSIVE_FRAMES:
+
+        if cancel is not None and cancel.is_set():
+            break
+
+        sample = decoded % PASSIVE_SAMPLE_EVERY == 0
+        decoded += 1
+
+        t0 = time.perf_counter()
+
+        if not sample and len(frames) >= max_frames:
+            grabbed = cap.grab()
+            decode_s += time.perf_counter() - t0
+
+            if not grabbed:
+                break
+            continue
+
+        ret, frame = cap.read()
+        t1 = time.perf_counter()
+        decode_s += t1 - t0
+
+        if not ret:
+            break
+
+        if len(frames) < max_frames:
+            frames.append(frame)
+
+        if sample:
+            if motion.pairs % PRESENCE_STRIDE == 0:
+                presence.append(frame)
+
+            motion.update(frame)
+            motion_s += time.perf_counter() - t1
+
+    cap.release()
+
+    record("video.decode", decode_s)
+    record("liveness.motion", motion_s)
+
+    if motion.score < MOTION_THRESHOLD:
+        result = passive_result(None, motion.score, 0)
+    else:
+        with span("liveness.presence"):
+            ratio = presence_ratio(presence)
+
+        result = passive_result(ratio, motion.score, len(presence))
+
+    result["frames_decoded"] = decoded
+
+    with span("quality.select_frames"):
+        frames, _ = select_frames(frames)
+
+    return result, frames
+
+
+def run_video_analysis(video_path, max_frames=10, cancel=None):
+    """
+    Video analysis for the configured KYC_LIVENESS_MODE. Active
+    analysis runs in a FaceMesh worker process when process mode is
+    enabled, otherwise in the calling thread.
+
+    In process mode a cancelled analysis is dropped from the queue if
+    it has not started yet; one already running finishes in the worker
+    and its result is discarded.
+    """
+    if LIVENESS_MODE == "passive":
+        # no FaceMesh involved; presence checks go to the inference pool
+        return analyze_video_passive(video_path, max_frames, cancel)
+
+    executor = get_process_executor()
+
+    if executor is None:
+        return analyze_video(video_path, max_frames, cancel)
+
+    future = executor.submit(analyze_video, video_path, max_frames)
+
+    while True:
+        try:
+            return future.result(timeout=CANCEL_POLL_S)
+        except TimeoutError:
+            if cancel is not None and cancel.is_set():
+                future.cancel()
+                return {"error": "cancelled"}, []
@@ -0,0 +1,175 @@
+"""
+In-process metrics rendered in the Prometheus text format.
+
+Counters and histograms are updated on the hot path under a per-metric
+lock; gauges are callbacks evaluated only when /metrics is scraped.
+Values are per process — with several uvicorn workers each one is
+scraped (or sampled) separately, like /admin/registry-cache.
+"""
+
+import bisect
+import threading
+
+DEFAULT_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0,
+)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [*zip(names, values), *extra]
+
+    if not pairs:
+        return ""
+
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, "")) for name in self.labels)
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} {self.kind}"
+        yield from self._render_samples()
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+
+        with self._lock:
+            self._series[key] = self._series.get(key, 0) + amount
+
+    def _render_samples(self):
+        with self._lock:
+            series = list(self._series.items())
+
+        for key, value in series:
+            yield f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}"
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+
+        # per-bucket (non-cumulative) counts; the last slot is +Inf
+        i = bisect.bisect_left(self.buckets, value)
+
+        with self._lock:
+            state = self._series.get(key)
+
+            if state is None:
+                state = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+
+            state[0][i] += 1
+            state[1] += value
+            state[2] += 1
+
+    def _render_samples(self):
+        with self._lock:
+            series = [(key, list(counts), total, n) for key, (counts, total, n) in self._series.items()]
+
+        for key, counts, total, n in series:
+            cumulative = 0
+
+            for bound, count in zip((*self.buckets, float("inf")), counts):
+                cumulative += count
+                labels = _format_labels(self.labels, key, [("le", _format_value(bound))])
+                yield f"{self.name}_bucket{labels} {cumulative}"
+
+            labels = _format_labels(self.labels, key)
+            yield f"{self.name}_sum{labels} {_format_value(total)}"
+            yield f"{self.name}_count{labels} {n}"
+
+
+class CallbackMetric(_Metric):
+    """
+    Value read at scrape time. fn returns a number, or a dict of
+    label-value tuples to numbers when labels are declared.
+    """
+
+    def __init__(self, name, help, fn, labels=(), kind="gauge"):
+        super().__init__(name, help, labels)
+        self.fn = fn
+        self.kind = kind
+
+    def _render_samples(self):
+        try:
+            value = self.fn()
+        except Exception:
+            return
+
+        series = value.items() if self.labels else [((), value)]
+
+        for key, v in series:
+            yield f"{self.name}{_format_labels(self.labels, key)} {_format_value(v)}"
+
+
+class MetricsRegistry:
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name, help, labels=()):
+        return self._register(Counter(name, help, labels))
+
+    def histogram(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, help, labels, buckets))
+
+    def gauge(self, name, help, fn, labels=()):
+        return self._register(CallbackMetric(name, help, fn, labels))
+
+    def counter_fn(self, name, help, fn, labels=()):
+        """
+        Counter whose value is kept elsewhere (e.g. a stats attribute).
+        """
+        return self._register(CallbackMetric(name, help, fn, labels, kind="counter"))
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
@@ -0,0 +1,48 @@
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+
+class SQLiteDB:
+    """
+    Thread-local connections to one SQLite file shared between
+    worker processes. WAL mode; schema statements run on connect.
+    """
+
+    def __init__(self, path, schema=()):
+        self.path = path
+        self.schema = schema
+
+        self._local = threading.local()
+
+    def conn(self):
+        conn = getattr(self._local, "conn", None)
+
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+
+            for stmt in self.schema:
+                conn.execute(stmt)
+
+            self._local.conn = conn
+
+        return conn
+
+    @contextmanager
+    def transaction(self):
+        """
+        Write transaction, taking the database lock up front so a
+        read-modify-write cannot interleave with another process.
+        """
+        conn = self.conn()
+        conn.execute("BEGIN IMMEDIATE")
+
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+        conn.execute("COMMIT")
@@ -0,0 +1,128 @@
+"""
+Timing spans for the request pipeline.
+
+span(name) times a block and feeds kyc_span_seconds{span=name}. While
+a request is being traced (see main.trace_requests) the span is also
+added to that request's Trace; the trace follows the request through
+asyncio tasks and asyncio.to_thread, since both copy contextvars.
+Work done in other processes (inference, FaceMesh process mode) is
+timed from the calling side.
+
+With KYC_TRACE_SLOW_MS set, requests at least that slow are kept —
+a KYC_TRACE_SAMPLE share of them — in memory for /admin/traces and
+appended to KYC_TRACE_FILE as JSON lines.
+"""
+
+import contextvars
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+
+from app.utils.metrics import metrics
+
+TRACE_SLOW_MS = float(os.getenv("KYC_TRACE_SLOW_MS", "0"))     # 0: no dumps
+TRACE_SAMPLE = float(os.getenv("KYC_TRACE_SAMPLE", "1.0"))
+TRACE_FILE = os.getenv("KYC_TRACE_FILE", "slow_traces.jsonl")
+RECENT_TRACES = 50
+
+SPAN_SECONDS = metrics.histogram(
+    "kyc_span_seconds", "Duration of traced pipeline spans", ("span",)
+)
+
+_current = contextvars.ContextVar("kyc_trace", default=None)
+
+_recent = deque(maxlen=RECENT_TRACES)
+_file_lock = threading.Lock()
+
+
+class Trace:
+
+    def __init__(self, name, trace_id=None):
+        self.id = trace_id or uuid.uuid4().hex[:16]
+        self.name = name
+        self.started_at = time.strftime("%Y-%m-%d %H:%M:%S")
+        self.start = time.perf_counter()
+        self.duration = None
+
+        # (name, start offset s, duration s); appended from any thread
+        self.spans = []
+
+    def to_dict(self):
+        return {
+            "trace_id": self.id,
+            "name": self.name,
+            "started_at": self.started_at,
+            "duration_ms": round(self.duration * 1000, 2) if self.duration is not None else None,
+            "spans": [
+                {"name": n, "offset_ms": round(o * 1000, 2), "duration_ms": round(d * 1000, 2)}
+                for n, o, d in sorted(self.spans, key=lambda s: s[1])
+            ],
+        }
+
+
+def current_trace():
+    return _current.get()
+
+
+def record(name, seconds, start=None):
+    """
+    Record an already measured span. start is its perf_counter()
+    start time; without it the span is placed to end now.
+    """
+    SPAN_SECONDS.observe(seconds, span=name)
+
+    trace = _current.get()
+
+    if trace is not None:
+        if start is None:
+            start = time.perf_counter() - seconds
+
+        trace.spans.append((name, start - trace.start, seconds))
+
+
+@contextmanager
+def span(name):
+    start = time.perf_counter()
+
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - start, start)
+
+
+def start_trace(name, trace_id=None):
+    """
+    Begin tracing the current context. Returns (trace, token) for
+    finish_trace.
+    """
+    trace = Trace(name, trace_id)
+    return trace, _current.set(trace)
+
+
+def finish_trace(trace, token):
+    trace.duration = time.perf_counter() - trace.start
+    _current.reset(token)
+
+    if not TRACE_SLOW_MS or trace.duration * 1000 < TRACE_SLOW_MS:
+        return
+
+    if random.random() >= TRACE_SAMPLE:
+        return
+
+    data = trace.to_dict()
+    _recent.append(data)
+
+    try:
+        with _file_lock, open(TRACE_FILE, "a") as f:
+            f.write(json.dumps(data) + "\n")
+    except OSError:
+        pass
+
+
+def recent_traces():
+    return list(_recent)
@@ -0,0 +1,144 @@
+import os
+import tempfile
+
+MAX_IMAGE_BYTES = int(os.getenv("KYC_MAX_IMAGE_BYTES", str(10 * 1024 * 1024)))
+MAX_VIDEO_BYTES = int(os.getenv("KYC_MAX_VIDEO_BYTES", str(60 * 1024 * 1024)))
+MAX_ARCHIVE_BYTES = int(os.getenv("KYC_MAX_ARCHIVE_BYTES", str(1024 * 1024 * 1024)))
+
+# whole multipart body, checked from Content-Length before it is read
+MAX_REQUEST_BYTES = {
+    "/kyc/verify": MAX_IMAGE_BYTES + MAX_VIDEO_BYTES + 64 * 1024,
+    "/kyc/search": MAX_IMAGE_BYTES + 64 * 1024,
+    "/kyc/bulk-enroll": MAX_ARCHIVE_BYTES + 64 * 1024,
+    "/kyc/bulk-search": MAX_ARCHIVE_BYTES + 64 * 1024,
+}
+
+CHUNK_SIZE = 1024 * 1024
+
+# memory-backed spool when available: no disk write + re-read
+SPOOL_DIR = "/dev/shm" if os.access("/dev/shm", os.W_OK) else None
+
+
+class UploadRejected(Exception):
+
+    def __init__(self, reason):
+        super().__init__(reason)
+        self.reason = reason
+
+
+# -------------------------
+# Content sniffing
+# -------------------------
+
+def is_video(head):
+    return (
+        head[4:8] == b"ftyp"                            # mp4 / mov / 3gp
+        or head[:4] == b"\x1a\x45\xdf\xa3"              # webm / mkv
+        or (head[:4] == b"RIFF" and head[8:12] == b"AVI ")
+    )
+
+
+def is_image(head):
+    return (
+        head[:3] == b"\xff\xd8\xff"                     # jpeg
+        or head[:8] == b"\x89PNG\r\n\x1a\n"
+        or (head[:4] == b"RIFF" and head[8:12] == b"WEBP")
+        or head[:2] == b"BM"
+    )
+
+
+def is_archive(head):
+    return (
+        head[:4] in (b"PK\x03\x04", b"PK\x05\x06")      # zip
+        or head[:2] == b"\x1f\x8b"                      # tar.gz
+        or head[:3] == b"BZh"                           # tar.bz2
+        or head[:6] == b"\xfd7zXZ\x00"                  # tar.xz
+        or head[257:262] == b"ustar"                    # plain tar
+    )
+
+
+# -------------------------
+# Readers
+# -------------------------
+
+def _check_declared_size(upload, limit, kind):
+    size = getattr(upload, "size", None)
+
+    if size is not None and size > limit:
+        raise UploadRejected(f"{kind} too large")
+
+
+async def read_image_bytes(upload, limit=MAX_IMAGE_BYTES):
+    """
+    Read an image upload chunk by chunk into one buffer,
+    rejecting non-images and oversize files on the first chunk.
+    """
+    _check_declared_size(upload, limit, "image")
+
+    buf = bytearray()
+
+    while True:
+        chunk = await upload.read(CHUNK_SIZE)
+
+        if not chunk:
+            break
+
+        if not buf and not is_image(chunk[:16]):
+            raise UploadRejected("invalid image")
+
+        buf += chunk
+
+        if len(buf) > limit:
+            raise UploadRejected("image too large")
+
+    return buf
+
+
+async def _spool(upload, limit, kind, sniff, suffix, spool_dir):
+    _check_declared_size(upload, limit, kind)
+
+    fd, path = tempfile.mkstemp(suffix=suffix, dir=spool_dir)
+    written = 0
+
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while True:
+                chunk = await upload.read(CHUNK_SIZE)
+
+                if not chunk:
+                    break
+
+                if written == 0 and not sniff(chunk[:512]):
+                    raise UploadRejected(f"invalid {kind}")
+
+                written += len(chunk)
+
+                if written > limit:
+                    raise UploadRejected(f"{kind} too large")
+
+                out.write(chunk)
+
+        if written == 0:
+            raise UploadRejected(f"invalid {kind}")
+
+    except BaseException:
+        os.remove(path)
+        raise
+
+    return path
+
+
+async def spool_video(upload, limit=MAX_VIDEO_BYTES):
+    """
+    Stream a video upload into a size-capped spool file that
+    OpenCV can open. Returns the path; the caller removes it.
+    """
+    return await _spool(upload, limit, "video", is_video, ".mp4", SPOOL_DIR)
+
+
+async def spool_archive(upload, limit=MAX_ARCHIVE_BYTES):
+    """
+    Same for a zip / tar of images. Archives can be large, so they
+    go to the regular temp directory rather than /dev/shm.
+    """
+    return await _spool(upload, limit, "archive", is_archive, ".archive", None)
@@ -0,0 +1,85 @@
+"""
+Attempt log: caller-side log_attempt latency, durable throughput and
+admin queries on top of an existing log of a given size.
+"""
+
+import time
+
+from app.admin import attempt_logger
+from app.admin.attempt_logger import load_stats, log_attempt, scan_attempts
+
+from benchmarks.common import summarize, timed, workdir
+
+PREFILL_BATCH = 10000
+DRAIN_TIMEOUT_S = 120
+
+
+def _entry(i):
+    return {
+        "type": "kyc",
+        "status": "rejected" if i % 3 else "approved",
+        "reason": "liveness failed" if i % 3 == 1 else "identity mismatch",
+        "similarity": 0.5,
+    }
+
+
+def _prefill(n):
+    stamp = time.strftime(attempt_logger.TIME_FORMAT)
+
+    for lo in range(0, n, PREFILL_BATCH):
+        attempt_logger._write_batch([
+            {"timestamp": stamp, **_entry(i)} for i in range(lo, min(n, lo + PREFILL_BATCH))
+        ])
+
+
+def _wait_for_total(total):
+    deadline = time.monotonic() + DRAIN_TIMEOUT_S
+
+    while load_stats()["total"] < total:
+        if time.monotonic() > deadline:
+            raise TimeoutError("attempt log writer did not drain")
+
+        time.sleep(0.02)
+
+
+def run_size(n, writes=5000):
+    with workdir():
+        start = time.perf_counter()
+        _prefill(n)
+        prefill_s = time.perf_counter() - start
+
+        samples = []
+        start = time.perf_counter()
+
+        for i in range(writes):
+            t0 = time.perf_counter()
+            log_attempt(_entry(i))
+            samples.append(time.perf_counter() - t0)
+
+        _wait_for_total(n + writes)
+        durable_s = time.perf_counter() - start
+
+        _, stats_s = timed(load_stats, repeat=20)
+
+        def first_page():
+            return sum(1 for _ in zip(range(100), scan_attempts()))
+
+        def filtered_page():
+            return sum(1 for _ in zip(range(100), scan_attempts(status="approved")))
+
+        _, page_s = timed(first_page, repeat=20)
+        _, filtered_s = timed(filtered_page, repeat=20)
+
+        return {
+            "prefilled": n,
+            "prefill_s": round(prefill_s, 3),
+            "log_attempt": summarize(samples),
+            "durable_per_s": round(writes / durable_s, 1),
+            "load_stats": summarize(stats_s),
+            "first_page_100": summarize(page_s),
+            "first_page_100_approved": summarize(filtered_s),
+        }
+
+
+def run(sizes=(10000, 100000, 1000000), writes=5000):
+    return {str(n): run_size(n, writes) for n in sizes}
@@ -0,0 +1,32 @@
+"""
+Active liveness frames per second on the sample video.
+"""
+
+import os
+
+from app.services.active_liveness import active_liveness_from_video
+
+from benchmarks.common import SAMPLE_VIDEO, summarize, timed
+
+
+def run(video=SAMPLE_VIDEO, repeat=5):
+    if not os.path.exists(video):
+        return {"skipped": f"{video} not found"}
+
+    # first run pays for FaceMesh creation
+    _, cold = timed(active_liveness_from_video, video)
+    result, samples = timed(active_liveness_from_video, video, repeat=repeat)
+
+    mean_s = sum(samples) / len(samples)
+
+    return {
+        "video": os.path.basename(video),
+        "cold_s": round(cold[0], 3),
+        "latency": summarize(samples),
+        "frames_decoded": result["frames_decoded"],
+        "frames_processed": result["frames_processed"],
+        "decoded_fps": round(result["frames_decoded"] / mean_s, 1),
+        "processed_fps": round(result["frames_processed"] / mean_s, 1),
+        "early_exit": result["early_exit"],
+        "is_live": result["is_live"],
+    }
@@ -0,0 +1,241 @@
+"""
+Embedding storage modes: float16 / int8 codes against float32.
+
+Per mode: registry pages mapped by a search, warm and cold (page
+cache dropped) duplicate-check latency, batch search throughput, and
+whether duplicate / match decisions at SIM_THRESHOLD agree with the
+float32 scan — with re-ranking, and what a code-only scan would
+have decided.
+"""
+
+import gc
+import os
+import time
+
+import numpy as np
+
+from app.db import vector_store
+from app.db.registry_cache import RegistryCache, registry
+from app.services.similarity import (
+    SIM_THRESHOLD,
+    check_duplicate,
+    find_above,
+    find_above_codes,
+    search_face,
+    search_faces,
+)
+
+from benchmarks.common import (
+    fill_registry,
+    forget_registry,
+    summarize,
+    synthetic_embeddings,
+    workdir,
+)
+
+MODES = ("float16", "int8")
+COLD_RUNS = 3
+BORDER = 0.005          # border queries sit within this of SIM_THRESHOLD
+
+
+def _queries(n_rows, n, seed=1):
+    """
+    Thirds: near-copies of stored rows, rows at cosine
+    SIM_THRESHOLD +- BORDER from a stored row, and random vectors.
+    """
+    rng = np.random.default_rng(seed)
+    third = n // 3
+
+    stored = vector_store.gather_rows(vector_store.load_segments(), rng.choice(n_rows, 2 * third))
+    copies = stored[:third] + rng.normal(0, 0.01, (third, stored.shape[1]))
+
+    # unit vectors orthogonal to each base row
+    base = stored[third:]
+    ortho = synthetic_embeddings(third, seed=seed + 1)
+    ortho -= np.sum(ortho * base, axis=1, keepdims=True) * base
+    ortho = vector_store.normalize_embeddings(ortho)
+
+    cos = SIM_THRESHOLD + rng.uniform(-BORDER, BORDER, (third, 1))
+    border = cos * base + np.sqrt(1 - cos ** 2) * ortho
+
+    return vector_store.normalize_embeddings(np.concatenate([
+        copies, border, synthetic_embeddings(n - 2 * third, seed=seed + 2)
+    ]))
+
+
+def _drop_page_cache():
+    """
+    Evict the registry files from the page cache (they are fsynced
+    on append, so nothing is dirty). Pages still mapped by a live
+    memmap stay resident — callers drop their snapshots first.
+    """
+    for name in os.listdir(vector_store.DB_DIR):
+        fd = os.open(os.path.join(vector_store.DB_DIR, name), os.O_RDONLY)
+
+        try:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+        finally:
+            os.close(fd)
+
+
+def _mapped_mb():
+    """
+    Resident registry pages mapped into this process, from smaps.
+    """
+    db_dir = os.path.abspath(vector_store.DB_DIR)
+    total_kb = 0
+    in_db = False
+
+    with open("/proc/self/smaps") as f:
+        for line in f:
+            fields = line.split()
+
+            if "-" in fields[0] and len(fields) >= 5:
+                in_db = len(fields) >= 6 and fields[5].startswith(db_dir)
+            elif in_db and fields[0] == "Rss:":
+                total_kb += int(fields[1])
+
+    return round(total_kb / 1024, 1)
+
+
+def _cold_scans(queries, storage):
+    """
+    A full duplicate scan per run, each from an empty page cache and
+    a freshly mapped snapshot.
+    """
+    samples = []
+    mapped = 0.0
+
+    forget_registry()
+
+    for q in queries[:COLD_RUNS]:
+        gc.collect()
+        _drop_page_cache()
+
+        snap = RegistryCache().snapshot()
+        start = time.perf_counter()
+
+        if storage == "float32":
+            find_above(q, SIM_THRESHOLD, segments=snap.segments)
+        else:
+            find_above_codes(q, SIM_THRESHOLD, snapshot=snap)
+
+        samples.append(time.perf_counter() - start)
+        mapped = _mapped_mb()
+
+        del snap
+
+    return summarize(samples), mapped
+
+
+def _code_only_best(queries):
+    """
+    Best approximate score per query straight from the codes,
+    without re-ranking.
+    """
+    header = vector_store.read_header()
+    scale = vector_store.code_scale(header)
+    best = np.full(len(queries), -np.inf, dtype=np.float32)
+
+    for seg in header["segments"]:
+        if seg["rows"] == 0:
+            continue
+
+        codes = vector_store.open_codes(seg, header)
+
+        for start in range(0, len(codes), 65536):
+            block = np.asarray(codes[start:start + 65536], dtype=np.float32)
+
+            if scale is not None:
+                block *= scale
+
+            np.maximum(best, (queries @ block.T).max(axis=1), out=best)
+
+    return best
+
+
+def _measure(queries, storage):
+    dup_s = []
+    duplicates = []
+
+    for q in queries:
+        start = time.perf_counter()
+        duplicates.append(bool(check_duplicate(q)))
+        dup_s.append(time.perf_counter() - start)
+
+    matches = [search_face(q) for q in queries]
+
+    start = time.perf_counter()
+    search_faces(queries)
+    batch_s = time.perf_counter() - start
+
+    cold, mapped = _cold_scans(queries[-COLD_RUNS:], storage)
+
+    return {
+        "check_duplicate": {
+            **summarize(dup_s),
+            "per_s": round(len(dup_s) / sum(dup_s), 1),
+        },
+        "search_batch": {
+            "queries": len(queries),
+            "total_s": round(batch_s, 3),
+            "per_s": round(len(queries) / batch_s, 1),
+        },
+        "cold_scan": cold,
+        "mapped_mb": mapped,
+    }, duplicates, matches
+
+
+def run_size(n, queries=60):
+    with workdir():
+        fill_registry(n)
+        qs = _queries(n, queries)
+
+        float32_bytes = n * vector_store.EMBEDDING_DIM * vector_store.EMBEDDING_DTYPE.itemsize
+
+        base, base_dups, base_matches = _measure(qs, "float32")
+        result = {
+            "rows": n,
+            "threshold": SIM_THRESHOLD,
+            "queries": len(qs),
+            "float32": {"bytes_mb": round(float32_bytes / 2 ** 20, 1), **base},
+        }
+
+        for mode in MODES:
+            start = time.perf_counter()
+            vector_store.set_storage_mode(mode)
+            convert_s = time.perf_counter() - start
+
+            # warm the new code files like the float32 ones were
+            registry.snapshot()
+            check_duplicate(qs[0])
+
+            timings, dups, matches = _measure(qs, mode)
+            code_bytes = vector_store.storage_info()["code_bytes"]
+
+            approx = _code_only_best(qs) > SIM_THRESHOLD
+
+            result[mode] = {
+                "convert_s": round(convert_s, 2),
+                "bytes_mb": round(code_bytes / 2 ** 20, 1),
+                "memory_saving": round(1 - code_bytes / float32_bytes, 3),
+                **timings,
+                "speedup_warm": round(
+                    base["check_duplicate"]["mean_ms"] / timings["check_duplicate"]["mean_ms"], 2
+                ),
+                "speedup_cold": round(base["cold_scan"]["mean_ms"] / timings["cold_scan"]["mean_ms"], 2),
+                "decisions": {
+                    "duplicate_agreement": round(float(np.mean(np.equal(dups, base_dups))), 4),
+                    "match_agreement": round(float(np.mean(
+                        [m[0] == b[0] for m, b in zip(matches, base_matches)]
+                    )), 4),
+                    "max_score_diff": float(max(abs(m[1] - b[1]) for m, b in zip(matches, base_matches))),
+                    "code_only_flips": int(np.sum(approx != np.asarray(base_dups))),
+                },
+            }
+
+        return result
+
+
+def run(sizes=(100000, 1000000), queries=60):
+    return {str(n): run_size(n, queries) for n in sizes}
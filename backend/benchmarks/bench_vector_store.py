@@ -0,0 +1,81 @@
+"""
+Registry write/load cost and duplicate / search throughput.
+"""
+
+import time
+
+import numpy as np
+
+from app.db import vector_store
+from app.db.registry_cache import registry
+from app.services.similarity import SIM_THRESHOLD, check_duplicate, search_face
+
+from benchmarks.common import fill_registry, summarize, synthetic_embeddings, timed, workdir
+
+STORE_FACE_CALLS = 20
+
+
+def _queries(n_rows, n, seed=1):
+    """
+    Half near-copies of stored rows (duplicates), half random.
+    """
+    rng = np.random.default_rng(seed)
+    half = n // 2
+
+    stored = vector_store.gather_rows(vector_store.load_segments(), rng.choice(n_rows, half))
+    noisy = vector_store.normalize_embeddings(stored + rng.normal(0, 0.01, stored.shape))
+
+    return np.concatenate([noisy, synthetic_embeddings(n - half, seed=seed + 1)])
+
+
+def run_size(n, queries=50):
+    with workdir():
+        fill_s = fill_registry(n)
+
+        _, load_s = timed(vector_store.load_db, repeat=3)
+
+        frame = np.zeros((112, 112, 3), np.uint8)
+        emb = synthetic_embeddings(1, seed=n + 7)[0]
+        _, store_s = timed(vector_store.store_face, frame, emb, repeat=STORE_FACE_CALLS)
+
+        # first snapshot maps the segments; later calls are cache hits
+        _, snap_cold = timed(registry.snapshot)
+        _, snap_warm = timed(registry.snapshot, repeat=100)
+
+        qs = _queries(n, queries)
+
+        dup_s, search_s = [], []
+        duplicates = 0
+
+        for q in qs:
+            start = time.perf_counter()
+            duplicates += check_duplicate(q)
+            dup_s.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            search_face(q)
+            search_s.append(time.perf_counter() - start)
+
+        return {
+            "rows": n,
+            "bulk_append_s": round(fill_s, 3),
+            "bulk_append_rows_per_s": round(n / fill_s),
+            "load_db": summarize(load_s),
+            "store_face": summarize(store_s),
+            "snapshot_cold": summarize(snap_cold),
+            "snapshot_warm": summarize(snap_warm),
+            "check_duplicate": {
+                **summarize(dup_s),
+                "per_s": round(len(dup_s) / sum(dup_s), 1),
+                "duplicates_found": int(duplicates),
+                "threshold": SIM_THRESHOLD,
+            },
+            "search_face": {
+                **summarize(search_s),
+                "per_s": round(len(search_s) / sum(search_s), 1),
+            },
+        }
+
+
+def run(sizes=(1000, 100000, 1000000), queries=50):
+    return {str(n): run_size(n, queries) for n in sizes}
@@ -0,0 +1,94 @@
+"""
+End-to-end /kyc/verify latency through the FastAPI test client.
+
+InsightFace is replaced by a stub that returns random unit vectors
+(the video frames "match" the selfie), so the numbers cover upload
+handling, video decode, FaceMesh liveness, registry and logging —
+everything except face-model inference.
+"""
+
+import os
+import time
+
+import cv2
+import numpy as np
+
+from benchmarks.common import SAMPLE_VIDEO, summarize, synthetic_embeddings, workdir
+
+
+def _stub_models(kyc):
+    state = {"n": 0, "emb": None}
+
+    def get_embedding(frame):
+        state["n"] += 1
+        state["emb"] = synthetic_embeddings(1, seed=state["n"])[0]
+        return state["emb"]
+
+    def get_embeddings(frames):
+        return np.tile(state["emb"], (len(frames), 1))
+
+    kyc.get_embedding = get_embedding
+    kyc.get_embeddings = get_embeddings
+
+
+def run(video=SAMPLE_VIDEO, requests=10):
+    if not os.path.exists(video):
+        return {"skipped": f"{video} not found"}
+
+    from fastapi.testclient import TestClient
+
+    import app.api.kyc as kyc
+    from app.main import app
+    from app.security.auth import API_KEY
+    from app.security.rate_limit import limiter
+
+    _stub_models(kyc)
+    limiter.limits = {"default": (10 ** 9, 1)}
+
+    with open(video, "rb") as f:
+        video_bytes = f.read()
+
+    headers = {"x-api-key": API_KEY}
+    samples = []
+    stages = {}
+    statuses = {}
+
+    # no startup events: model warm-up is not wanted with stubbed models
+    client = TestClient(app)
+
+    with workdir():
+        for i in range(requests + 1):
+            # distinct bytes per request: the embedding cache would
+            # otherwise hand every request the first selfie's embedding
+            image = cv2.imencode(".jpg", np.full((480, 640, 3), 64 + i, np.uint8))[1].tobytes()
+            token = client.get("/kyc/session", headers=headers).json()["session_token"]
+
+            start = time.perf_counter()
+            body = client.post(
+                "/kyc/verify",
+                headers=headers,
+                data={"session_token": token},
+                files={
+                    "image": ("selfie.jpg", image, "image/jpeg"),
+                    "video": ("video.mp4", video_bytes, "video/mp4"),
+                },
+            ).json()
+            elapsed = time.perf_counter() - start
+
+            # first request warms FaceMesh and the registry
+            if samples or statuses:
+                samples.append(elapsed)
+
+                for name, ms in body.get("timings", {}).items():
+                    stages.setdefault(name, []).append(ms / 1000)
+
+            statuses[body.get("status")] = statuses.get(body.get("status"), 0) + 1
+
+    assert statuses == {"approved": requests + 1}, f"unexpected verify results: {statuses}"
+
+    return {
+        "requests": requests,
+        "statuses": statuses,
+        "latency": summarize(samples),
+        "stages": {name: summarize(s) for name, s in stages.items()},
+    }
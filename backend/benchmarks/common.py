@@ -0,0 +1,116 @@
+import gc
+import os
+import platform
+import subprocess
+import tempfile
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+from app.admin.attempt_logger import close_writer
+from app.db import vector_store
+from app.db.registry_cache import registry
+from app.db.vector_store import EMBEDDING_DIM, normalize_embeddings
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SAMPLE_VIDEO = os.path.join(BACKEND_DIR, "SampleData", "sample1.mp4")
+
+BULK_CHUNK = 65536
+
+
+@contextmanager
+def workdir():
+    """
+    Run inside a fresh temporary directory. The registry, attempt
+    log and image store all use paths relative to the cwd, so this
+    keeps benchmark data away from the real ones.
+    """
+    old = os.getcwd()
+
+    with tempfile.TemporaryDirectory(prefix="kyc-bench-") as tmp:
+        os.chdir(tmp)
+        forget_registry()
+
+        try:
+            yield tmp
+        finally:
+            # queued attempt entries belong to this directory
+            close_writer()
+            os.chdir(old)
+
+
+def forget_registry():
+    """
+    Drop the process-wide registry view and unmap its segments: it
+    belongs to the previous directory, and mapped pages cannot be
+    evicted from the page cache.
+    """
+    registry.__init__()
+    gc.collect()
+
+
+def synthetic_embeddings(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return normalize_embeddings(rng.standard_normal((n, EMBEDDING_DIM), dtype=np.float32))
+
+
+def fill_registry(n):
+    """
+    Append n synthetic rows in bulk chunks; returns seconds taken.
+    """
+    start = time.perf_counter()
+
+    for lo in range(0, n, BULK_CHUNK):
+        vector_store.append_embeddings(synthetic_embeddings(min(BULK_CHUNK, n - lo), seed=lo))
+
+    return time.perf_counter() - start
+
+
+def summarize(samples_s):
+    """
+    Latency summary in ms for a list of durations in seconds.
+    """
+    ms = np.asarray(samples_s) * 1000
+
+    return {
+        "n": len(ms),
+        "mean_ms": round(float(ms.mean()), 3),
+        "p50_ms": round(float(np.percentile(ms, 50)), 3),
+        "p95_ms": round(float(np.percentile(ms, 95)), 3),
+        "max_ms": round(float(ms.max()), 3),
+    }
+
+
+def timed(fn, *args, repeat=1):
+    """
+    (last result, list of durations in seconds)
+    """
+    samples = []
+    result = None
+
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(*args)
+        samples.append(time.perf_counter() - start)
+
+    return result, samples
+
+
+def environment():
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=BACKEND_DIR,
+            capture_output=True, text=True, timeout=10
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+
+    return {
+        "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
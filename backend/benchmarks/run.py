@@ -0,0 +1,138 @@
+"""
+Benchmark runner. From backend/:
+
+    python -m benchmarks.run                          # everything, default sizes
+    python -m benchmarks.run vector_store --sizes 1000,100000
+    python -m benchmarks.run --out results/v1.2.json
+    python -m benchmarks.run compare old.json new.json [--tolerance 0.15]
+
+Results are JSON: {"environment": {...}, "results": {bench: {...}}}.
+compare lists every timing / throughput that moved by more than the
+tolerance and exits non-zero if any regressed.
+"""
+
+import argparse
+import json
+import os
+import sys
+
+from benchmarks import (
+    bench_attempt_log,
+    bench_liveness,
+    bench_storage,
+    bench_verify,
+    bench_vector_store,
+)
+from benchmarks.common import environment
+
+BENCHMARKS = {
+    "vector_store": bench_vector_store,
+    "storage": bench_storage,
+    "attempt_log": bench_attempt_log,
+    "liveness": bench_liveness,
+    "verify": bench_verify,
+}
+
+# benchmarks that take a list of sizes
+SIZED = {"vector_store", "storage", "attempt_log"}
+
+# leaf-name suffixes -> True when larger is better; first match wins
+DIRECTION = {
+    "per_s": True,
+    "_fps": True,
+    "_ms": False,
+    "_s": False,
+}
+
+
+def _metrics(tree, prefix=""):
+    """
+    Flatten to {"a.b.c": value} for numeric leaves whose direction
+    is known.
+    """
+    for key, value in tree.items():
+        path = f"{prefix}{key}"
+
+        if isinstance(value, dict):
+            yield from _metrics(value, path + ".")
+            continue
+
+        if not isinstance(value, (int, float)) or isinstance(value, bool):
+            continue
+
+        for suffix, higher_better in DIRECTION.items():
+            if key.endswith(suffix):
+                yield path, value, higher_better
+                break
+
+
+def compare(old, new, tolerance):
+    old_metrics = {p: v for p, v, _ in _metrics(old["results"])}
+    regressions = 0
+
+    for path, value, higher_better in _metrics(new["results"]):
+        before = old_metrics.get(path)
+
+        if not before:
+            continue
+
+        change = (value - before) / before
+        worse = -change if higher_better else change
+
+        if abs(change) > tolerance:
+            tag = "REGRESSION" if worse > 0 else "improved"
+            regressions += worse > 0
+            print(f"{tag:<10} {path}: {before} -> {value} ({change:+.1%})")
+
+    return regressions
+
+
+def _sizes(text):
+    return tuple(int(s) for s in text.split(","))
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+
+    if argv[:1] == ["compare"]:
+        parser = argparse.ArgumentParser(prog="python -m benchmarks.run compare")
+        parser.add_argument("old")
+        parser.add_argument("new")
+        parser.add_argument("--tolerance", type=float, default=0.15)
+        args = parser.parse_args(argv[1:])
+
+        with open(args.old) as f_old, open(args.new) as f_new:
+            regressions = compare(json.load(f_old), json.load(f_new), args.tolerance)
+
+        return 1 if regressions else 0
+
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.run")
+    parser.add_argument("benchmarks", nargs="*", help=f"any of {', '.join(BENCHMARKS)} (default: all)")
+    parser.add_argument("--sizes", type=_sizes, help="comma-separated sizes for sized benchmarks")
+    parser.add_argument("--out", default="benchmark-results.json")
+    args = parser.parse_args(argv)
+
+    unknown = set(args.benchmarks) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"unknown benchmark(s): {', '.join(sorted(unknown))}")
+
+    output = {"environment": environment(), "results": {}}
+
+    for name in args.benchmarks or BENCHMARKS:
+        kwargs = {"sizes": args.sizes} if args.sizes and name in SIZED else {}
+
+        print(f"running {name} ...", file=sys.stderr)
+        output["results"][name] = BENCHMARKS[name].run(**kwargs)
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+
+    with open(args.out, "w") as f:
+        json.dump(output, f, indent=2)
+
+    print(json.dumps(output, indent=2))
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,30 @@
+import os
+import sys
+
+# before any app import: run inference inline and keep the logs quiet
+os.environ.setdefault("KYC_INFERENCE_WORKERS", "0")
+os.environ.setdefault("KYC_LOG_LEVEL", "WARNING")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+from app.admin.attempt_logger import close_writer
+from app.db.registry_cache import registry
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """
+    Run in an empty directory: the registry, images and logs all
+    live under relative paths.
+    """
+    monkeypatch.chdir(tmp_path)
+    registry.__init__()
+
+    yield tmp_path
+
+    # queued attempt entries belong to tmp_path, flush them before
+    # monkeypatch changes back
+    close_writer()
+    registry.__init__()
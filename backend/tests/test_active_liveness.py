@@ -0,0 +1,90 @@
+import os
+from types import SimpleNamespace
+
+import cv2
+import numpy as np
+import pytest
+
+from app.services import active_liveness
+from app.services.active_liveness import MAX_FRAMES, LivenessAccumulator
+
+SAMPLE_VIDEO = os.path.join(os.path.dirname(os.path.dirname(__file__)), "SampleData", "sample1.mp4")
+
+# open eyes, a nose and a closed mouth in normalised coordinates
+_EYE = [(0.30, 0.40), (0.33, 0.38), (0.37, 0.38), (0.40, 0.40), (0.37, 0.42), (0.33, 0.42)]
+_FACE = {
+    **dict(zip(active_liveness.LEFT_EYE, _EYE)),
+    **dict(zip(active_liveness.RIGHT_EYE, [(x + 0.3, y) for x, y in _EYE])),
+    active_liveness.NOSE_IDX: (0.5, 0.5),
+    active_liveness.MOUTH_TOP: (0.5, 0.60),
+    active_liveness.MOUTH_BOTTOM: (0.5, 0.62),
+}
+
+
+class StillFaceMesh:
+    """
+    A face that never moves or blinks.
+    """
+
+    def process(self, rgb):
+        landmarks = [SimpleNamespace(x=0.0, y=0.0) for _ in range(468)]
+
+        for i, (x, y) in _FACE.items():
+            landmarks[i] = SimpleNamespace(x=x, y=y)
+
+        return SimpleNamespace(multi_face_landmarks=[SimpleNamespace(landmark=landmarks)])
+
+
+def _feed(acc, n=MAX_FRAMES):
+    frame = np.zeros((120, 160, 3), np.uint8)
+
+    while not acc.done and acc.frames_decoded < n:
+        acc.update(frame)
+
+    return acc.result()
+
+
+def test_early_exit_is_off_by_default():
+    assert not LivenessAccumulator(StillFaceMesh()).early_exit
+
+
+def test_still_face_is_rejected_early_and_by_a_full_run():
+    early = _feed(LivenessAccumulator(StillFaceMesh(), early_exit=True))
+    full = _feed(LivenessAccumulator(StillFaceMesh(), early_exit=False))
+
+    assert early["early_exit"] == "not_live"
+    assert early["frames_processed"] < MAX_FRAMES
+    assert not early["is_live"]
+
+    assert full["early_exit"] is None
+    assert full["frames_processed"] == MAX_FRAMES
+    assert not full["is_live"]
+
+
+@pytest.mark.skipif(not os.path.exists(SAMPLE_VIDEO), reason="sample video missing")
+def test_early_exit_matches_the_full_run_on_the_sample_video():
+    from app.services.face_mesh_pool import face_mesh_pool
+
+    results = []
+
+    for early_exit in (True, False):
+        cap = cv2.VideoCapture(SAMPLE_VIDEO)
+
+        with face_mesh_pool.checkout() as mesh:
+            acc = LivenessAccumulator(mesh, early_exit=early_exit)
+
+            while not acc.done:
+                ret, frame = cap.read()
+
+                if not ret:
+                    break
+
+                acc.update(frame)
+
+        cap.release()
+        results.append(acc.result())
+
+    early, full = results
+
+    assert early["is_live"] == full["is_live"]
+    assert early["frames_processed"] <= full["frames_processed"]
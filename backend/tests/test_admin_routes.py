@@ -0,0 +1,67 @@
+import os
+import time
+
+from app.admin import attempt_logger
+from app.security.auth import API_KEY
+
+
+def test_stats_counts_logged_attempts(workdir):
+    from fastapi.testclient import TestClient
+
+    from app.main import app
+
+    now = time.strftime(attempt_logger.TIME_FORMAT)
+
+    attempt_logger._write_batch([
+        {"timestamp": "2026-02-07 10:00:00", "type": "kyc", "status": "approved"},
+        {"timestamp": "2026-02-07 11:30:00", "type": "kyc", "status": "rejected", "reason": "liveness failed"},
+        {"timestamp": now, "type": "kyc", "status": "approved"},
+    ])
+
+    body = TestClient(app).get(
+        "/admin/stats", headers={"x-api-key": API_KEY}, params={"since": "2026-02-07"}
+    ).json()
+
+    assert body["total_attempts"] == 3
+    assert (body["approved"], body["rejected"]) == (2, 1)
+
+    # past STATS_HOURS the hours are rolled up into days
+    assert body["daily_buckets"] == [
+        {"day": "2026-02-07", "approved": {"approved": 1}, "rejected": {"liveness failed": 1}}
+    ]
+    assert body["buckets"] == [{"hour": now[:13], "approved": {"approved": 1}}]
+
+
+def test_stats_file_keeps_hourly_buckets_bounded(workdir):
+    old = [
+        {"timestamp": f"2026-01-{day:02d} {hour:02d}:00:00", "type": "kyc", "status": "approved"}
+        for day in range(1, 29) for hour in range(24)
+    ]
+    attempt_logger._write_batch(old)
+
+    stats = attempt_logger.load_stats()
+
+    assert stats["total"] == len(old)
+    assert stats["hours"] == {}
+    assert len(stats["days"]) == 28
+    assert stats["days"]["2026-01-05"] == {"approved": {"approved": 24}}
+
+
+def test_attempts_rejects_cursor_offsets_outside_the_file(workdir):
+    from fastapi.testclient import TestClient
+
+    from app.main import app
+
+    attempt_logger._write_batch([{"timestamp": "2026-02-07 10:00:00", "type": "kyc", "status": "approved"}])
+    name = os.path.basename(attempt_logger.log_files()[-1])
+    size = os.path.getsize(attempt_logger.log_files()[-1])
+
+    client = TestClient(app)
+    headers = {"x-api-key": API_KEY}
+
+    for offset in (-5, size + 1):
+        response = client.get("/admin/attempts", headers=headers, params={"cursor": f"{name}:{offset}"})
+        assert response.status_code == 400
+
+    page = client.get("/admin/attempts", headers=headers, params={"cursor": f"{name}:{size}"}).json()
+    assert page["items"] == []
@@ -0,0 +1,35 @@
+import numpy as np
+
+from app.db import ann_index, vector_store
+from app.services.similarity import check_duplicate, find_above
+
+
+def _rows(n, seed):
+    rng = np.random.default_rng(seed)
+    return vector_store.normalize_embeddings(rng.normal(size=(n, vector_store.EMBEDDING_DIM)))
+
+
+def test_append_after_another_writer_indexes_the_gap(workdir, monkeypatch):
+    monkeypatch.setattr(ann_index, "ANN_ENABLED", True)
+    monkeypatch.setattr(ann_index, "ANN_MIN_ROWS", 0)
+    monkeypatch.setattr(ann_index, "_index", None)
+
+    vector_store.append_embeddings(_rows(500, seed=0))
+    ann_index.build_index(n_lists=8).save()
+    assert ann_index.get_index() is not None
+
+    # another worker: appends without running this process's hooks
+    other = _rows(5, seed=1)
+    with monkeypatch.context() as m:
+        m.setattr(vector_store, "_append_hooks", [])
+        vector_store.append_embeddings(other)
+
+    vector_store.append_embeddings(_rows(3, seed=2))
+
+    index = ann_index._index
+    assert index.count == 508
+    assert np.array_equal(np.sort(np.concatenate(index.lists)), np.arange(508))
+
+    for q in other:
+        assert find_above(q, 0.99) is not None
+        assert check_duplicate(q)
@@ -0,0 +1,10 @@
+from app.admin import attempt_logger
+
+
+def test_close_writer_flushes_into_the_current_directory(workdir):
+    attempt_logger.log_attempt({"type": "kyc", "status": "approved"})
+    attempt_logger.close_writer()
+
+    assert attempt_logger._writer is None
+    assert [e["status"] for e in attempt_logger.iter_attempts()] == ["approved"]
+    assert (workdir / "attempt_logs" / "stats.json").exists()
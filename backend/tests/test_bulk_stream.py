@@ -0,0 +1,46 @@
+import asyncio
+
+import app.api.kyc as kyc
+
+
+def _spooled(tmp_path):
+    path = tmp_path / "archive.zip"
+    path.write_bytes(b"zip")
+    return path
+
+
+def _job(source, emit, cancel):
+    emit([{"file": source}])
+
+
+def test_stream_never_started_discards_the_spool(tmp_path):
+    path = _spooled(tmp_path)
+    spool = kyc._Spool(str(path))
+
+    async def abandon():
+        stream = kyc._stream_ndjson(_job, "a.png", spool)
+        await stream.aclose()
+
+    asyncio.run(abandon())
+    assert path.exists()
+
+    spool.discard()
+    assert not path.exists()
+
+
+def test_worker_removes_the_spool_it_claimed(tmp_path):
+    path = _spooled(tmp_path)
+    spool = kyc._Spool(str(path))
+
+    async def consume():
+        return [chunk async for chunk in kyc._stream_ndjson(_job, "a.png", spool)]
+
+    assert asyncio.run(consume()) == ['{"file": "a.png"}\n']
+    assert not path.exists()
+
+    # the response's background task after a finished stream
+    spool.discard()
+
+
+def test_directory_source_has_nothing_to_discard():
+    kyc._Spool(None).discard()
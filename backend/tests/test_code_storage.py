@@ -0,0 +1,43 @@
+import numpy as np
+
+from app.db import vector_store
+from app.db.registry_cache import registry
+from app.services.similarity import SIM_THRESHOLD, check_duplicate, find_above_codes, search_codes
+
+
+def _rows(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return vector_store.normalize_embeddings(rng.normal(size=(n, vector_store.EMBEDDING_DIM)))
+
+
+def _spike(dim):
+    # one component far beyond the default int8 range
+    row = np.zeros(vector_store.EMBEDDING_DIM, np.float32)
+    row[dim] = 1.0
+    return row
+
+
+def test_rows_beyond_the_int8_range_are_found_exactly(workdir):
+    vector_store.set_storage_mode("int8")
+    vector_store.append_embeddings(_rows(300))
+    vector_store.append_embeddings(np.stack([_spike(3), _spike(7)]))
+
+    assert vector_store.read_header()["clipped"] == [300, 301]
+
+    snap = registry.snapshot()
+    assert list(snap.clipped) == [300, 301]
+
+    # the codes alone put the spike at 0.5, well under the threshold
+    assert find_above_codes(_spike(7), SIM_THRESHOLD, snapshot=snap) == (301, 1.0)
+    assert check_duplicate(_spike(3))
+    assert search_codes(_spike(7), k=1, snapshot=snap, candidates=1) == [(301, 1.0)]
+
+
+def test_recalibration_clears_clipped_rows(workdir):
+    vector_store.set_storage_mode("int8")
+    vector_store.append_embeddings(np.concatenate([_rows(50), _spike(0)[None]]))
+
+    vector_store.set_storage_mode("int8")
+
+    assert vector_store.read_header()["clipped"] == []
+    assert check_duplicate(_spike(0))
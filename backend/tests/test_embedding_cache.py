@@ -0,0 +1,76 @@
+import os
+import time
+
+import numpy as np
+
+from app.services.embedding_cache import EmbeddingCache, content_key
+
+
+def _files(root):
+    return sorted(
+        os.path.join(d, f) for d, _, names in os.walk(root) for f in names
+    )
+
+
+def _embedding(i):
+    return np.full(512, i, dtype=np.float32)
+
+
+def _put(cache, key, embedding):
+    cache.put(key, embedding)
+
+    # the sweep runs in the background; wait for it
+    sweeper = cache._sweeper
+    if sweeper is not None:
+        sweeper.join()
+
+
+def test_disk_tier_stays_under_its_byte_cap(tmp_path):
+    one_file = 512 * 4 + 128
+    cache = EmbeddingCache(disk_dir=str(tmp_path), disk_max_bytes=5 * one_file)
+
+    keys = [content_key(bytes([i])) for i in range(20)]
+
+    for i, key in enumerate(keys):
+        _put(cache, key, _embedding(i))
+
+    files = _files(tmp_path)
+    assert sum(os.path.getsize(f) for f in files) <= 5 * one_file
+    assert cache.disk_evictions >= 15
+    assert cache.disk_bytes == sum(os.path.getsize(f) for f in files)
+
+    # the newest entry survives and is served from disk
+    hit, embedding = EmbeddingCache(disk_dir=str(tmp_path)).get(keys[-1])
+    assert hit and embedding[0] == 19
+
+
+def test_expired_disk_entries_are_deleted(tmp_path):
+    cache = EmbeddingCache(disk_dir=str(tmp_path), ttl=60)
+    old, read, new = (content_key(bytes([i])) for i in range(3))
+
+    _put(cache, old, _embedding(0))
+    _put(cache, read, _embedding(1))
+
+    stale = time.time() - 120
+    for path in (cache._disk_path(old), cache._disk_path(read)):
+        os.utime(path, (stale, stale))
+
+    # a read of an expired file deletes it
+    assert EmbeddingCache(disk_dir=str(tmp_path), ttl=60).get(read) == (False, None)
+    assert not os.path.exists(cache._disk_path(read))
+
+    # the next put past the sweep interval removes the rest
+    cache._next_sweep = 0.0
+    _put(cache, new, _embedding(2))
+
+    assert _files(tmp_path) == [cache._disk_path(new)]
+
+
+def test_clear_empties_the_disk_tier(tmp_path):
+    cache = EmbeddingCache(disk_dir=str(tmp_path))
+    cache.put(content_key(b"x"), _embedding(1))
+
+    cache.clear()
+
+    assert _files(tmp_path) == []
+    assert cache.stats()["entries"] == 0
@@ -0,0 +1,96 @@
+import os
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+from app.services.inference_pool import InferencePool
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    # spawned workers read this at import: no models to load
+    monkeypatch.setenv("KYC_WARM_MODULES", "")
+
+    pool = InferencePool(workers=2, threads=1)
+    yield pool
+    pool.shutdown()
+
+
+def test_warm_up_reaches_every_worker(pool):
+    assert pool.warm_up()
+
+    assert pool.ready
+    assert len(pool.model_stats) == 2
+    assert all(s["ready"] for s in pool.model_stats.values())
+
+
+def test_failed_warm_up_is_reported(monkeypatch):
+    monkeypatch.setenv("KYC_WARM_MODULES", "no_such_module")
+
+    pool = InferencePool(workers=1, threads=1)
+
+    try:
+        assert not pool.warm_up()
+        assert not pool.ready
+    finally:
+        pool.shutdown()
+
+
+def test_broken_pool_is_replaced(pool):
+    assert pool.warm_up()
+
+    broken = pool._get_executor()
+
+    with pytest.raises(BrokenProcessPool):
+        broken.submit(os._exit, 1).result()
+
+    # the broken pool never started the task: it runs on a new one
+    with pytest.raises(KeyError):
+        pool.run("no_such_task")
+
+    assert pool._executor is not broken
+    assert pool.pending == 0
+
+    # the replacement warms up in the background; a second call waits for it
+    assert pool.warm_up()
+    assert pool.ready
+    assert pool._executor is not broken
+
+
+class _ShutDownExecutor:
+
+    def submit(self, *args):
+        raise RuntimeError("cannot schedule new futures after shutdown")
+
+
+def test_submit_to_a_shut_down_pool_retries_on_the_current_one(monkeypatch):
+    from concurrent.futures import ThreadPoolExecutor
+
+    from app.services import inference_pool as ip
+
+    monkeypatch.setitem(ip._task_fns, "embeddings", lambda frames: len(frames))
+
+    current = ThreadPoolExecutor(1)
+    pool = InferencePool(workers=1, threads=1)
+    executors = iter([_ShutDownExecutor(), current])
+    monkeypatch.setattr(pool, "_get_executor", lambda: next(executors))
+
+    try:
+        assert pool.run("embeddings", [1, 2]) == 2
+        assert pool.pending == 0
+    finally:
+        current.shutdown()
+
+
+def test_submit_that_keeps_failing_frees_its_queue_slot(monkeypatch):
+    from app.services.inference_pool import InferenceBusy
+
+    pool = InferencePool(workers=1, threads=1, max_pending=1)
+    monkeypatch.setattr(pool, "_get_executor", lambda: _ShutDownExecutor())
+
+    for _ in range(3):
+        with pytest.raises(InferenceBusy):
+            pool.run("embeddings", [])
+
+    assert pool.pending == 0
+    assert pool.rejected == 0
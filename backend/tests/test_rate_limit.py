@@ -0,0 +1,39 @@
+import asyncio
+import threading
+
+from app.security import rate_limit
+from app.security.rate_limit import MemoryBackend, RateLimiter, SQLiteBackend, rate_limit_async
+
+
+def _check_threads(monkeypatch, backend):
+    limiter = RateLimiter(backend, {"default": (1, 60)})
+    monkeypatch.setattr(rate_limit, "limiter", limiter)
+
+    threads = []
+    take = backend.take
+
+    def recording_take(*args):
+        threads.append(threading.current_thread())
+        return take(*args)
+
+    monkeypatch.setattr(backend, "take", recording_take)
+
+    async def check_twice():
+        return [await rate_limit_async("1.2.3.4"), await rate_limit_async("1.2.3.4")], threading.current_thread()
+
+    allowed, loop_thread = asyncio.run(check_twice())
+
+    assert allowed == [True, False]
+    return threads, loop_thread
+
+
+def test_sqlite_checks_run_off_the_event_loop(workdir, monkeypatch):
+    threads, loop_thread = _check_threads(monkeypatch, SQLiteBackend(str(workdir / "rl.sqlite3")))
+
+    assert loop_thread not in threads
+
+
+def test_memory_checks_stay_inline(monkeypatch):
+    threads, loop_thread = _check_threads(monkeypatch, MemoryBackend())
+
+    assert threads == [loop_thread, loop_thread]
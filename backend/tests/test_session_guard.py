@@ -0,0 +1,40 @@
+import asyncio
+import threading
+
+from app.security import session_guard
+from app.security.session_guard import (
+    SQLiteSessionStore,
+    consume_session_async,
+    create_session_async,
+    validate_session_async,
+)
+
+
+def test_sqlite_sessions_run_off_the_event_loop(workdir, monkeypatch):
+    store = SQLiteSessionStore(str(workdir / "sessions.sqlite3"))
+    monkeypatch.setattr(session_guard, "_store", store)
+
+    threads = []
+
+    for name in ("create", "validate", "consume"):
+        fn = getattr(store, name)
+
+        def recording(*args, fn=fn):
+            threads.append(threading.current_thread())
+            return fn(*args)
+
+        monkeypatch.setattr(store, name, recording)
+
+    async def lifecycle():
+        token = await create_session_async()
+        return (
+            await validate_session_async(token),
+            await consume_session_async(token),
+            await consume_session_async(token),
+            threading.current_thread(),
+        )
+
+    *results, loop_thread = asyncio.run(lifecycle())
+
+    assert results == [True, True, False]
+    assert len(threads) == 4 and loop_thread not in threads
@@ -0,0 +1,27 @@
+import asyncio
+
+import pytest
+
+from app.utils.stages import StageGraph, StageRejected
+
+
+def test_stage_cancelled_while_waiting_on_a_dependency_is_recorded():
+    graph = StageGraph()
+
+    @graph.stage("slow")
+    async def slow():
+        await asyncio.sleep(10)
+
+    @graph.stage("reject")
+    async def reject():
+        raise StageRejected("no")
+
+    @graph.stage("after", "slow")
+    async def after(_):
+        return None
+
+    with pytest.raises(StageRejected):
+        asyncio.run(graph.run())
+
+    assert sorted(graph.cancelled) == ["after", "slow"]
+    assert {"slow", "reject", "after", "total"} <= set(graph.timings)
@@ -0,0 +1,89 @@
+import os
+
+import cv2
+import numpy as np
+import pytest
+
+import app.api.kyc as kyc
+from app.db.vector_store import EMBEDDING_DIM
+from app.security.auth import API_KEY
+from app.security.rate_limit import limiter
+from app.security.session_guard import validate_session
+from app.services.embedding_cache import embedding_cache
+from app.services.inference_pool import InferenceBusy
+
+SAMPLE_VIDEO = os.path.join(os.path.dirname(os.path.dirname(__file__)), "SampleData", "sample1.mp4")
+HEADERS = {"x-api-key": API_KEY}
+
+
+@pytest.fixture
+def client(workdir, monkeypatch):
+    from fastapi.testclient import TestClient
+
+    from app.main import app
+
+    monkeypatch.setattr(limiter, "limits", {"default": (10 ** 9, 1)})
+    embedding_cache.clear()
+
+    # no startup events: no model warm-up
+    yield TestClient(app)
+
+    embedding_cache.clear()
+
+
+def _verify(client, token, image, video=b""):
+    return client.post(
+        "/kyc/verify",
+        headers=HEADERS,
+        data={"session_token": token},
+        files={
+            "image": ("selfie.png", image, "image/png"),
+            "video": ("video.mp4", video, "video/mp4"),
+        },
+    )
+
+
+def _selfie():
+    return cv2.imencode(".png", np.full((480, 640, 3), 128, np.uint8))[1].tobytes()
+
+
+def test_rejected_upload_keeps_the_session(client):
+    token = client.get("/kyc/session", headers=HEADERS).json()["session_token"]
+
+    body = _verify(client, token, b"not an image").json()
+
+    assert body["status"] == "rejected"
+    assert validate_session(token)
+
+
+@pytest.mark.skipif(not os.path.exists(SAMPLE_VIDEO), reason="sample video missing")
+def test_busy_verify_can_be_retried_with_the_same_session(client, monkeypatch):
+    embedding = np.ones(EMBEDDING_DIM, np.float32) / np.sqrt(EMBEDDING_DIM)
+    calls = []
+
+    def get_embedding(frame):
+        calls.append(frame)
+
+        if len(calls) == 1:
+            raise InferenceBusy("queue full")
+
+        return embedding
+
+    monkeypatch.setattr(kyc, "get_embedding", get_embedding)
+    monkeypatch.setattr(kyc, "get_embeddings", lambda frames: np.tile(embedding, (len(frames), 1)))
+
+    with open(SAMPLE_VIDEO, "rb") as f:
+        video = f.read()
+
+    token = client.get("/kyc/session", headers=HEADERS).json()["session_token"]
+
+    busy = _verify(client, token, _selfie(), video)
+    assert busy.status_code == 503
+    assert validate_session(token)
+
+    assert _verify(client, token, _selfie(), video).json()["status"] == "approved"
+    assert not validate_session(token)
+
+    assert _verify(client, token, _selfie(), video).json() == {
+        "status": "error", "reason": "invalid session"
+    }